@@ -0,0 +1,234 @@
+"""
+AI portfolio analysis: prompt, model routing and result cache.
+
+- The prompt only depends on the portfolio; results are cached by a hash of the
+  allocation (tickers, quantities, category weights), so price noise does not
+  trigger a new LLM call but a buy/sell does
+- ModelRouter keeps per-model latency (EWMA) and error stats; models that are
+  failing or slower than AI_SLOW_MODEL_S are moved to the end of the fallback
+  order instead of being tried first on every request
+- Generation is async and streamed (generate_content_async(stream=True)); a
+  model that does not produce its first chunk within AI_FIRST_CHUNK_TIMEOUT_S
+  counts as a failure and the next one is tried
+
+`factory(name)` returns an object with generate_content_async(prompt, stream=True),
+i.e. genai.GenerativeModel in production and a local fake in the tests.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+AI_MODELS = [
+    m.strip()
+    for m in os.getenv("AI_MODELS", "gemini-2.0-pro-exp,gemini-1.5-pro,gemini-1.5-flash").split(",")
+    if m.strip()
+]
+AI_CACHE_TTL_S = float(os.getenv("AI_CACHE_TTL_S", "86400"))
+AI_FIRST_CHUNK_TIMEOUT_S = float(os.getenv("AI_FIRST_CHUNK_TIMEOUT_S", "20"))
+AI_SLOW_MODEL_S = float(os.getenv("AI_SLOW_MODEL_S", "30"))
+AI_ERROR_COOLDOWN_S = float(os.getenv("AI_ERROR_COOLDOWN_S", "300"))
+
+UNAVAILABLE_MSG = "Sistema de IA temporariamente indisponível. Tente novamente em instantes."
+
+
+class ModelsUnavailable(Exception):
+    """Every model failed (or none is configured)."""
+
+
+# --- PROMPT ---
+def allocation_key(portfolio):
+    """Stable hash of what the analysis depends on: positions and category weights."""
+    total = portfolio.total_value or 1.0
+    positions = sorted(
+        f"{p.ticker}|{p.category}|{qty:g}" for p, qty in zip(portfolio.positions, portfolio.qty.tolist())
+    )
+    # Pesos arredondados a 1 p.p.: oscilação de preço não invalida a análise
+    weights = sorted(f"{cat}|{round(val / total * 100)}" for cat, val in portfolio.allocation().items())
+    raw = "\n".join(positions + ["--"] + weights)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_prompt(portfolio, extra=None):
+    total_patrimonio = portfolio.total_value
+    alloc = portfolio.allocation()
+    resumo = "".join(
+        f"- {p.row.get('ticker')} ({p.category}): {p.row.get('quantity')} un. "
+        f"Total R$ {val:.2f}. Rentab. {pl:.2f}%\n"
+        for p, val, pl in zip(
+            portfolio.positions, portfolio.value_brl.tolist(), portfolio.profit_pct.tolist()
+        )
+    )
+    risco = f"Métricas de risco calculadas (use como base do diagnóstico):\n{extra}\n" if extra else ""
+    return (
+        f"Atue como um Consultor de Wealth Management de Elite (CFA Nível 3).\n"
+        f"Analise esta carteira de R$ {total_patrimonio:.2f}.\n"
+        f"Alocação Atual: {alloc}\n"
+        f"Ativos:\n{resumo}\n{risco}\n"
+        "Objetivo: Maximizar retorno ajustado ao risco e garantir diversificação inteligente.\n"
+        "Gere uma resposta em HTML PURO (sem tags html, head, body, sem markdown ```html). "
+        "Use classes CSS do Tailwind se achar pertinente, mas foque na estrutura.\n\n"
+        "Estrutura da Resposta:\n"
+        "<div class='space-y-6'>\n"
+        "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-yellow-500'>\n"
+        "    <h3 class='text-lg font-bold text-white mb-2'>🛡️ Diagnóstico de Risco & Concentração</h3>\n"
+        "    <p class='text-gray-300'>[Análise crítica da alocação. Identifique ativos que ultrapassam 15% da carteira ou setores expostos demais. Seja direto.]</p>\n"
+        "  </div>\n\n"
+        "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-green-500'>\n"
+        "    <h3 class='text-lg font-bold text-white mb-2'>🚀 Destaques & Oportunidades</h3>\n"
+        "    <p class='text-gray-300'>[Cite o melhor ativo e por que ele performou bem. Identifique oportunidades de entrada em classes sub-alocadas (ex: FIIs, Renda Fixa) para equilibrar.]</p>\n"
+        "  </div>\n\n"
+        "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-blue-500'>\n"
+        "    <h3 class='text-lg font-bold text-white mb-2'>⚖️ Plano de Ação (Rebalanceamento)</h3>\n"
+        "    <ul class='list-disc list-inside text-gray-300 space-y-1'>\n"
+        "      <li>[Sugestão Prática 1: Ex: 'Reduzir exposição em VALE3 em 5%...']</li>\n"
+        "      <li>[Sugestão Prática 2]</li>\n"
+        "      <li>[Sugestão Prática 3]</li>\n"
+        "    </ul>\n"
+        "  </div>\n"
+        "</div>"
+    )
+
+
+# --- ROTEAMENTO ENTRE MODELOS ---
+class ModelStats:
+    __slots__ = ("name", "latency", "calls", "errors", "failed_at")
+
+    def __init__(self, name):
+        self.name = name
+        self.latency = None  # EWMA em segundos (geração completa)
+        self.calls = 0
+        self.errors = 0  # falhas consecutivas
+        self.failed_at = 0.0
+
+    def record_success(self, elapsed, alpha=0.3):
+        self.calls += 1
+        self.errors = 0
+        self.latency = elapsed if self.latency is None else alpha * elapsed + (1 - alpha) * self.latency
+
+    def record_failure(self):
+        self.calls += 1
+        self.errors += 1
+        self.failed_at = time.monotonic()
+
+    def penalized(self, now):
+        # Cool-down cresce com as falhas seguidas (5min, 10min, 15min...)
+        cooling = self.errors and now - self.failed_at < AI_ERROR_COOLDOWN_S * min(self.errors, 12)
+        slow = self.latency is not None and self.latency > AI_SLOW_MODEL_S
+        return bool(cooling or slow)
+
+
+class ModelRouter:
+    def __init__(self, models, factory):
+        self.models = list(models)
+        self.factory = factory
+        self.stats = {m: ModelStats(m) for m in self.models}
+        self._lock = threading.Lock()
+
+    def order(self):
+        """Preference order, with failing/slow models moved to the end (still a last resort)."""
+        now = time.monotonic()
+        with self._lock:
+            return sorted(self.models, key=lambda m: self.stats[m].penalized(now))
+
+    async def stream(self, prompt):
+        """Yields text chunks from the first model that answers."""
+        for name in self.order():
+            stats = self.stats[name]
+            start = time.perf_counter()
+            produced = False
+            try:
+                with span("gemini", model=name):
+                    model = self.factory(name)
+                    response = await asyncio.wait_for(
+                        model.generate_content_async(prompt, stream=True), AI_FIRST_CHUNK_TIMEOUT_S
+                    )
+                    chunks = response.__aiter__()
+                    first = await asyncio.wait_for(chunks.__anext__(), AI_FIRST_CHUNK_TIMEOUT_S)
+                    produced = True
+                    yield first.text
+                    async for chunk in chunks:
+                        yield chunk.text
+            except Exception as e:
+                with self._lock:
+                    stats.record_failure()
+                logger.warning("gemini model=%s error=%r", name, e)
+                if produced:
+                    # Metade da resposta já foi enviada: não dá para trocar de modelo
+                    raise
+                continue
+            with self._lock:
+                stats.record_success(time.perf_counter() - start)
+            return
+        raise ModelsUnavailable("no model available")
+
+
+# --- CACHE DE RESULTADOS ---
+class AnalysisCache:
+    def __init__(self, ttl_s=AI_CACHE_TTL_S, max_entries=256):
+        self.ttl = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (created_at, text)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                metrics.record_cache("ai_analysis", hit=False)
+                return None
+            self._entries.move_to_end(key)
+        metrics.record_cache("ai_analysis", hit=True)
+        return entry[1]
+
+    def put(self, key, text):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class Analyst:
+    def __init__(self, router, cache=None):
+        self.router = router
+        self.cache = cache or AnalysisCache()
+
+    async def stream(self, portfolio, extra=None):
+        """
+        Streams the analysis; served from the cache when the allocation is unchanged.
+        `extra`: optional context appended to the prompt (risk metrics), or a
+        callable returning it, run in a thread only on a cache miss.
+        """
+        key = allocation_key(portfolio)
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        if callable(extra):
+            extra = await asyncio.to_thread(extra)
+
+        parts = []
+        try:
+            async for chunk in self.router.stream(build_prompt(portfolio, extra)):
+                parts.append(chunk)
+                yield chunk
+        except ModelsUnavailable:
+            yield UNAVAILABLE_MSG
+            return
+        except Exception as e:
+            # Resposta parcial: não vai para o cache
+            yield f"<p class='text-red-400'>Erro Interno IA: {e}</p>"
+            return
+        self.cache.put(key, "".join(parts))
+
+    async def analyze(self, portfolio, extra=None):
+        return "".join([chunk async for chunk in self.stream(portfolio, extra)])
@@ -1,6 +1,6 @@
 import os
-import requests
 from dotenv import load_dotenv
+from supabase_rest import SupabaseREST
 
 load_dotenv()
 
@@ -9,14 +9,9 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_KEY"))
 
 
 def get_assets():
-    url = f"{SUPABASE_URL}/rest/v1/portfolios?select=*"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-    }
-    response = requests.get(url, headers=headers)
-    return response.json()
+    # Paginado (keyset) e só com as colunas exibidas
+    db = SupabaseREST(SUPABASE_URL, SUPABASE_KEY)
+    return db.iter_rows("portfolios", "id,ticker,category")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,323 @@
+"""
+Historical what-if backtests of target allocations over the local price store.
+
+A scenario is a set of target weights per ticker (plus "CDI" for the
+fixed-income leg), a rebalance frequency, a date range and fees. The whole
+simulation is a handful of array operations over the (days x assets) price
+matrix, no per-day Python loop:
+
+- base[t]: index of the last rebalance date on or before t (running max)
+- holdings drift between rebalances, so the portfolio return on day t is
+  (P_t / P_b) @ w / (P_t-1 / P_b) @ w - 1 with b = base[t-1]
+- at each rebalance the turnover back to target (sum |drifted - w|) pays fee_pct
+
+Closes come adjusted from Yahoo (dividends and splits), so the equity curve is
+total return with dividends reinvested; assets in another currency are
+converted with their <CCY>BRL=X pair day by day. Several scenarios over the same matrix run in a process
+pool (BACKTEST_WORKERS), each worker receiving the matrix once per batch.
+
+The CDI leg and the risk-free rate come from the RateStore: a start before its
+first rate is rejected, and the default 10-year window is clipped to it.
+
+Uso:
+    prices, dates = ...                            # PriceStore.matrix(...)
+    simulate(prices, weights, dates, "monthly")    # curva + estatísticas
+    run_many(prices, dates, [{"weights": ..., "rebalance": "yearly"}, ...])
+"""
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from currency import daily_rates, pair_symbols
+from lazy_imports import optional
+
+np = optional("numpy")
+pd = optional("pandas")
+
+logger = logging.getLogger(__name__)
+
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+BACKTEST_MAX_SCENARIOS = int(os.getenv("BACKTEST_MAX_SCENARIOS", "50"))
+# Abaixo disso não compensa serializar a matriz para outros processos
+BACKTEST_POOL_MIN = int(os.getenv("BACKTEST_POOL_MIN", "4"))
+TRADING_DAYS = 252
+# Frequência -> chave do período (rebalanceia no primeiro pregão de cada período)
+FREQUENCIES = {"none": None, "monthly": "M", "quarterly": "Q", "yearly": "Y"}
+
+
+def rebalance_flags(dates, frequency):
+    """True on the first date and on the first trading day of each new period."""
+    dates = pd.DatetimeIndex(dates)
+    flags = np.zeros(len(dates), dtype=bool)
+    if len(dates):
+        flags[0] = True
+    code = FREQUENCIES[frequency]
+    if code is None or len(dates) < 2:
+        return flags
+    if code == "M":
+        period = dates.year * 12 + dates.month
+    elif code == "Q":
+        period = dates.year * 4 + (dates.month - 1) // 3
+    else:
+        period = dates.year
+    period = np.asarray(period)
+    flags[1:] |= period[1:] != period[:-1]
+    return flags
+
+
+def _max_drawdown(equity):
+    peaks = np.maximum.accumulate(equity)
+    return float((equity / peaks - 1.0).min()) if len(equity) else 0.0
+
+
+def simulate(prices, weights, dates, rebalance="monthly", fee_pct=0.0, initial=10000.0, rf=None):
+    """
+    prices: (days x n) BRL closes (no NaN), weights: (n,) summing to 1,
+    rf: optional (days,) risk-free index for the Sharpe ratio.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    w = np.asarray(weights, dtype=np.float64)
+    T = len(prices)
+    flags = rebalance_flags(dates, rebalance)
+    base = np.maximum.accumulate(np.where(flags, np.arange(T), 0))
+
+    b = base[:-1]  # base do período que contém o dia anterior
+    rel_prev = prices[:-1] / prices[b]
+    rel_now = prices[1:] / prices[b]
+    grown_prev = rel_prev @ w
+    returns = (rel_now @ w) / grown_prev - 1.0
+
+    # Custo do rebalanceamento: giro dos pesos derivados de volta ao alvo
+    turnover = np.zeros(T - 1)
+    if fee_pct and rebalance != "none":
+        on = flags[1:]
+        drifted = rel_now[on] * w / (rel_now[on] @ w)[:, None]
+        turnover[on] = np.abs(drifted - w).sum(axis=1)
+        returns = (1.0 + returns) * (1.0 - fee_pct * turnover) - 1.0
+
+    equity = initial * np.concatenate(([1.0], np.cumprod(1.0 + returns)))
+    years = max((pd.Timestamp(dates[-1]) - pd.Timestamp(dates[0])).days / 365.25, 1e-9) if T > 1 else 0.0
+    total = equity[-1] / initial - 1.0
+    cagr = (equity[-1] / initial) ** (1 / years) - 1.0 if years else 0.0
+    vol = float(returns.std(ddof=1) * np.sqrt(TRADING_DAYS)) if T > 2 else 0.0
+    sharpe = None
+    if rf is not None and vol > 0 and years:
+        rf = np.asarray(rf, dtype=np.float64)
+        rf_cagr = (rf[-1] / rf[0]) ** (1 / years) - 1.0
+        sharpe = round((cagr - rf_cagr) / vol, 4)
+
+    # Retorno por ano civil (último valor de cada ano / último do anterior)
+    index = pd.DatetimeIndex(dates)
+    year_end = pd.Series(equity, index=index).groupby(index.year).last()
+    yearly = year_end / np.concatenate(([initial], year_end.to_numpy()[:-1])) - 1.0
+
+    return {
+        "equity": equity,
+        "stats": {
+            "final_value": round(float(equity[-1]), 2),
+            "total_return": round(float(total) * 100, 4),
+            "cagr": round(float(cagr) * 100, 4),
+            "volatility": round(vol * 100, 4),
+            "max_drawdown": round(_max_drawdown(equity) * 100, 4),
+            "sharpe": sharpe,
+            "rebalances": int(flags[1:].sum()),
+            "turnover": round(float(turnover.sum()) * 100, 4),
+        },
+        "yearly": [{"year": int(y), "return": round(float(r) * 100, 4)} for y, r in zip(yearly.index, yearly.tolist())],
+    }
+
+
+def _run_batch(prices, dates, rf, scenarios):
+    """Worker entry point: several scenarios over one matrix (pickled once per batch)."""
+    return [_run_one(prices, dates, rf, s) for s in scenarios]
+
+
+def _run_one(prices, dates, rf, scenario):
+    result = simulate(
+        prices, scenario["weights"], dates, scenario.get("rebalance", "monthly"),
+        scenario.get("fee_pct", 0.0), scenario.get("initial", 10000.0), rf,
+    )
+    result["equity"] = np.round(result["equity"], 2).tolist()
+    return result
+
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def _pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            # spawn: o processo do servidor tem threads, fork não é seguro
+            _POOL = ProcessPoolExecutor(BACKTEST_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_POOL.shutdown, wait=False, cancel_futures=True)
+        return _POOL
+
+
+def run_many(prices, dates, scenarios, rf=None, workers=BACKTEST_WORKERS):
+    """Runs every scenario; batches go to the process pool when there are enough of them."""
+    prices = np.asarray(prices, dtype=np.float64)
+    dates = np.asarray(pd.DatetimeIndex(dates))
+    if workers <= 1 or len(scenarios) < BACKTEST_POOL_MIN:
+        return _run_batch(prices, dates, rf, scenarios)
+    size = -(-len(scenarios) // workers)
+    batches = [scenarios[i:i + size] for i in range(0, len(scenarios), size)]
+    try:
+        futures = [_pool().submit(_run_batch, prices, dates, rf, batch) for batch in batches]
+        return [r for fut in futures for r in fut.result()]
+    except BrokenProcessPool as e:
+        global _POOL
+        logger.warning("backtest pool broken, running inline error=%s", e)
+        with _POOL_LOCK:
+            _POOL = None
+        return _run_batch(prices, dates, rf, scenarios)
+
+
+# --- Cenários sobre a carteira-alvo ---
+RATE_ASSETS = ("CDI", "SELIC")
+BENCHMARKS = {"IBOV": "^BVSP", "CDI": "CDI"}
+
+
+def _finite(name, value):
+    """float(value), ValueError if it is not a finite number."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} deve ser numérico") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} deve ser um número finito")
+    return value
+
+
+def parse_scenario(spec, defaults):
+    """Validated scenario dict (weights as fractions). ValueError if invalid."""
+    merged = {**defaults, **spec}
+    weights = merged.get("weights")
+    if not isinstance(weights, dict) or not weights:
+        raise ValueError("weights deve ser um objeto {ticker: peso}")
+    weights = {str(t).upper().strip(): _finite(f"peso de {t}", v) for t, v in weights.items()}
+    if any(v < 0 for v in weights.values()) or sum(weights.values()) <= 0:
+        raise ValueError("pesos devem ser >= 0 e somar mais que zero")
+    total = sum(weights.values())
+    rebalance = merged.get("rebalance", "monthly")
+    if rebalance not in FREQUENCIES:
+        raise ValueError(f"rebalance deve ser um de: {', '.join(FREQUENCIES)}")
+    fee_pct = _finite("fee_pct", merged.get("fee_pct", 0.0))
+    if not 0 <= fee_pct < 1:
+        raise ValueError("fee_pct deve estar entre 0 e 1 (fração)")
+    initial = _finite("initial", merged.get("initial", 10000.0))
+    if initial <= 0:
+        raise ValueError("initial deve ser maior que zero")
+    return {
+        "name": str(merged.get("name") or ""),
+        "weights": {t: v / total for t, v in weights.items() if v > 0},
+        "rebalance": rebalance,
+        "fee_pct": fee_pct,
+        "initial": initial,
+    }
+
+
+class Backtester:
+    """`prices` is a PriceStore, `rates` a RateStore, `resolve(ticker)` an Instrument."""
+
+    def __init__(self, prices, rates, resolve, workers=BACKTEST_WORKERS):
+        self.prices = prices
+        self.rates = rates
+        self.resolve = resolve
+        self.workers = workers
+
+    def _matrix(self, tickers, start, end):
+        """BRL closes per ticker (columns) on their common window, plus CDI and IBOV indexes."""
+        symbols, currency, missing = {}, {}, []
+        for t in tickers:
+            if t in RATE_ASSETS:
+                continue
+            inst = self.resolve(t)
+            if inst.priced and inst.yahoo:
+                symbols[t], currency[t] = inst.yahoo, inst.currency
+            else:
+                missing.append(t)
+        fx_symbols = pair_symbols(currency.values())
+        frame = self.prices.matrix(list(symbols.values()) + [BENCHMARKS["IBOV"]] + fx_symbols, start, end)
+        missing += [t for t, sym in symbols.items() if sym not in frame.columns]
+        if missing:
+            raise ValueError(f"sem série de preço: {', '.join(sorted(missing))}")
+
+        if symbols:
+            # Janela comum: a partir do primeiro pregão em que todos têm preço
+            data = frame[list(symbols.values())].set_axis(list(symbols), axis=1).dropna()
+        else:
+            # Só renda fixa: dias úteis do período
+            data = pd.DataFrame(index=pd.bdate_range(start, end or pd.Timestamp.now().normalize()))
+        if fx_symbols:
+            rates = daily_rates(frame.reindex(data.index), list(currency.values()))
+            data[list(symbols)] = data[list(symbols)].to_numpy() * rates
+        try:
+            cdi = self.rates.index_on("CDI", data.index)
+            for t in RATE_ASSETS:
+                if t in tickers:
+                    data[t] = cdi if t == "CDI" else self.rates.index_on(t, data.index)
+        except LookupError as e:
+            raise ValueError(f"sem série de taxa para o período ({e})") from None
+        ibov = None
+        if BENCHMARKS["IBOV"] in frame.columns:
+            ibov = frame[BENCHMARKS["IBOV"]].reindex(data.index).ffill().bfill().to_numpy()
+        return data, cdi, ibov
+
+    def run(self, request):
+        defaults = {k: request[k] for k in ("weights", "rebalance", "fee_pct", "initial") if k in request}
+        specs = request.get("scenarios") or [{}]
+        if len(specs) > BACKTEST_MAX_SCENARIOS:
+            raise ValueError(f"máximo de {BACKTEST_MAX_SCENARIOS} cenários")
+        scenarios = [parse_scenario(s, defaults) for s in specs]
+        end = pd.Timestamp(request["end"]) if request.get("end") else None
+        start = pd.Timestamp(request["start"]) if request.get("start") else (
+            (end or pd.Timestamp.now().normalize()) - pd.DateOffset(years=10)
+        )
+        if not request.get("start"):
+            # Janela padrão começa onde há CDI (taxa livre de risco de todos os cenários)
+            first = self.rates.first_date("CDI")
+            if first is not None:
+                start = max(start, pd.Timestamp(first))
+        if end is not None and end <= start:
+            raise ValueError("end deve ser depois de start")
+
+        tickers = list(dict.fromkeys(t for s in scenarios for t in s["weights"]))
+        data, cdi, ibov = self._matrix(tickers, start, end)
+        if len(data) < 2:
+            raise ValueError("período curto demais")
+        prices = data[tickers].to_numpy(dtype=np.float64)
+        dates = data.index
+        jobs = [{**s, "weights": np.array([s["weights"].get(t, 0.0) for t in tickers])} for s in scenarios]
+        results = run_many(prices, dates, jobs, rf=cdi, workers=self.workers)
+
+        benchmarks = {}
+        initial = scenarios[0]["initial"]
+        for name, series in (("IBOV", ibov), ("CDI", cdi)):
+            if series is None:
+                continue
+            benchmarks[name] = _run_one(
+                np.asarray(series, dtype=np.float64)[:, None], dates, cdi,
+                {"weights": [1.0], "rebalance": "none", "initial": initial},
+            )
+
+        return {
+            "window": {"start": dates[0].strftime("%Y-%m-%d"), "end": dates[-1].strftime("%Y-%m-%d"), "days": len(dates)},
+            "dates": dates.strftime("%Y-%m-%d").tolist(),
+            "scenarios": [
+                {
+                    "name": s["name"] or f"cenario_{i + 1}",
+                    "weights": {t: round(w * 100, 4) for t, w in s["weights"].items()},
+                    "rebalance": s["rebalance"],
+                    **r,
+                }
+                for i, (s, r) in enumerate(zip(scenarios, results))
+            ],
+            "benchmarks": benchmarks,
+        }
@@ -0,0 +1,622 @@
+"""
+Offline benchmark for the API.
+
+Runs main.app under uvicorn against local stand-ins:
+- FakeYF: replaces yfinance, replays recorded quotes/dividends (or a deterministic
+  synthetic series for symbols that were never recorded), with optional latency
+- FakePostgREST: tiny HTTP server that answers /rest/v1/<table> from a generated
+  portfolio (plus a canned news RSS feed at /rss), with optional latency
+
+Measures p50/p99 latency and throughput per endpoint and portfolio size, and
+compares against a previous run to catch regressions.
+
+Uso:
+    python benchmark.py                                  # 10/100/1000 ativos
+    python benchmark.py --sizes 100 --yahoo-latency 50 --save bench_results/base.json
+    python benchmark.py --compare bench_results/base.json --threshold 0.15
+    python benchmark.py --record bench_fixtures/yahoo.json   # grava do Yahoo real
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+
+import deadline
+from news_store import NewsStore
+
+USER_ID = "a114b418-ec3c-407e-a2f2-06c3c453b684"
+DEFAULT_SIZES = (10, 100, 1000)
+DEFAULT_ENDPOINTS = ("/assets", "/dividends", "/history", "/market-data", "/dashboard", "/upload-note", "/rebalance")
+REBALANCE_BODY = {"targets": {"Ação": 40, "FII": 25, "Stocks": 20, "Cripto": 5, "Renda Fixa": 10}, "cash": 10000}
+HISTORY_DAYS = 260
+# Pregões por período do yfinance (limitado ao que a série sintética tem)
+PERIOD_ROWS = {"1d": 1, "2d": 2, "5d": 5, "1mo": 21, "3mo": 63, "6mo": 126, "1y": 252, "2y": 504, "5y": 1260, "10y": 2520}
+
+
+# --- FIXTURES ---
+def _seed(symbol):
+    return int(hashlib.md5(symbol.encode()).hexdigest()[:8], 16)
+
+
+def synthetic_series(symbol, days=HISTORY_DAYS):
+    """Deterministic random walk per symbol (business days ending today)."""
+    rng = np.random.default_rng(_seed(symbol))
+    dates = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=days, tz="UTC")
+    start = 5 + rng.random() * 200
+    close = start * np.cumprod(1 + rng.normal(0.0003, 0.015, days))
+    return pd.Series(close, index=dates, name="Close")
+
+
+def synthetic_dividends(symbol, close):
+    rng = random.Random(_seed(symbol))
+    if symbol.endswith("-USD") or symbol.startswith("^") or "=X" in symbol:
+        return pd.Series(dtype=float)
+    dates = close.index[::21] if symbol.endswith("11.SA") else close.index[::63]
+    # Um ex-date futuro de vez em quando
+    if rng.random() < 0.3:
+        dates = dates.append(pd.DatetimeIndex([close.index[-1] + pd.Timedelta(days=15)]))
+    values = [round(float(close.iloc[-1]) * rng.uniform(0.002, 0.01), 4) for _ in dates]
+    return pd.Series(values, index=dates)
+
+
+def make_portfolio(size):
+    """Mix of B3 stocks, FIIs, US stocks, crypto and fixed income, like real users."""
+    rng = random.Random(size)
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    rows = []
+    for i in range(size):
+        kind = rng.choices(
+            ["Ação", "FII", "Stocks", "Cripto", "Renda Fixa"], weights=[45, 25, 20, 5, 5]
+        )[0]
+        stem = "".join(rng.choice(letters) for _ in range(4))
+        if kind == "Ação":
+            ticker = f"{stem}{rng.choice([3, 4])}"
+        elif kind == "FII":
+            ticker = f"{stem}11"
+        elif kind == "Stocks":
+            ticker = stem[: rng.choice([3, 4])]
+        elif kind == "Cripto":
+            ticker = rng.choice(["BTC", "ETH", "SOL", "ADA"])
+        else:
+            ticker = rng.choice(["CDB", "TESOURO IPCA", "LCI", "SELIC"])
+        rows.append(
+            {
+                "id": i + 1,
+                "user_id": USER_ID,
+                "ticker": ticker,
+                "quantity": rng.randint(1, 500),
+                "average_price": round(rng.uniform(5, 300), 2),
+                "category": kind,
+            }
+        )
+    return rows
+
+
+def make_master(portfolio, coverage=0.8):
+    """assets_master rows for most of the portfolio (the rest exercises the fallback)."""
+    kinds = {
+        "Ação": ("stock_br", "BRL", "B3"),
+        "FII": ("fii", "BRL", "B3"),
+        "Stocks": ("stock_us", "USD", "NASDAQ"),
+        "Cripto": ("crypto", "USD", "CRYPTO"),
+    }
+    rng = random.Random(len(portfolio))
+    master = {}
+    for row in portfolio:
+        if row["category"] in kinds and rng.random() < coverage:
+            asset_type, currency, exchange = kinds[row["category"]]
+            # Parte dos internacionais listada na Europa (câmbio EURBRL=X)
+            if row["category"] == "Stocks" and rng.random() < 0.2:
+                asset_type, currency, exchange = "etf_us", "EUR", "XETRA"
+            master[row["ticker"]] = {
+                "ticker": row["ticker"],
+                "name": row["ticker"],
+                "type": asset_type,
+                "currency": currency,
+                "exchange": exchange,
+            }
+    return list(master.values())
+
+
+class FixtureStore:
+    """Recorded Yahoo responses keyed by Yahoo symbol, synthetic fallback otherwise."""
+
+    def __init__(self, path=None):
+        self.prices = {}
+        self.dividends = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                raw = json.load(f)
+            for sym, rec in raw.get("prices", {}).items():
+                self.prices[sym] = pd.Series(
+                    rec["close"], index=pd.to_datetime(rec["dates"], utc=True), name="Close"
+                )
+            for sym, rec in raw.get("dividends", {}).items():
+                self.dividends[sym] = pd.Series(
+                    rec["values"], index=pd.to_datetime(rec["dates"], utc=True), dtype=float
+                )
+
+    def close(self, symbol):
+        if symbol not in self.prices:
+            self.prices[symbol] = synthetic_series(symbol)
+        return self.prices[symbol]
+
+    def divs(self, symbol):
+        if symbol not in self.dividends:
+            self.dividends[symbol] = synthetic_dividends(symbol, self.close(symbol))
+        return self.dividends[symbol]
+
+
+def record_fixtures(path, symbols):
+    """Grava respostas reais do Yahoo para replay offline."""
+    import yfinance as yf
+
+    out = {"prices": {}, "dividends": {}}
+    for sym in symbols:
+        try:
+            obj = yf.Ticker(sym)
+            hist = obj.history(period="1y")
+            if not hist.empty:
+                out["prices"][sym] = {
+                    "dates": [d.isoformat() for d in hist.index],
+                    "close": [float(v) for v in hist["Close"]],
+                }
+            divs = obj.dividends
+            out["dividends"][sym] = {
+                "dates": [d.isoformat() for d in divs.index],
+                "values": [float(v) for v in divs],
+            }
+            print(f"REC {sym}: {len(hist)} preços, {len(divs)} dividendos")
+        except Exception as e:
+            print(f"REC {sym} falhou: {e}")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(out, f)
+
+
+# --- STAND-IN: YFINANCE ---
+class _FastInfo:
+    def __init__(self, close):
+        self.last_price = float(close.iloc[-1])
+        self.previous_close = float(close.iloc[-2]) if len(close) > 1 else self.last_price
+
+
+# Chamadas feitas pelo próprio harness (reset_caches) não entram em yahoo_calls_per_req.
+# ContextVar: vale também nas threads do pool de upstream (deadline.fetch_all copia o contexto)
+_HARNESS_SETUP = contextvars.ContextVar("harness_setup", default=False)
+
+
+class FakeYF:
+    """Drop-in for the subset of the yfinance API used by main.py."""
+
+    def __init__(self, store, latency_ms=0.0):
+        self.store = store
+        self.latency = latency_ms / 1000.0
+        self.calls = 0  # só as dos requests medidos
+        self.setup_calls = 0
+        self._lock = threading.Lock()
+
+    def _hit(self):
+        with self._lock:
+            if _HARNESS_SETUP.get():
+                self.setup_calls += 1
+            else:
+                self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def Ticker(self, symbol):
+        return _FakeTicker(self, symbol)
+
+    def download(self, tickers, start=None, end=None, period=None, progress=False, **kwargs):
+        self._hit()
+        symbols = [tickers] if isinstance(tickers, str) else list(tickers)
+        frames = {}
+        for sym in symbols:
+            close = self.store.close(sym)
+            if start is not None:
+                close = close[close.index >= pd.Timestamp(start, tz="UTC")]
+            if end is not None:
+                close = close[close.index <= pd.Timestamp(end, tz="UTC")]
+            if period is not None:
+                close = close.iloc[-PERIOD_ROWS.get(period, len(close)):]
+            frames[sym] = close
+        if isinstance(tickers, str):
+            df = frames[tickers].to_frame("Close")
+            df.index = df.index.tz_localize(None)
+            return df
+        df = pd.concat({("Close", s): c for s, c in frames.items()}, axis=1)
+        df.index = df.index.tz_localize(None)
+        return df
+
+
+class _FakeTicker:
+    def __init__(self, yf, symbol):
+        self._yf = yf
+        self.ticker = symbol
+
+    @property
+    def fast_info(self):
+        self._yf._hit()
+        return _FastInfo(self._yf.store.close(self.ticker))
+
+    def history(self, period="1mo", **kwargs):
+        self._yf._hit()
+        close = self._yf.store.close(self.ticker)
+        n = PERIOD_ROWS.get(period, len(close))
+        return close.iloc[-n:].to_frame("Close")
+
+    @property
+    def dividends(self):
+        self._yf._hit()
+        return self._yf.store.divs(self.ticker).copy()
+
+    @property
+    def calendar(self):
+        self._yf._hit()
+        divs = self._yf.store.divs(self.ticker)
+        if divs.empty:
+            return {}
+        future = divs[divs.index > pd.Timestamp.now(tz=divs.index.tz)]
+        return {"Ex-Dividend Date": future.index[0].date()} if len(future) else {}
+
+
+# --- STAND-IN: POSTGREST ---
+FAKE_RSS = "<rss><channel>" + "".join(
+    f"<item><title>Notícia {i}</title><link>https://example.com/{i}</link>"
+    f"<pubDate>Mon, 0{i % 9 + 1} Sep 2025 10:00:00 GMT</pubDate><source>Bench</source></item>"
+    for i in range(10)
+) + "</channel></rss>"
+
+
+def _cmp_key(value):
+    # Chaves numéricas (id) comparadas como número, o resto como texto
+    try:
+        return (0, float(value), "")
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+
+_COMPARE = {
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+
+class FakePostgREST:
+    """Threaded local server answering /rest/v1/<table> from in-memory rows."""
+
+    def __init__(self, tables, latency_ms=0.0):
+        self.tables = tables
+        self.latency = latency_ms / 1000.0
+        self.calls = 0
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body, status=200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                store.calls += 1
+                if store.latency:
+                    time.sleep(store.latency)
+                url = urlparse(self.path)
+                if url.path.startswith("/rss"):
+                    return self._reply_rss()
+                table = url.path.rsplit("/", 1)[-1]
+                rows = store.tables.get(table, [])
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                for key, raw in query.items():
+                    if key in ("select", "limit", "order", "or", "offset"):
+                        continue
+                    op, _, val = raw.partition(".")
+                    if op == "eq":
+                        rows = [r for r in rows if str(r.get(key)) == val]
+                    elif op == "in":
+                        allowed = set(val.strip("()").split(","))
+                        rows = [r for r in rows if str(r.get(key)) in allowed]
+                    elif op in _COMPARE:
+                        rows = [r for r in rows if _COMPARE[op](_cmp_key(r.get(key)), _cmp_key(val))]
+                if "order" in query:
+                    col, _, direction = query["order"].partition(".")
+                    rows = sorted(rows, key=lambda r: _cmp_key(r.get(col)), reverse=direction == "desc")
+                if "limit" in query:
+                    rows = rows[: int(query["limit"])]
+                if query.get("select", "*") != "*":
+                    cols = query["select"].split(",")
+                    rows = [{c: r.get(c) for c in cols} for r in rows]
+                self._reply(rows)
+
+            def _reply_rss(self):
+                data = FAKE_RSS.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/rss+xml")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _write(self):
+                store.calls += 1
+                if store.latency:
+                    time.sleep(store.latency)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"[]") if length else []
+                self._reply(body if isinstance(body, list) else [body], status=201)
+
+            do_POST = do_PATCH = do_DELETE = _write
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+
+
+# --- NOTA DE CORRETAGEM SINTÉTICA ---
+def _br_number(value):
+    return f"{value:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def make_note_pdf(n_trades=40):
+    """Minimal one-page PDF with SINACUR trade lines, readable by pdfplumber."""
+    lines = ["NOTA DE NEGOCIACAO", "Data pregão 15/08/2025", "XP INVESTIMENTOS CCTVM S.A."]
+    rng = random.Random(n_trades)
+    for _ in range(n_trades):
+        stem = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(4))
+        qty = rng.randint(1, 9) * 100
+        price = round(rng.uniform(5, 90), 2)
+        lines.append(
+            f"1-BOVESPA {rng.choice('CV')} VISTA {stem}{rng.choice([3, 4])} EMPRESA ON "
+            f"{qty} {_br_number(price)} {_br_number(qty * price)} D"
+        )
+
+    content = ["BT", "/F1 8 Tf", "10 TL", "20 800 Td"]
+    for line in lines:
+        esc = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content.append(f"({esc}) Tj T*")
+    content.append("ET")
+    stream = "\n".join(content).encode("latin-1")
+    objs = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+        b"/Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objs, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objs) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objs) + 1, xref)
+    return bytes(out)
+
+
+# --- HARNESS ---
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Harness:
+    """Starts main.app on a free port wired to the stand-ins."""
+
+    def __init__(self, yahoo_latency_ms=0.0, supabase_latency_ms=0.0, fixtures=None):
+        import uvicorn
+
+        import main
+
+        self.main = main
+        self.store = FixtureStore(fixtures)
+        self.yf = FakeYF(self.store, yahoo_latency_ms)
+        self.db = FakePostgREST({"portfolios": [], "assets_master": []}, supabase_latency_ms)
+
+        main.yf = self.yf
+        # O stand-in não é o Yahoo: sem rate limit, para medir só o código
+        main.yahoo.bucket.rate = main.yahoo.bucket.max_rate = 1e9
+        main.yahoo.bucket.burst = 1e9
+        main.SUPABASE_URL = self.db.url
+        main.SUPABASE_KEY = "bench"
+        main.NEWS_RSS_URL = self.db.url + "/rss/search"
+        main.NEWS_STORE = NewsStore(main.NEWS_STORE.feed_url, db_path=":memory:")
+        main.RATES.start = lambda: None  # séries do BCB: só o arquivo local, sem rede
+        main.PORTFOLIO_HISTORY.start = lambda *args: None  # snapshot diário fora do benchmark
+        main.DIVIDEND_FORECAST.start = lambda *args: None
+        main.PRICE_STORE.cache_dir = None  # sem CSV em data/cache durante o benchmark
+        logging.getLogger("main").setLevel(logging.WARNING)
+
+        port = _free_port()
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.01)
+        main.WARMUP.wait(10)  # warmup não concorre com as medições
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.session = requests.Session()
+        self.note_pdf = make_note_pdf()
+
+    def load_portfolio(self, size):
+        rows = make_portfolio(size)
+        self.db.tables["portfolios"] = rows
+        self.db.tables["assets_master"] = make_master(rows)
+        self.main.resolver.loaded_at = 0  # força recarga do assets_master
+        self.reset_caches()
+
+    def reset_caches(self):
+        """Cold path: drop every in-process cache between requests."""
+        self.main.MARKET_CACHE.clear()
+        self.main.FX.clear()
+        self.main.MARKET_SNAPSHOT.clear()
+        self.main.yahoo.cache.clear()
+        self.main.yahoo.fetched_at.clear()
+        self.main.PORTFOLIO_SNAPSHOTS.invalidate(USER_ID)
+        self.main.PORTFOLIO_HISTORY._series.clear()
+        self.main.PRICE_STORE.clear()
+        self.main.DIVIDEND_FORECAST.clear()
+        # O que o warmup/loop diário faz em produção (o /dividends só lê o store)
+        token = _HARNESS_SETUP.set(True)
+        try:
+            deadline.start(60)
+            self.main.DIVIDEND_FORECAST.refresh(self.main._dividend_symbols())
+        finally:
+            _HARNESS_SETUP.reset(token)
+        self.main.RISK._entries.clear()
+        self.main.NEWS_STORE = NewsStore(self.main.NEWS_STORE.feed_url, db_path=":memory:")
+
+    def call(self, endpoint):
+        if endpoint == "/upload-note":
+            files = {"file": ("nota.pdf", self.note_pdf, "application/pdf")}
+            resp = self.session.post(self.base_url + endpoint, files=files)
+        elif endpoint == "/rebalance":
+            resp = self.session.post(self.base_url + endpoint, json=REBALANCE_BODY)
+        else:
+            resp = self.session.get(self.base_url + endpoint)
+        resp.raise_for_status()
+        return resp
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+        self.db.stop()
+
+
+def measure(harness, endpoint, iterations, concurrency, warm):
+    def one(_):
+        if not warm:
+            harness.reset_caches()
+        t0 = time.perf_counter()
+        harness.call(endpoint)
+        return time.perf_counter() - t0
+
+    harness.call(endpoint)  # warm-up (imports, conexões)
+    calls_before = harness.yf.calls
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(one, range(iterations)))
+    else:
+        samples = [one(i) for i in range(iterations)]
+    wall = time.perf_counter() - start
+
+    arr = np.array(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "mean_ms": round(float(arr.mean()), 3),
+        "throughput_rps": round(iterations / wall, 2),
+        "yahoo_calls_per_req": round((harness.yf.calls - calls_before) / iterations, 2),
+    }
+
+
+def run(sizes, endpoints, iterations, concurrency, warm, yahoo_latency, supabase_latency, fixtures):
+    harness = Harness(yahoo_latency, supabase_latency, fixtures)
+    results = {}
+    try:
+        for size in sizes:
+            harness.load_portfolio(size)
+            for endpoint in endpoints:
+                stats = measure(harness, endpoint, iterations, concurrency, warm)
+                results[f"{endpoint}@{size}"] = stats
+                print(
+                    f"{endpoint:<14} n={size:<5} p50={stats['p50_ms']:>9.2f}ms "
+                    f"p99={stats['p99_ms']:>9.2f}ms {stats['throughput_rps']:>8.2f} req/s "
+                    f"yahoo/req={stats['yahoo_calls_per_req']}"
+                )
+    finally:
+        harness.stop()
+    return results
+
+
+def compare(current, baseline, threshold):
+    """Returns the list of regressions (p50 or p99 worse than baseline by > threshold)."""
+    regressions = []
+    for key, stats in current.items():
+        base = baseline.get(key)
+        if not base:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if base[metric] > 0 and stats[metric] > base[metric] * (1 + threshold):
+                regressions.append(
+                    f"{key} {metric}: {base[metric]:.2f} -> {stats[metric]:.2f} "
+                    f"(+{(stats[metric] / base[metric] - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main_cli(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark offline da API")
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    ap.add_argument("--endpoints", nargs="+", default=list(DEFAULT_ENDPOINTS))
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=1)
+    ap.add_argument("--warm", action="store_true", help="não limpa caches entre requests")
+    ap.add_argument("--yahoo-latency", type=float, default=0.0, help="ms por chamada yfinance")
+    ap.add_argument("--supabase-latency", type=float, default=0.0, help="ms por chamada PostgREST")
+    ap.add_argument("--fixtures", help="JSON gravado com --record")
+    ap.add_argument("--record", metavar="PATH", help="grava respostas reais do Yahoo e sai")
+    ap.add_argument("--save", metavar="PATH")
+    ap.add_argument("--compare", metavar="PATH")
+    ap.add_argument("--threshold", type=float, default=0.10)
+    args = ap.parse_args(argv)
+
+    if args.record:
+        symbols = ["^BVSP", "^GSPC", "BTC-USD", "USDBRL=X", "PETR4.SA", "VALE3.SA",
+                   "ITUB4.SA", "KNIP11.SA", "MXRF11.SA", "AAPL", "MSFT", "VOO"]
+        record_fixtures(args.record, symbols)
+        return 0
+
+    results = run(args.sizes, args.endpoints, args.iterations, args.concurrency, args.warm,
+                  args.yahoo_latency, args.supabase_latency, args.fixtures)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.save) or ".", exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for r in regressions:
+            print(f"REGRESSÃO: {r}")
+        if regressions:
+            return 1
+        print("Sem regressões.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
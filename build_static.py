@@ -0,0 +1,141 @@
+"""
+Build step for the static frontend.
+
+- Compiles Tailwind ahead of time (standalone CLI) instead of the in-browser Play CDN
+- Vendors Chart.js / treemap plugin locally
+- Fingerprints every asset (name.<hash>.ext) and precompresses it (gzip + brotli)
+- Writes static/dist/manifest.json, used by static_assets.py at runtime
+
+Uso: python build_static.py
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+
+import requests
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = "static"
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+SOURCE_HTML = os.path.join(STATIC_DIR, "index.html")
+TAILWIND_BIN = os.getenv("TAILWIND_BIN", "tailwindcss")
+
+TAILWIND_CDN_TAG = '<script src="https://cdn.tailwindcss.com"></script>'
+TAILWIND_CONFIG_RE = re.compile(
+    r"\s*<script>\s*tailwind\.config\s*=\s*(\{.*?\})\s*</script>", re.DOTALL
+)
+VENDOR_SCRIPTS = {
+    "chart.min.js": "https://cdn.jsdelivr.net/npm/chart.js@3.9.1/dist/chart.min.js",
+    "chartjs-chart-treemap.min.js": "https://cdn.jsdelivr.net/npm/chartjs-chart-treemap@3.0.0/dist/chartjs-chart-treemap.min.js",
+}
+COMPRESSIBLE = (".html", ".css", ".js", ".json", ".svg")
+
+
+def fingerprint(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    base, ext = os.path.splitext(name)
+    return f"{base}.{digest}{ext}"
+
+
+def precompress(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(raw, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(raw, quality=11))
+
+
+def emit(name, content, manifest, hashed=True):
+    out_name = fingerprint(name, content) if hashed else name
+    out_path = os.path.join(DIST_DIR, out_name)
+    with open(out_path, "wb") as f:
+        f.write(content)
+    if out_name.endswith(COMPRESSIBLE):
+        precompress(out_path)
+    manifest[name] = out_name
+    return f"/static/dist/{out_name}"
+
+
+def build_tailwind(html, config_js):
+    """Runs the Tailwind standalone CLI over the page. Returns CSS bytes or None."""
+    if not shutil.which(TAILWIND_BIN):
+        print(f"AVISO: '{TAILWIND_BIN}' não encontrado, mantendo Tailwind via CDN.")
+        return None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        page = os.path.join(tmp, "index.html")
+        config = os.path.join(tmp, "tailwind.config.js")
+        source_css = os.path.join(tmp, "input.css")
+        out_css = os.path.join(tmp, "app.css")
+
+        with open(page, "w", encoding="utf-8") as f:
+            f.write(html)
+        with open(config, "w", encoding="utf-8") as f:
+            f.write(f"module.exports = Object.assign({config_js}, {{content: [{json.dumps(page)}]}});\n")
+        with open(source_css, "w", encoding="utf-8") as f:
+            f.write("@tailwind base;\n@tailwind components;\n@tailwind utilities;\n")
+
+        proc = subprocess.run(
+            [TAILWIND_BIN, "-c", config, "-i", source_css, "-o", out_css, "--minify"],
+            capture_output=True,
+            text=True,
+        )
+        if proc.returncode != 0:
+            print(f"ERRO Tailwind: {proc.stderr}")
+            return None
+        with open(out_css, "rb") as f:
+            return f.read()
+
+
+def build():
+    shutil.rmtree(DIST_DIR, ignore_errors=True)
+    os.makedirs(DIST_DIR)
+    manifest = {}
+
+    with open(SOURCE_HTML, encoding="utf-8") as f:
+        html = f.read()
+
+    # 1. Tailwind pré-compilado (sem compilar no browser)
+    config_match = TAILWIND_CONFIG_RE.search(html)
+    css = build_tailwind(html, config_match.group(1)) if config_match else None
+    if css is not None:
+        href = emit("app.css", css, manifest)
+        html = html.replace(TAILWIND_CDN_TAG, f'<link href="{href}" rel="stylesheet" />')
+        html = html.replace(config_match.group(0), "")
+
+    # 2. Vendor JS (Chart.js) servido localmente
+    for name, url in VENDOR_SCRIPTS.items():
+        try:
+            resp = requests.get(url, timeout=30)
+            resp.raise_for_status()
+        except Exception as e:
+            print(f"AVISO: Falha ao baixar {url}: {e}. Mantendo CDN.")
+            continue
+        src = emit(name, resp.content, manifest)
+        html = html.replace(f'<script src="{url}"></script>', f'<script src="{src}"></script>')
+
+    # 3. HTML de entrada (nome fixo, não é cacheado como immutable)
+    emit("index.html", html.encode("utf-8"), manifest, hashed=False)
+
+    with open(os.path.join(DIST_DIR, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"Static build OK: {len(manifest)} arquivos em {DIST_DIR}")
+    if brotli is None:
+        print("AVISO: brotli não instalado, gerados apenas .gz")
+    return manifest
+
+
+if __name__ == "__main__":
+    build()
@@ -0,0 +1,165 @@
+"""
+Currency engine: converts values quoted in any currency to BASE_CURRENCY (BRL).
+
+The currency of each position comes from assets_master (Instrument.currency)
+instead of the old BRL-or-USD split, so EUR-listed ETFs or GBp London listings
+are valued with their own rate:
+
+- Rates are Yahoo FX pairs (<CCY>BRL=X). Only the pairs older than FX_TTL_S are
+  fetched, all in one batch (update_prices adds them to its quote fetch_many)
+- Aliases: stablecoins are treated as their backing currency (no extra pair)
+  and GBp/GBX (pence) as GBP / 100
+- factors() maps a column of currency codes to rates with one np.unique +
+  take: the per-request cost does not grow with the number of currencies
+- daily_rates() does the same per day for the analytics over price_store
+  (/risk, /backtest), with the pair closes as columns of the price matrix
+
+Uso:
+    FX = CurrencyEngine(yahoo)
+    symbols = FX.due({"USD", "EUR"})    # pares vencidos (buscar junto com as cotações)
+    FX.update(quotes, stale)            # {"EURBRL=X": (price, prev_close)}
+    FX.factors(["BRL", "USD", "EUR"])   # array([1.0, 5.1, 5.9])
+"""
+import logging
+import os
+import threading
+import time
+
+from lazy_imports import optional
+
+np = optional("numpy")
+
+logger = logging.getLogger(__name__)
+
+BASE_CURRENCY = os.getenv("BASE_CURRENCY", "BRL")
+FX_TTL_S = float(os.getenv("FX_TTL_S", "300"))
+# Enquanto o par nunca respondeu (mesmo fallback do antigo usd_rate)
+FX_FALLBACK = {"USD": 5.0}
+
+# código cadastrado -> (moeda cotada no Yahoo, multiplicador)
+CURRENCY_ALIASES = {
+    "USDT": ("USD", 1.0),
+    "USDC": ("USD", 1.0),
+    "DAI": ("USD", 1.0),
+    "GBp": ("GBP", 0.01),
+    "GBX": ("GBP", 0.01),
+}
+
+
+def normalize(code, base=BASE_CURRENCY):
+    """(currency quoted by Yahoo, multiplier) for a currency code from assets_master."""
+    code = str(code or base).strip()
+    alias = CURRENCY_ALIASES.get(code) or CURRENCY_ALIASES.get(code.upper())
+    return alias or (code.upper(), 1.0)
+
+
+def pair_symbol(currency, base=BASE_CURRENCY):
+    """Yahoo symbol of the currency -> base pair (None for the base currency)."""
+    currency, _ = normalize(currency, base)
+    return None if currency == base else f"{currency}{base}=X"
+
+
+def pair_symbols(codes, base=BASE_CURRENCY):
+    """Pair symbols needed to convert `codes` (sorted, without duplicates)."""
+    return sorted({s for s in (pair_symbol(c, base) for c in set(codes)) if s})
+
+
+def daily_rates(frame, codes, base=BASE_CURRENCY):
+    """
+    (days x len(codes)) conversion rates from the pair columns of `frame`
+    (price_store matrix). A pair without series leaves the column unconverted
+    (multiplier only), as before for USD without USDBRL=X.
+    """
+    out = np.ones((len(frame), len(codes)), dtype=np.float64)
+    for j, code in enumerate(codes):
+        currency, mult = normalize(code, base)
+        symbol = None if currency == base else f"{currency}{base}=X"
+        if symbol and symbol in frame.columns:
+            out[:, j] = frame[symbol].ffill().bfill().to_numpy(dtype=np.float64)
+        out[:, j] *= mult
+    return out
+
+
+class CurrencyEngine:
+    def __init__(self, yahoo, base=BASE_CURRENCY, ttl_s=FX_TTL_S, fallback=None):
+        self.yahoo = yahoo
+        self.base = base
+        self.ttl_s = ttl_s
+        self.fallback = dict(FX_FALLBACK if fallback is None else fallback)
+        self.rates = {}  # moeda -> última cotação boa
+        self.fetched_at = {}  # moeda -> monotonic da última cotação não-stale
+        self._warned = set()
+        self._lock = threading.Lock()
+
+    def due(self, codes, now=None):
+        """Pair symbols of `codes` whose rate is missing or older than ttl_s."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return {
+                f"{c}{self.base}=X"
+                for c in {normalize(code, self.base)[0] for code in codes}
+                if c != self.base and now - self.fetched_at.get(c, float("-inf")) >= self.ttl_s
+            }
+
+    def update(self, quotes, stale=()):
+        """Stores the pair quotes found in `quotes` (fetch_many result); stale ones stay due."""
+        suffix = f"{self.base}=X"
+        now = time.monotonic()
+        with self._lock:
+            for symbol, quote in quotes.items():
+                if not symbol.endswith(suffix) or len(symbol) != len(suffix) + 3 or not quote or not quote[0]:
+                    continue
+                currency = symbol[:3]
+                self.rates[currency] = float(quote[0])
+                if symbol not in stale:
+                    self.fetched_at[currency] = now
+
+    def refresh(self, codes):
+        """Fetches the due pairs of `codes` in one batch; returns the stale pair symbols."""
+        symbols = self.due(codes)
+        if not symbols:
+            return set()
+        quotes, stale = self.yahoo.fetch_many("quote", symbols)
+        self.update(quotes, stale)
+        return stale | (symbols - set(quotes))
+
+    def rate(self, code):
+        """Rate of one unit of `code` in the base currency (fallback, then 1.0, if never quoted)."""
+        currency, mult = normalize(code, self.base)
+        if currency == self.base:
+            return mult
+        value = self.rates.get(currency) or self.fallback.get(currency)
+        if value is None:
+            if currency not in self._warned:
+                self._warned.add(currency)
+                logger.warning("fx rate unavailable currency=%s base=%s", currency, self.base)
+            value = 1.0
+        return value * mult
+
+    def factors(self, codes):
+        """Rate per element of `codes` (one lookup per distinct currency)."""
+        codes = np.asarray([c or self.base for c in codes], dtype=object).astype(str)
+        if not len(codes):
+            return np.ones(0, dtype=np.float64)
+        labels, inverse = np.unique(codes, return_inverse=True)
+        table = np.array([self.rate(c) for c in labels.tolist()], dtype=np.float64)
+        return table[inverse]
+
+    def unavailable(self, codes):
+        """Codes (as given) whose currency has no live rate yet (fallback in use)."""
+        out = set()
+        for code in set(codes):
+            currency, _ = normalize(code, self.base)
+            if currency != self.base and currency not in self.rates:
+                out.add(code)
+        return out
+
+    def snapshot(self):
+        """{currency: rate} (warmup report)."""
+        with self._lock:
+            return dict(sorted(self.rates.items()))
+
+    def clear(self):
+        with self._lock:
+            self.rates.clear()
+            self.fetched_at.clear()
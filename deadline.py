@@ -0,0 +1,91 @@
+"""
+Per-request latency budget for upstream fan-out.
+
+The HTTP middleware starts a Deadline for every request (REQUEST_BUDGET_S, or the
+X-Request-Budget-Ms header when it is smaller: a client can only tighten the cap). fetch_all() runs independent upstream calls on a
+shared pool and returns whatever finished before the deadline; the caller decides
+the fallback for the keys still pending (last cached value, average_price, ...).
+"""
+import contextvars
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+REQUEST_BUDGET_S = float(os.getenv("REQUEST_BUDGET_S", "4.0"))
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", "32"))
+
+# Pool compartilhado: chamadas travadas continuam rodando aqui, mas a resposta não espera
+_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+
+_current = contextvars.ContextVar("request_deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, budget_s=REQUEST_BUDGET_S):
+        self.budget = budget_s
+        self.expires_at = time.monotonic() + budget_s
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+
+def parse_budget(header):
+    """
+    Budget in seconds from an X-Request-Budget-Ms value, capped at REQUEST_BUDGET_S.
+    Invalid, non-finite or non-positive values are ignored (None: default budget).
+    """
+    if not header:
+        return None
+    try:
+        budget_ms = float(header)
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(budget_ms) or budget_ms <= 0:
+        return None
+    return min(budget_ms / 1000, REQUEST_BUDGET_S)
+
+
+def start(budget_s=None):
+    """Binds a new deadline to the current request context."""
+    deadline = Deadline(REQUEST_BUDGET_S if budget_s is None else budget_s)
+    _current.set(deadline)
+    return deadline
+
+
+def current():
+    """Deadline of the running request (a fresh one outside of a request)."""
+    deadline = _current.get()
+    if deadline is None:
+        deadline = start()
+    return deadline
+
+
+def upstream_timeout(floor=0.5):
+    """Socket timeout for a single upstream call, bounded by the request deadline."""
+    return max(floor, current().remaining())
+
+
+def fetch_all(jobs, deadline=None):
+    """
+    Runs {key: callable} concurrently and waits at most until the deadline.
+    Returns (results, pending): results maps key -> return value for jobs that
+    finished without raising; pending is the set of keys that did not finish in time.
+    Jobs that raised are in neither (the caller treats them as plain misses).
+    """
+    if not jobs:
+        return {}, set()
+    deadline = deadline or current()
+    futures = {
+        _executor.submit(contextvars.copy_context().run, fn): key for key, fn in jobs.items()
+    }
+    done, not_done = wait(futures, timeout=deadline.remaining())
+
+    results = {}
+    for fut in done:
+        if fut.exception() is None:
+            results[futures[fut]] = fut.result()
+    return results, {futures[fut] for fut in not_done}
@@ -1,3 +1,5 @@
+from ticker_resolver import resolve_fallback
+
 # Mock imports
 try:
     import yfinance as yf
@@ -15,7 +17,6 @@ def update_prices(assets_data):
 
         tickers_map = {}
         tickers_to_fetch = []
-        IGNORE_KEYWORDS = ["SELIC", "CDI", "TESOURO", "POUPANÇA", "VISTA"]
 
         for item in assets_data:
             if not item:
@@ -23,22 +24,13 @@ def update_prices(assets_data):
             original = item.get("ticker")
             if not original:
                 continue
-            upper_ticker = str(original).upper()
-            if any(keyword in upper_ticker for keyword in IGNORE_KEYWORDS):
+            # Mesmas regras do main.py (sem assets_master aqui, só o fallback)
+            inst = resolve_fallback(original, item.get("category"))
+            if not inst.priced:
                 continue
-            yahoo_ticker = original
-            category = item.get("category")
-            if category:
-                cat = str(category).lower()
-                if "cripto" in cat:
-                    if "-" not in original:
-                        yahoo_ticker = f"{original}-USD"
-                elif "ação" in cat or "fii" in cat or "renda" in cat:
-                    if not original.endswith(".SA") and len(original) <= 6:
-                        yahoo_ticker = f"{original}.SA"
-            tickers_map[yahoo_ticker] = original
-            tickers_to_fetch.append(yahoo_ticker)
-            print(f"Added to fetch: {yahoo_ticker}")
+            tickers_map[inst.yahoo] = original
+            tickers_to_fetch.append(inst.yahoo)
+            print(f"Added to fetch: {inst.yahoo}")
 
         if not tickers_to_fetch:
             print("No tickers to fetch")
@@ -0,0 +1,264 @@
+"""
+Dividend forecast for the next 12 months, precomputed once a day.
+
+Yahoo's .dividends rarely lists an ex-date after today, so "upcoming" was
+almost always empty. Instead, every held symbol's per-share history is kept
+in memory and, once a day, the whole store is projected in one vectorized pass:
+
+- projected: each payment of the last 12 months repeated one year later
+  (seasonal naive: monthly FIIs, quarterly/semiannual stocks keep their cadence
+  and last amounts)
+- announced: future-dated rows in .dividends (amount known) and the next
+  ex-dividend date from Ticker.calendar (amount taken from the projection of
+  that month, or the last payment); an announced event replaces the projection
+  for the same symbol and month
+
+/dividends only reads the store and multiplies the per-share events by the
+user's quantities: no Yahoo call inside the request. The warmup and a daily
+background refresh fill it for every symbol held in any portfolio; a holding
+that was never loaded is reported as pending by request() and handed to the
+background loop, which fetches it right away.
+
+Uso:
+    FORECAST = DividendForecast(yahoo)
+    FORECAST.refresh(symbols)     # busca o que falta hoje e recalcula a projeção (background)
+    FORECAST.request(symbols)     # nunca carregados: agenda no background, devolve os pendentes
+    FORECAST.outdated(symbols)    # carregados num dia anterior, ainda não atualizados hoje
+    FORECAST.events(symbols)      # DataFrame symbol,date,amount,status (por ação)
+"""
+import datetime as dt
+import logging
+import os
+import threading
+
+import deadline
+from lazy_imports import optional
+
+np = optional("numpy")
+pd = optional("pandas")
+
+logger = logging.getLogger(__name__)
+
+DIVIDEND_CALENDAR = os.getenv("DIVIDEND_CALENDAR", "1") == "1"  # datas anunciadas via Ticker.calendar
+DIVIDEND_REFRESH_CHECK_S = 600
+DIVIDEND_REFRESH_BUDGET_S = float(os.getenv("DIVIDEND_REFRESH_BUDGET_S", "60"))  # prazo de cada volta do loop
+PAID, ANNOUNCED, PROJECTED = "paid", "announced", "projected"
+COLUMNS = ["symbol", "date", "amount", "status"]
+
+
+def _empty():
+    return pd.DataFrame({
+        "symbol": pd.Series(dtype=object),
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "amount": pd.Series(dtype="float64"),
+        "status": pd.Series(dtype=object),
+    })
+
+
+def _naive_dates(series):
+    """Ex-dates without timezone, at midnight (Yahoo returns them in the exchange's tz)."""
+    series = series.dropna().astype("float64")
+    index = pd.DatetimeIndex(series.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return pd.Series(series.to_numpy(), index=index.normalize())
+
+
+def _ex_date(calendar):
+    """Next ex-dividend date from a Ticker.calendar dict (None when absent)."""
+    if not isinstance(calendar, dict):
+        return None
+    value = calendar.get("Ex-Dividend Date")
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else None
+    if value is None:
+        return None
+    try:
+        ts = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    return (ts.tz_localize(None) if ts.tz is not None else ts).normalize()
+
+
+def project(paid, announced, today):
+    """
+    paid: symbol,date,amount (per share, ex-dates <= today); announced: same
+    columns, amount NaN when unknown. Returns the next-12-month events with status.
+    """
+    horizon = today + pd.DateOffset(years=1)
+    recent = paid[(paid["date"] > today - pd.DateOffset(years=1)) & (paid["date"] <= today)]
+    projected = recent.assign(date=recent["date"] + pd.DateOffset(years=1), status=PROJECTED)
+
+    announced = announced[(announced["date"] > today) & (announced["date"] <= horizon)]
+    announced = announced.sort_values("amount", na_position="last", kind="stable")
+    announced = announced.drop_duplicates(["symbol", "date"]).assign(status=ANNOUNCED)
+    if announced.empty:
+        return projected[COLUMNS].reset_index(drop=True)
+
+    # Data do calendar num mês que já tem anúncio com valor: é o mesmo evento
+    month = announced["date"].dt.to_period("M")
+    keys = pd.MultiIndex.from_arrays([announced["symbol"], month])
+    valued = announced["amount"].notna().to_numpy()
+    duplicate = ~valued & keys.isin(keys[valued])
+    announced, month = announced[~duplicate], month[~duplicate]
+
+    # Valor desconhecido: o projetado do mesmo mês, senão o último pago
+    projected_month = projected["date"].dt.to_period("M")
+    by_month = projected.groupby([projected["symbol"], projected_month])["amount"].sum()
+    last_paid = paid.sort_values("date").groupby("symbol")["amount"].last()
+    key = pd.MultiIndex.from_arrays([announced["symbol"], month])
+    fill = by_month.reindex(key).to_numpy()
+    fill = np.where(np.isnan(fill), last_paid.reindex(announced["symbol"]).to_numpy(), fill)
+    announced = announced.assign(amount=announced["amount"].fillna(pd.Series(fill, index=announced.index)))
+    announced = announced[announced["amount"].notna()]
+
+    # Anunciado substitui o projetado do mesmo símbolo/mês
+    taken = pd.MultiIndex.from_arrays([announced["symbol"], announced["date"].dt.to_period("M")])
+    keep = ~pd.MultiIndex.from_arrays([projected["symbol"], projected_month]).isin(taken)
+    events = pd.concat([projected[keep][COLUMNS], announced[COLUMNS]], ignore_index=True)
+    return events.sort_values(["date", "symbol"], kind="stable").reset_index(drop=True)
+
+
+class DividendForecast:
+    def __init__(self, yahoo, calendar=DIVIDEND_CALENDAR):
+        self.yahoo = yahoo
+        self.use_calendar = calendar
+        self.history = {}  # símbolo -> pd.Series por ação (ex-date sem tz), inclui futuros anunciados
+        self.ex_dates = {}  # símbolo -> próxima ex-date do calendar
+        self.fetched_on = {}  # símbolo -> dia do download (também para os sem proventos)
+        # Pagos (12m) + anunciados/projetados (próximos 12m); None até o primeiro rebuild
+        # (o DataFrame vazio não é montado no boot: pandas é import preguiçoso)
+        self.table = None
+        self.built_on = None
+        self._wanted = set()  # pedidos por request(), buscados pelo loop
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def refresh(self, symbols):
+        """Fetches the symbols not downloaded today and rebuilds the projection. Returns the stale ones."""
+        today = dt.date.today()
+        symbols = set(symbols)
+        with self._lock:
+            missing = {s for s in symbols if self.fetched_on.get(s) != today}
+        stale = set()
+        if missing:
+            divs, stale = self.yahoo.fetch_many("dividends", missing)
+            calendars = {}
+            if self.use_calendar:
+                calendars, _ = self.yahoo.fetch_many("calendar", missing)
+            with self._lock:
+                for sym in missing:
+                    if sym in divs:
+                        series = divs[sym]
+                        self.history[sym] = _naive_dates(series) if series is not None else pd.Series(dtype="float64")
+                    if sym in calendars:
+                        self.ex_dates[sym] = _ex_date(calendars[sym])
+                    # Sem proventos no Yahoo também conta como buscado; o que estourou o prazo não
+                    if sym not in stale:
+                        self.fetched_on[sym] = today
+        if missing or self.built_on != today:
+            self.rebuild(today)
+        return stale
+
+    def rebuild(self, today=None):
+        """Recomputes the table for the whole store in one vectorized pass."""
+        today = pd.Timestamp(today or dt.date.today())
+        with self._lock:
+            items = [(s, series) for s, series in self.history.items() if not series.empty]
+            ex_dates = [(s, d) for s, d in self.ex_dates.items() if d is not None]
+        if items:
+            events = pd.DataFrame({
+                "symbol": np.repeat(np.array([s for s, _ in items], dtype=object), [len(x) for _, x in items]),
+                "date": pd.DatetimeIndex(np.concatenate([x.index.to_numpy() for _, x in items])),
+                "amount": np.concatenate([x.to_numpy() for _, x in items]),
+            })
+        else:
+            events = _empty()[["symbol", "date", "amount"]]
+        past = events["date"] <= today
+        paid = events[past]
+        announced = pd.concat([
+            events[~past],
+            pd.DataFrame({
+                "symbol": pd.Series([s for s, _ in ex_dates], dtype=object),
+                "date": pd.DatetimeIndex([d for _, d in ex_dates]),
+                "amount": np.full(len(ex_dates), np.nan),
+            }),
+        ], ignore_index=True)
+
+        recent = paid[paid["date"] > today - pd.DateOffset(years=1)].assign(status=PAID)
+        table = pd.concat([recent[COLUMNS], project(paid, announced, today)], ignore_index=True)
+        with self._lock:
+            self.table = table
+            self.built_on = today.date()
+        logger.info("dividend forecast built symbols=%s events=%s", len(items), len(table))
+        return table
+
+    def events(self, symbols):
+        """Per-share events of `symbols` (paid last 12m, announced/projected next 12m)."""
+        with self._lock:
+            table = self.table
+        if table is None:
+            return _empty()
+        return table[table["symbol"].isin(list(symbols))]
+
+    def request(self, symbols):
+        """
+        Symbols never loaded into the store (pending): queued for the background
+        loop, which is woken up once per new symbol. No Yahoo call here.
+        """
+        with self._lock:
+            pending = {s for s in symbols if s not in self.fetched_on}
+            new = pending - self._wanted
+            self._wanted |= pending
+        if new:
+            self._wake.set()
+        return pending
+
+    def outdated(self, symbols):
+        """Symbols loaded on an earlier day and not refreshed yet (served from the old download)."""
+        today = dt.date.today()
+        with self._lock:
+            return {s for s in symbols if s in self.fetched_on and self.fetched_on[s] != today}
+
+    def clear(self):
+        with self._lock:
+            self.history.clear()
+            self.ex_dates.clear()
+            self.fetched_on.clear()
+            self._wanted.clear()
+            self.table = None
+            self.built_on = None
+
+    # --- Atualização diária (e dos pendentes) ---
+    def _loop(self, symbols):
+        while not self._stop.is_set():
+            self._wake.wait(DIVIDEND_REFRESH_CHECK_S)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            deadline.start(DIVIDEND_REFRESH_BUDGET_S)  # cada volta com prazo próprio
+            with self._lock:
+                wanted = set(self._wanted)
+            try:
+                if self.built_on != dt.date.today():
+                    self.refresh(set(symbols()) | wanted)
+                elif wanted:
+                    self.refresh(wanted)
+            except Exception as e:
+                logger.warning("dividend forecast refresh failed error=%s", e)
+            # Os que estouraram o prazo ficam para a próxima volta (sem novo wake a cada request)
+            with self._lock:
+                self._wanted -= {s for s in wanted if s in self.fetched_on}
+
+    def start(self, symbols):
+        """`symbols()` returns every Yahoo symbol held (the warmup does the first build)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, args=(symbols,), name="dividend-forecast", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,245 @@
+"""
+Background jobs for expensive per-user computations (analyze, history, dividends).
+
+- Job state lives in SQLite (JOBS_DB_PATH), so a status survives the worker
+  that produced it and can be polled from any request
+- Work runs on an in-process pool (JOB_WORKERS), never on the HTTP worker
+- dedup_key = kind:user:input_hash. Submitting while an identical job is queued
+  or running, or finished less than JOB_RESULT_TTL_S ago, returns that job
+  instead of starting another one (bursts get coalesced)
+- wait() blocks until the job finishes; wait_async() is the same for async
+  handlers (long-poll / SSE), without holding a threadpool thread while waiting
+- Every queued/running job is leased by the JobQueue that runs it (owner +
+  lease_at, renewed every JOB_LEASE_S / 3). Only jobs whose lease expired
+  (worker died) are marked "interrupted", so several uvicorn workers can share
+  JOBS_DB_PATH without a new worker failing its siblings' jobs
+
+Uso:
+    queue = JobQueue()
+    queue.register("history", lambda user_id: compute_history(user_id))
+    job = queue.submit("history", user_id, portfolio.fingerprint())
+    queue.wait(job["id"], timeout=10)
+    await queue.wait_async(job["id"], timeout=10)
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import deadline
+import metrics
+
+logger = logging.getLogger(__name__)
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_BUDGET_S = float(os.getenv("JOB_BUDGET_S", "60"))  # prazo das chamadas externas dentro do job
+JOB_RESULT_TTL_S = float(os.getenv("JOB_RESULT_TTL_S", "300"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "30"))
+JOB_RETENTION_S = 86400
+# Job terminado por outro worker não notifica este processo: reconsulta o SQLite
+JOB_POLL_S = 1.0
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+ACTIVE = (QUEUED, RUNNING)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    owner TEXT,
+    lease_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key, created_at);
+"""
+# Bancos criados antes do lease
+_MIGRATIONS = {"owner": "ALTER TABLE jobs ADD COLUMN owner TEXT",
+               "lease_at": "ALTER TABLE jobs ADD COLUMN lease_at REAL"}
+
+_COLUMNS = ("id", "kind", "user_id", "dedup_key", "status", "result", "error",
+            "created_at", "started_at", "finished_at")
+
+
+def _to_dict(row):
+    if row is None:
+        return None
+    job = dict(zip(_COLUMNS, row))
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    return job
+
+
+class JobQueue:
+    def __init__(self, db_path=JOBS_DB_PATH, workers=JOB_WORKERS, result_ttl_s=JOB_RESULT_TTL_S,
+                 lease_s=JOB_LEASE_S):
+        self.handlers = {}
+        self.result_ttl = result_ttl_s
+        self.lease_s = lease_s
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._waiters = {}  # job_id -> {(loop, asyncio.Event)} dos wait_async
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jobs")
+        with self._lock:
+            if db_path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, ddl in _MIGRATIONS.items():
+                if column not in columns:
+                    self._db.execute(ddl)
+            self._db.execute("DELETE FROM jobs WHERE created_at < ?", (time.time() - JOB_RETENTION_S,))
+            self._db.commit()
+        self.recover()
+        threading.Thread(target=self._heartbeat, name="jobs-lease", daemon=True).start()
+
+    def recover(self):
+        """Fails the queued/running jobs whose lease expired (their worker died); returns how many."""
+        now = time.time()
+        with self._cond:
+            cur = self._db.execute(
+                "UPDATE jobs SET status=?, error=?, finished_at=? "
+                "WHERE status IN (?, ?) AND COALESCE(lease_at, 0) < ?",
+                (FAILED, "interrupted", now, *ACTIVE, now - self.lease_s),
+            )
+            self._db.commit()
+            if cur.rowcount:
+                logger.warning("jobs interrupted count=%s (lease expired)", cur.rowcount)
+                self._cond.notify_all()
+        return cur.rowcount
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(self.lease_s / 3)
+            try:
+                with self._lock:
+                    self._db.execute(
+                        "UPDATE jobs SET lease_at=? WHERE owner=? AND status IN (?, ?)",
+                        (time.time(), self.owner, *ACTIVE),
+                    )
+                    self._db.commit()
+                # Worker irmão que morreu: libera o dedup_key dos jobs dele
+                self.recover()
+            except sqlite3.Error as e:
+                logger.warning("jobs lease renewal failed error=%s", e)
+
+    def register(self, kind, fn):
+        """fn(user_id) -> JSON-serializable result."""
+        self.handlers[kind] = fn
+
+    def _row(self, where, params):
+        cur = self._db.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE {where}", params)
+        return _to_dict(cur.fetchone())
+
+    def get(self, job_id):
+        with self._lock:
+            return self._row("id = ?", (job_id,))
+
+    def submit(self, kind, user_id, input_hash):
+        """Enqueues a job, or returns the identical one already queued/running/fresh."""
+        if kind not in self.handlers:
+            raise KeyError(f"unknown job kind: {kind}")
+        dedup_key = f"{kind}:{user_id}:{input_hash}"
+        now = time.time()
+        with self._lock:
+            existing = self._row(
+                "dedup_key = ? AND (status IN (?, ?) OR (status = ? AND finished_at >= ?)) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (dedup_key, *ACTIVE, DONE, now - self.result_ttl),
+            )
+            if existing is not None:
+                metrics.JOBS.inc(kind=kind, outcome="coalesced")
+                return {**existing, "coalesced": True}
+
+            job_id = uuid.uuid4().hex
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, user_id, dedup_key, status, created_at, owner, lease_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, user_id, dedup_key, QUEUED, now, self.owner, now),
+            )
+            self._db.commit()
+            job = self._row("id = ?", (job_id,))
+
+        metrics.JOBS.inc(kind=kind, outcome="enqueued")
+        # Contexto vazio: o job não herda deadline/portfolio do request que o criou
+        self._executor.submit(contextvars.Context().run, self._run, job_id, kind, user_id)
+        return {**job, "coalesced": False}
+
+    def _update(self, job_id, **fields):
+        sets = ", ".join(f"{k} = ?" for k in fields)
+        with self._cond:
+            self._db.execute(f"UPDATE jobs SET {sets} WHERE id = ?", (*fields.values(), job_id))
+            self._db.commit()
+            self._cond.notify_all()
+            waiters = list(self._waiters.get(job_id, ()))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _run(self, job_id, kind, user_id):
+        self._update(job_id, status=RUNNING, started_at=time.time())
+        deadline.start(JOB_BUDGET_S)
+        start = time.perf_counter()
+        try:
+            result = self.handlers[kind](user_id)
+            payload = json.dumps(result, default=str)
+        except Exception as e:
+            logger.warning("job failed kind=%s id=%s error=%r", kind, job_id, e)
+            metrics.JOBS.inc(kind=kind, outcome="failed")
+            self._update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            return
+        metrics.JOBS.inc(kind=kind, outcome="done")
+        logger.info("job done kind=%s id=%s elapsed_ms=%.1f", kind, job_id, (time.perf_counter() - start) * 1000)
+        self._update(job_id, status=DONE, result=payload, finished_at=time.time())
+
+    def wait(self, job_id, timeout):
+        """Blocks until the job leaves queued/running or `timeout` expires; returns the job."""
+        end = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._row("id = ?", (job_id,))
+                remaining = end - time.monotonic()
+                if job is None or job["status"] not in ACTIVE or remaining <= 0:
+                    return job
+                self._cond.wait(remaining)
+
+    async def wait_async(self, job_id, timeout):
+        """wait() for async handlers: the event loop is woken by _update, no thread is held."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        end = time.monotonic() + timeout
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        try:
+            while True:
+                event.clear()
+                job = self.get(job_id)
+                remaining = end - time.monotonic()
+                if job is None or job["status"] not in ACTIVE or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(event.wait(), min(remaining, JOB_POLL_S))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[job_id]
@@ -0,0 +1,152 @@
+"""
+Heavy optional dependencies, imported on first use and timed.
+
+optional(name) returns a module proxy: the real import happens on the first
+attribute access (or in preload()), once, under a lock. Importing the proxy is
+free, so a cold start only pays for what the first requests actually touch.
+STARTUP_PRELOAD lists the modules the startup hook warms up in a background
+thread (the server is already accepting requests); anything not listed is
+imported by the first request that needs it. report() is the per-module
+import-time table shown in /health, mark() the boot milestones.
+
+Uso:
+    pd = optional("pandas")
+    pd.Timestamp.now()   # importa aqui (ou já veio do preload)
+"""
+import importlib
+import importlib.util
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_T0 = time.perf_counter()  # ~ início do processo (main importa este módulo primeiro)
+
+# Aquecidos em background no startup; o resto fica para o primeiro uso
+STARTUP_PRELOAD = os.getenv("STARTUP_PRELOAD", "numpy,pandas,yfinance")
+# 1 = o startup espera o preload (primeira request nunca paga import, boot mais lento)
+STARTUP_PRELOAD_BLOCKING = os.getenv("STARTUP_PRELOAD_BLOCKING", "0") == "1"
+
+_MODULES = {}
+_REGISTRY_LOCK = threading.Lock()
+_MARKS = {}
+
+
+class LazyModule:
+    """Proxy that imports `name` on first attribute access. Internals are `_lazy_*`."""
+
+    def __init__(self, name, on_load=None):
+        self._lazy_name = name
+        self._lazy_on_load = on_load
+        self._lazy_module = None
+        self._lazy_error = None
+        self._lazy_ms = None
+        self._lazy_by = None  # "preload" ou "request"
+        self._lazy_lock = threading.Lock()
+
+    def _lazy_load(self, by="request"):
+        module = self._lazy_module
+        if module is not None:
+            return module
+        with self._lazy_lock:
+            if self._lazy_module is None:
+                if self._lazy_error is not None:
+                    raise ImportError(self._lazy_error)
+                start = time.perf_counter()
+                try:
+                    module = importlib.import_module(self._lazy_name)
+                    if self._lazy_on_load is not None:
+                        self._lazy_on_load(module)
+                except Exception as e:
+                    self._lazy_error = f"{type(e).__name__}: {e}"
+                    logger.warning("import failed module=%s error=%s", self._lazy_name, self._lazy_error)
+                    raise ImportError(self._lazy_error) from e
+                finally:
+                    self._lazy_ms = round((time.perf_counter() - start) * 1000, 1)
+                self._lazy_by = by
+                self._lazy_module = module
+                logger.info("import module=%s ms=%s by=%s", self._lazy_name, self._lazy_ms, by)
+            return self._lazy_module
+
+    def __getattr__(self, attr):
+        if attr.startswith("_lazy_"):
+            raise AttributeError(attr)
+        return getattr(self._lazy_load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._lazy_module is not None else "deferred"
+        return f"<lazy module {self._lazy_name!r} ({state})>"
+
+
+def optional(name, on_load=None):
+    """Shared proxy for `name` (one per module name; `on_load` runs once after the import)."""
+    with _REGISTRY_LOCK:
+        proxy = _MODULES.get(name)
+        if proxy is None:
+            proxy = _MODULES[name] = LazyModule(name, on_load)
+        return proxy
+
+
+def available(proxy):
+    """True if the module imported, or has not been tried yet and can be found."""
+    if proxy._lazy_module is not None:
+        return True
+    if proxy._lazy_error is not None:
+        return False
+    try:
+        return importlib.util.find_spec(proxy._lazy_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def preload(names=STARTUP_PRELOAD):
+    names = [n.strip() for n in names.split(",") if n.strip()] if isinstance(names, str) else list(names)
+    start = time.perf_counter()
+    for name in names:
+        try:
+            optional(name)._lazy_load(by="preload")
+        except ImportError:
+            pass  # já registrado no report
+    mark("preload")
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+def preload_in_background(names=STARTUP_PRELOAD):
+    thread = threading.Thread(target=preload, args=(names,), name="import-preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def mark(stage):
+    """Records a boot milestone (ms since this module was imported)."""
+    _MARKS[stage] = round((time.perf_counter() - _T0) * 1000, 1)
+
+
+def missing(named):
+    """{label: proxy} -> ["label: reason"] for the ones that cannot be imported."""
+    return [
+        f"{label}: {proxy._lazy_error or 'not installed'}"
+        for label, proxy in named.items()
+        if not available(proxy)
+    ]
+
+
+def report():
+    """{"marks": {stage: ms}, "modules": {name: {state, import_ms, by, error}}}"""
+    modules = {}
+    for name, proxy in list(_MODULES.items()):
+        if proxy._lazy_module is not None:
+            state = "loaded"
+        elif proxy._lazy_error is not None:
+            state = "failed"
+        else:
+            state = "deferred"
+        modules[name] = {
+            "state": state,
+            "import_ms": proxy._lazy_ms,
+            "by": proxy._lazy_by,
+            "error": proxy._lazy_error,
+        }
+    return {"marks": dict(_MARKS), "modules": modules}
@@ -0,0 +1,318 @@
+"""
+Bulk loader for assets_master / institutions from local instrument lists.
+
+- Sources are CSV (header row), JSON (array) or JSON Lines files, read as a
+  stream: rows are normalized/validated one by one and grouped into batches of
+  --batch-size, so memory stays bounded by the batches in flight
+- Each batch is one upsert (merge-duplicates on ticker / code), sent by
+  --workers concurrent requests; a refresh of an existing list is the same run
+- Progress is checkpointed per batch (<source>.<table>.ckpt.json): a failed or
+  interrupted run is re-run with the same arguments and only sends the batches
+  that were not confirmed. The checkpoint is removed once everything is loaded
+
+Colunas aceitas (assets_master): ticker, name, type, currency, exchange. type e
+currency podem faltar: saem da bolsa (--exchange ou coluna exchange).
+
+Uso:
+    python load_instruments.py assets data/b3.csv --exchange B3
+    python load_instruments.py assets nasdaq.jsonl --exchange NASDAQ --batch-size 2000 --workers 8
+    python load_instruments.py institutions corretoras.csv
+    python load_instruments.py assets crypto.json --exchange CRYPTO --dry-run
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from dotenv import load_dotenv
+
+from supabase_rest import SupabaseREST
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_KEY"))
+
+LOAD_BATCH_SIZE = int(os.getenv("LOAD_BATCH_SIZE", "1000"))
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", "8"))
+LOAD_RETRIES = 3
+
+# Domínios do supabase_schema.sql
+ASSET_TYPES = {"stock_br", "stock_us", "reit", "fii", "etf_br", "etf_us", "crypto", "bond"}
+# Moeda da cotação; GBp/GBX = pence, stablecoins = dólar (aliases do currency.py)
+CURRENCIES = {"BRL", "USD", "EUR", "GBP", "GBp", "GBX", "CHF", "JPY", "CAD", "AUD", "HKD", "USDT", "USDC", "DAI"}
+EXCHANGES = {"B3", "NYSE", "NASDAQ", "AMEX", "CRYPTO", "LSE", "XETRA", "EURONEXT", "SIX", "TSX", "TSE", "HKEX", "ASX"}
+COUNTRIES = {"BR", "US", "Global"}
+
+# bolsa -> (type, currency) quando a lista não traz
+EXCHANGE_DEFAULTS = {
+    "B3": ("stock_br", "BRL"),
+    "NYSE": ("stock_us", "USD"),
+    "NASDAQ": ("stock_us", "USD"),
+    "AMEX": ("stock_us", "USD"),
+    "CRYPTO": ("crypto", "USD"),
+    # Fora dos EUA: sem type próprio no schema, entram como internacionais (Stocks)
+    "LSE": ("stock_us", "GBp"),
+    "XETRA": ("stock_us", "EUR"),
+    "EURONEXT": ("stock_us", "EUR"),
+    "SIX": ("stock_us", "CHF"),
+    "TSX": ("stock_us", "CAD"),
+    "TSE": ("stock_us", "JPY"),
+    "HKEX": ("stock_us", "HKD"),
+    "ASX": ("stock_us", "AUD"),
+}
+
+
+# --- LEITURA (streaming) ---
+def read_rows(path):
+    """Yields dicts from a CSV, JSON array or JSON Lines file."""
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        if ext == ".csv":
+            yield from csv.DictReader(f)
+        elif ext in (".jsonl", ".ndjson"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        elif ext == ".json":
+            data = json.load(f)
+            yield from (data.get("data", []) if isinstance(data, dict) else data)
+        else:
+            raise ValueError(f"formato não suportado: {path}")
+
+
+def _clean(value):
+    return str(value).strip() if value is not None else ""
+
+
+def normalize_asset(row, exchange=None):
+    """Source row -> assets_master row; raises ValueError when it does not fit the schema."""
+    ticker = _clean(row.get("ticker") or row.get("symbol")).upper()
+    if not ticker:
+        raise ValueError("sem ticker")
+    exch = (_clean(row.get("exchange")) or exchange or "").upper()
+    if exch not in EXCHANGES:
+        raise ValueError(f"{ticker}: exchange inválida {exch!r}")
+    default_type, default_currency = EXCHANGE_DEFAULTS[exch]
+    asset_type = _clean(row.get("type")).lower() or default_type
+    currency = _clean(row.get("currency"))
+    # GBp (pence) difere de GBP só na caixa: o resto é normalizado para maiúsculas
+    currency = (currency if currency == "GBp" else currency.upper()) or default_currency
+    if asset_type not in ASSET_TYPES:
+        raise ValueError(f"{ticker}: type inválido {asset_type!r}")
+    if currency not in CURRENCIES:
+        raise ValueError(f"{ticker}: currency inválida {currency!r}")
+    return {
+        "ticker": ticker,
+        "name": _clean(row.get("name")) or ticker,
+        "type": asset_type,
+        "currency": currency,
+        "exchange": exch,
+    }
+
+
+def normalize_institution(row, exchange=None):
+    code = _clean(row.get("code"))
+    name = _clean(row.get("name"))
+    if not code or not name:
+        raise ValueError(f"instituição sem code/name: {row!r}")
+    country = _clean(row.get("country")) or "BR"
+    if country not in COUNTRIES:
+        raise ValueError(f"{code}: country inválido {country!r}")
+    return {"name": name, "code": code, "country": country, "logo_url": _clean(row.get("logo_url")) or None}
+
+
+# tabela -> (normalizador, chave do upsert)
+TARGETS = {
+    "assets": ("assets_master", normalize_asset, "ticker"),
+    "institutions": ("institutions", normalize_institution, "code"),
+}
+
+
+def batches(rows, normalize, key, size, exchange=None, stats=None):
+    """
+    Normalized rows grouped in lists of `size`, deduplicated by `key`
+    (Postgres rejects an upsert that touches the same row twice). Batch
+    boundaries depend only on the input, so batch i is the same on every run.
+    """
+    stats = stats if stats is not None else {}
+    seen = set()
+    batch = []
+    for row in rows:
+        try:
+            item = normalize(row, exchange)
+        except ValueError as e:
+            stats["invalid"] = stats.get("invalid", 0) + 1
+            logger.debug("linha ignorada: %s", e)
+            continue
+        if item[key] in seen:
+            stats["duplicates"] = stats.get("duplicates", 0) + 1
+            continue
+        seen.add(item[key])
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- CHECKPOINT ---
+class Checkpoint:
+    """Batch indices already confirmed for one (source file, table, batch size)."""
+
+    def __init__(self, path, source=None, table=None, batch_size=None):
+        self.path = path
+        self.identity = None
+        if source:
+            st = os.stat(source)
+            self.identity = {
+                "source": os.path.abspath(source),
+                "size": st.st_size,
+                "mtime": int(st.st_mtime),
+                "table": table,
+                "batch_size": batch_size,
+            }
+        self.done = set()
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                saved = json.load(f)
+            # Arquivo ou batch size diferentes: os índices não valem mais
+            if saved.get("identity") == self.identity:
+                self.done = set(saved.get("done", []))
+            else:
+                logger.warning("checkpoint %s é de outra carga; recomeçando", path)
+
+    def mark(self, index):
+        with self._lock:
+            self.done.add(index)
+            if not self.path:
+                return
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"identity": self.identity, "done": sorted(self.done)}, f)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# --- CARGA ---
+def _upsert_with_retry(db, table, rows, key, retries=LOAD_RETRIES):
+    for attempt in range(1, retries + 1):
+        try:
+            db.upsert(table, rows, on_conflict=key)
+            return
+        except requests.RequestException as e:
+            if attempt == retries:
+                raise
+            logger.warning("upsert %s falhou (tentativa %s): %s", table, attempt, e)
+            time.sleep(0.5 * 2 ** (attempt - 1))
+
+
+def load(db, source, target="assets", exchange=None, batch_size=LOAD_BATCH_SIZE,
+         workers=LOAD_WORKERS, checkpoint_path=None, dry_run=False, rows=None):
+    """
+    Streams `source` into the target table. Returns stats
+    (rows, batches, skipped, failed, invalid, duplicates, seconds).
+    `rows` overrides reading the file (seed_database passes its lists).
+    """
+    table, normalize, key = TARGETS[target]
+    started = time.perf_counter()
+    stats = {"rows": 0, "batches": 0, "skipped": 0, "failed": 0}
+    if checkpoint_path is None and source:
+        checkpoint_path = f"{source}.{table}.ckpt.json"
+    # Sem arquivo (linhas em memória) o progresso não é persistido
+    ckpt = Checkpoint(checkpoint_path if source else None, source, table, batch_size)
+
+    stream = batches(rows if rows is not None else read_rows(source), normalize, key, batch_size, exchange, stats)
+
+    def send(index, part):
+        _upsert_with_retry(db, table, part, key)
+        ckpt.mark(index)
+        return len(part)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="loader") as pool:
+        in_flight = {}
+
+        def drain(return_when):
+            done, _ = wait(in_flight, return_when=return_when)
+            for fut in done:
+                index = in_flight.pop(fut)
+                try:
+                    stats["rows"] += fut.result()
+                    stats["batches"] += 1
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error("batch %s falhou: %s", index, e)
+
+        for index, part in enumerate(stream):
+            if index in ckpt.done:
+                stats["skipped"] += 1
+                continue
+            if dry_run:
+                stats["rows"] += len(part)
+                stats["batches"] += 1
+                continue
+            # Limita os batches em memória (leitura não dispara à frente da rede)
+            if len(in_flight) >= 2 * workers:
+                drain(FIRST_COMPLETED)
+            in_flight[pool.submit(send, index, part)] = index
+        if in_flight:
+            drain("ALL_COMPLETED")
+
+    if not stats["failed"] and not dry_run:
+        ckpt.clear()
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main_cli(argv=None):
+    ap = argparse.ArgumentParser(description="Carga em lote de assets_master / institutions")
+    ap.add_argument("target", choices=sorted(TARGETS))
+    ap.add_argument("source", help="arquivo CSV, JSON ou JSONL")
+    ap.add_argument("--exchange", choices=sorted(EXCHANGES), help="bolsa das linhas sem coluna exchange")
+    ap.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE, help="linhas por upsert")
+    ap.add_argument("--workers", type=int, default=LOAD_WORKERS, help="upserts simultâneos")
+    ap.add_argument("--checkpoint", help="arquivo de progresso (default: <source>.<tabela>.ckpt.json)")
+    ap.add_argument("--dry-run", action="store_true", help="só valida e conta")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    if not args.dry_run and (not SUPABASE_URL or not SUPABASE_KEY):
+        print("SUPABASE_URL / SUPABASE_KEY não configurados")
+        return 1
+    session = requests.Session()
+    # Uma conexão keep-alive por worker
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(1, args.workers))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    db = SupabaseREST(SUPABASE_URL or "http://localhost", SUPABASE_KEY or "", session=session)
+
+    stats = load(
+        db, args.source, args.target, args.exchange, args.batch_size, args.workers,
+        args.checkpoint, args.dry_run,
+    )
+    print(
+        f"{stats['rows']} linhas em {stats['batches']} batches ({stats['seconds']}s); "
+        f"{stats['skipped']} batches já carregados, {stats['failed']} falharam, "
+        f"{stats.get('invalid', 0)} inválidas, {stats.get('duplicates', 0)} duplicadas"
+    )
+    if stats["failed"]:
+        print("Rode de novo com os mesmos argumentos para reenviar só os batches pendentes.")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,70 +1,158 @@
 # FORCE UPDATE V9 - CONFIRM DEPLOYMENT
+import lazy_imports  # primeiro: marca o início do boot
+import asyncio
+import contextvars
+import functools
+import html
+import json
 import os
 import requests
 import shutil
+import threading
 import time
-from fastapi import FastAPI, HTTPException, File, UploadFile
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import quote_plus
+from fastapi import FastAPI, HTTPException, File, UploadFile, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
+from static_assets import PrecompressedStaticFiles, index_response
+import deadline
+from ai_analysis import AI_MODELS, UNAVAILABLE_MSG, Analyst, ModelRouter
+from backtest import Backtester
+from currency import CurrencyEngine
+from dividend_forecast import PAID, DividendForecast
+from jobs import ACTIVE, FAILED, JobQueue
+from news_store import NewsStore
+import metrics
+from market_client import QUOTE_TTL_S, YahooClient
+from market_snapshot import MARKET_WATCHLIST, MarketSnapshot, parse_watchlist
+from portfolio import Portfolio
+from portfolio_history import PortfolioHistory, twr_points
+from price_store import PriceStore
+from rates import RateStore
+import rebalance
+from risk import RiskEngine, prompt_summary
+from snapshots import SnapshotCache
+from supabase_rest import SupabaseREST
+from ticker_resolver import TickerResolver
+from warmup import WARMUP_BUDGET_S, Warmup, most_held
+from lazy_imports import optional
+from metrics import span, record_cache
 
-# --- SAFE IMPORTS (Try/Except for debugging) ---
-IMPORT_ERRORS = []
+load_dotenv()
 
-try:
-    import google.generativeai as genai
-except Exception as e:
-    genai = None
-    IMPORT_ERRORS.append(f"genai: {e}")
+# --- IMPORTS PESADOS (sob demanda / preload no startup, ver lazy_imports) ---
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-try:
-    import yfinance as yf
-except Exception as e:
-    yf = None
-    IMPORT_ERRORS.append(f"yfinance: {e}")
 
-try:
-    from ocr_parser import BrokerageNoteParser
-except Exception as e:
-    BrokerageNoteParser = None
-    IMPORT_ERRORS.append(f"ocr_parser: {e}")
+def _configure_genai(module):
+    if GOOGLE_API_KEY:
+        module.configure(api_key=GOOGLE_API_KEY)  # uma vez, não a cada /analyze
 
-load_dotenv()
+
+genai = optional("google.generativeai", on_load=_configure_genai)
+yf = optional("yfinance")
+ocr_parser = optional("ocr_parser")  # pdfplumber
+pd = optional("pandas")
+np = optional("numpy")
+# Reportados em /health (find_spec, sem importar)
+OPTIONAL_MODULES = {"genai": genai, "yfinance": yf, "ocr_parser": ocr_parser, "pdfplumber": optional("pdfplumber")}
 
 app = FastAPI()
 
 # --- LOGGING INIT ---
 import logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s level=%(levelname)s logger=%(name)s msg=%(message)s",
+)
 logger = logging.getLogger(__name__)
 
+
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    deadline.start(deadline.parse_budget(request.headers.get("x-request-budget-ms")))
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        elapsed = time.perf_counter() - start
+        # Template da rota (/assets/{asset_id}) para não explodir cardinalidade
+        matched = request.scope.get("route")
+        route = matched.path if matched is not None else request.url.path
+        metrics.REQUEST_LATENCY.observe(elapsed, route=route, method=request.method)
+        if status >= 500:
+            metrics.REQUEST_ERRORS.inc(route=route)
+        logger.info("request method=%s route=%s status=%s elapsed_ms=%.1f",
+                    request.method, route, status, elapsed * 1000)
+
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 APLICAÇÃO INICIANDO...")
-    logger.info(f"Import Errors: {IMPORT_ERRORS}")
     logger.info(f"Supabase Configured: {'SIM' if SUPABASE_URL and SUPABASE_KEY else 'NÃO'}")
-    logger.info("✅ Startup concluído com sucesso!")
+    if lazy_imports.STARTUP_PRELOAD_BLOCKING:
+        await run_in_threadpool(lazy_imports.preload)
+    else:
+        lazy_imports.preload_in_background()
+    MARKET_SNAPSHOT.start()
+    RATES.start()  # atualização incremental das séries do BCB (1x por dia)
+    WARMUP.start()  # /ready só responde 200 quando terminar
+    PORTFOLIO_HISTORY.start(_snapshot_users, build_portfolio)  # 1x por dia útil, após o fechamento
+    DIVIDEND_FORECAST.start(_dividend_symbols)  # projeção de proventos recalculada 1x por dia
+    lazy_imports.mark("startup")
+    logger.info("✅ Startup concluído com sucesso! profile=%s", lazy_imports.report()["marks"])
 
 @app.get("/")
-def read_root():
-    return FileResponse("static/index.html")
+def read_root(request: Request):
+    # Versão buildada (build_static.py) com Tailwind pré-compilado, se existir
+    return index_response(request.headers)
 
 @app.get("/health")
 def health_check():
+    import_errors = lazy_imports.missing(OPTIONAL_MODULES)
     return {
-        "status": "ok" if not IMPORT_ERRORS else "partial",
-        "import_errors": IMPORT_ERRORS,
+        "status": "ok" if not import_errors else "partial",
+        "import_errors": import_errors,
+        "startup": lazy_imports.report(),
         "env_check": {
             "supabase": bool(SUPABASE_URL and SUPABASE_KEY),
             "google_ai": bool(GOOGLE_API_KEY)
         }
     }
 
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness (rolling deploys): 503 until the warmup has finished, then 200."""
+    report = WARMUP.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics")
+def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # --- CONFIGURAÇÃO ---
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 # Tenta Service Role Key primeiro (para bypass RLS), senao Anon Key
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_KEY"))
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+NEWS_RSS_URL = os.getenv("NEWS_RSS_URL", "https://news.google.com/rss/search")
+
+analyst = Analyst(ModelRouter(AI_MODELS, lambda name: genai.GenerativeModel(name)))
+
+# Feed por termo; NEWS_RSS_URL é lido na hora (benchmark aponta para um servidor local)
+NEWS_STORE = NewsStore(
+    lambda term: f"{NEWS_RSS_URL}?q={quote_plus(term)}&hl=pt-BR&gl=BR&ceid=BR:pt-419"
+)
+NEWS_STORE.prune()
+
+# Usuário fixo até existir auth
+USER_ID = "a114b418-ec3c-407e-a2f2-06c3c453b684"
 
 
 # --- CONEXÃO BANCO (MANTIDA) ---
@@ -78,354 +166,274 @@ def supabase_fetch(endpoint, method="GET", params=None, json_body=None):
         "Content-Type": "application/json",
         "Prefer": "return=representation",
     }
+    table = endpoint.split("?")[0]
     try:
-        resp = requests.request(
-            method, url, headers=headers, params=params, json=json_body
-        )
+        with span("supabase", table=table, method=method):
+            resp = requests.request(
+                method, url, headers=headers, params=params, json=json_body
+            )
         if resp.status_code < 300:
             data = resp.json()
-            print(
-                f"DEBUG SUPABASE: Retornou {len(data) if isinstance(data, list) else 'Objeto'}. Dados: {data}"
+            logger.debug(
+                "supabase table=%s method=%s rows=%s",
+                table, method, len(data) if isinstance(data, list) else "obj",
             )
             return data if method != "DELETE" else None
-        print(f"ERRO SUPABASE: Status {resp.status_code} - {resp.text}")
+        metrics.UPSTREAM_ERRORS.inc(upstream="supabase", table=table, method=method)
+        logger.error("supabase table=%s status=%s body=%s", table, resp.status_code, resp.text[:500])
         return []
     except Exception as e:
-        print(f"Erro Supabase: {e}")
+        logger.error("supabase table=%s error=%s", table, e)
         return []
 
 
+# Sessão compartilhada (keep-alive) para as leituras paginadas
+_SUPABASE_SESSION = requests.Session()
+
+# Colunas que o /assets e a valorização usam
+PORTFOLIO_COLUMNS = "id,ticker,quantity,average_price,category"
+
+
+def supabase_client():
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        return None
+    return SupabaseREST(SUPABASE_URL, SUPABASE_KEY, session=_SUPABASE_SESSION)
+
+
+def supabase_rows(table, select, filters=None, key="id"):
+    """Streams a table page by page (keyset pagination), projected to `select`."""
+    client = supabase_client()
+    if client is None:
+        return iter(())
+    return client.iter_rows(table, select, filters, key=key)
+
+
+# --- CLIENTE YAHOO COMPARTILHADO (rate limit + circuit breaker) ---
+yahoo = YahooClient(lambda: yf)
+
+
+# --- RESOLUÇÃO DE TICKERS (assets_master, cache em memória) ---
+resolver = TickerResolver(
+    lambda: list(supabase_rows("assets_master", "ticker,type,currency,exchange", key="ticker"))
+)
+
+
 # --- CONFIGURAÇÃO GLOBAL DE CACHE ---
-MARKET_CACHE = {
-    "last_updated": 0,
-    "data": {},
-    "usd_rate": 5.0,  # Fallback
-}
+MARKET_CACHE = {}
+
+# Câmbio por moeda do assets_master (pares <CCY>BRL=X, FX_TTL_S)
+FX = CurrencyEngine(yahoo)
+
+# Índices/câmbio/taxas do ticker tape (watchlist configurável via MARKET_WATCHLIST)
+RATES = RateStore()
+MARKET_SNAPSHOT = MarketSnapshot(parse_watchlist(MARKET_WATCHLIST), yahoo, RATES)
+# Proventos por ação de todo símbolo em carteira + projeção dos próximos 12m (1x por dia)
+DIVIDEND_FORECAST = DividendForecast(yahoo)
 
 
 # --- PREÇOS CIRÚRGICOS (V8) + SUPORTE INTERNACIONAL ---
 def update_prices(assets):
-    print("\n--- DEBUG: INICIANDO ATUALIZACAO V8 (GLOBAL) ---")
+    logger.debug("update_prices start assets=%s", len(assets) if assets else 0)
     if not assets:
-        return {}
+        return {}, {}, set()
 
     live_prices = {}
     prev_closes = {}
     tickers_to_fetch = []
+    currencies = set()
 
-    # Lista de Ignorados (Renda Fixa manual)
-    BLOCKLIST = ["SELIC", "CDI", "TESOURO", "POUPANCA", "LCI", "LCA", "CDB"]
-
-    # 1. Identificar tickers e normalizar
+    # 1. Identificar tickers e normalizar (resolver compartilhado, O(1) por ativo)
     for item in assets:
-        original_ticker = str(item.get("ticker", "")).upper().strip()
-        if not original_ticker:
+        inst = resolver.resolve(item.get("ticker"), item.get("category"))
+        currencies.add(inst.currency)
+        # Pula Renda Fixa (sem cotação no Yahoo)
+        if not inst.ticker or not inst.priced:
             continue
-
-        # Pula Renda Fixa se estiver na blocklist
-        if any(bad in original_ticker for bad in BLOCKLIST):
+        tickers_to_fetch.append((inst.ticker, inst.yahoo))
+
+    # 2. Câmbio das moedas da carteira (só pares vencidos) + Ativos, num lote só
+    symbols = {yahoo for _, yahoo in tickers_to_fetch} | FX.due(currencies)
+    if not symbols:
+        return {}, {}, set()
+    quotes, stale_symbols = yahoo.fetch_many("quote", symbols, max_age=QUOTE_TTL_S)
+    FX.update(quotes, stale_symbols)
+
+    # 3. Mapeia de volta para o ticker cadastrado
+    # Sem cotação nenhuma: get_assets cai no average_price
+    stale = set()
+    for original, yahoo_symbol in tickers_to_fetch:
+        quote = quotes.get(yahoo_symbol)
+        if yahoo_symbol in stale_symbols:
+            stale.add(original)
+        if not quote:
             continue
+        live_prices[original], prev = quote
+        if prev:
+            prev_closes[original] = prev
 
-        # Lógica de Sufixo .SA (INTELIGENTE)
-        # Se não tem ponto, tem até 6 letras e NÃO é USD/Cripto -> Assume Brasil (.SA)
-        # Se for ETF americano (ex: SHV, VOO) ou stock (AAPL), o usuário deve cadastrar sem .SA,
-        # mas como saber se é BR ou US?
-        # REGRA: Se categoria for 'Stocks' ou 'REITs' ou 'ETF US', não põe .SA.
-        # Por simplicidade/convenção: Se tem 3 ou 4 letras e não é padrão B3 (ex: PETR4), tenta sem .SA primeiro?
-        # MELHOR: Se o usuário não botou ponto, e é "Ação", põe .SA. Se for "International", não põe.
-        cat = str(item.get("category", "")).lower()
-        is_intl = (
-            "usa" in cat
-            or "eua" in cat
-            or "int" in cat
-            or "stock" in cat
-            or "reit" in cat
-        )
+    return live_prices, prev_closes, stale
 
-        if (
-            "." not in original_ticker
-            and not is_intl
-            and len(original_ticker) <= 6
-            and "USD" not in original_ticker
-        ):
-            yahoo_ticker = f"{original_ticker}.SA"
-        else:
-            yahoo_ticker = original_ticker
 
-        tickers_to_fetch.append((original_ticker, yahoo_ticker))
+# --- WARMUP (antes de receber tráfego, ver /ready) ---
+_WARM_MASTER_LOCK = threading.Lock()
 
-    if not tickers_to_fetch:
-        return {}
 
-    # 2. Buscar Cotação do Dólar (para conversão)
-    try:
-        usd_obj = yf.Ticker("USDBRL=X")
-        # Tenta fast_info price, senão history
-        usd_price = (
-            usd_obj.fast_info.last_price if hasattr(usd_obj, "fast_info") else None
-        )
-        if not usd_price:
-            hist = usd_obj.history(period="1d")
-            if not hist.empty:
-                usd_price = hist["Close"].iloc[-1]
-
-        if usd_price:
-            MARKET_CACHE["usd_rate"] = float(usd_price)
-            print(f"DEBUG: Dólar Atualizado -> R$ {usd_price:.4f}")
-    except Exception as e:
-        print(f"DEBUG: Erro ao buscar Dólar: {e}")
+def _warm_master():
+    with _WARM_MASTER_LOCK:  # quotes também depende do mapa: carrega uma vez só
+        if not resolver.loaded_at and time.time() >= resolver.retry_at:
+            resolver.load()
+    return {"symbols": len(resolver.master)}
 
-    # 3. Buscar Ativos (Fast Info Loop)
-    for original, yahoo in tickers_to_fetch:
-        try:
-            ticker_obj = yf.Ticker(yahoo)
-            price = None
 
-            # Tenta fast_info
-            try:
-                price = ticker_obj.fast_info.last_price
-            except Exception:
-                pass
+def _warm_snapshot():
+    if not MARKET_SNAPSHOT.wait(WARMUP_BUDGET_S):
+        raise TimeoutError("market snapshot not built")
+    return {"symbols": len(MARKET_SNAPSHOT.data)}
 
-            # Fallback history
-            if not price:
-                hist = ticker_obj.history(period="2d")
-                if not hist.empty:
-                    price = hist["Close"].iloc[-1]
-                    # Tenta pegar previous_close do histórico se não tiver fast_info
-                    if len(hist) > 1:
-                        prev_closes[original] = hist["Close"].iloc[-2]
 
-            # Tenta pegar previous_close do fast_info se não pegou do histórico
-            if original not in prev_closes:
-                 try:
-                     prev_closes[original] = ticker_obj.fast_info.previous_close
-                 except:
-                     pass
+def _warm_fx():
+    """Rates of every currency in assets_master (USD always), in one batch."""
+    _warm_master()
+    stale = FX.refresh({"USD"} | {inst.currency for inst in resolver.master.values()})
+    if stale:
+        raise LookupError(f"fx unavailable: {', '.join(sorted(stale))}")
+    return {"rates": FX.snapshot()}
 
-            if price and float(price) > 0:
-                live_prices[original] = float(price)
-                print(f"DEBUG: {original} ({yahoo}) -> {price:.2f}")
-            else:
-                print(f"DEBUG: Falha {original} ({yahoo})")
 
-        except Exception as e:
-            print(f"DEBUG: Erro {yahoo}: {e}")
+def _warm_quotes():
+    """Quotes of the tickers held by most portfolios, into the shared quote cache."""
+    tickers = most_held(supabase_rows("portfolios", "ticker"))
+    _warm_master()
+    symbols = set()
+    for ticker in tickers:
+        inst = resolver.resolve(ticker)
+        if inst.ticker and inst.priced:
+            symbols.add(inst.yahoo)
+    quotes, stale = yahoo.fetch_many("quote", symbols)
+    return {"tickers": len(tickers), "quotes": len(quotes), "stale": len(stale)}
 
-    return live_prices, prev_closes
 
+def _dividend_symbols():
+    """Yahoo symbols with dividends held in any portfolio."""
+    _warm_master()
+    symbols = set()
+    for ticker in dict.fromkeys(r["ticker"] for r in supabase_rows("portfolios", "ticker") if r.get("ticker")):
+        inst = resolver.resolve(ticker)
+        if inst.ticker and inst.dividends:
+            symbols.add(inst.yahoo)
+    return symbols
 
-# --- ROTAS ---
-@app.get("/")
-def read_root():
-    return FileResponse("static/index.html")
 
+def _warm_dividends():
+    stale = DIVIDEND_FORECAST.refresh(_dividend_symbols())
+    table = DIVIDEND_FORECAST.table
+    return {"symbols": len(DIVIDEND_FORECAST.history), "events": 0 if table is None else len(table), "stale": len(stale)}
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+
+WARMUP = Warmup({
+    "assets_master": _warm_master,
+    "market_snapshot": _warm_snapshot,
+    "fx": _warm_fx,
+    "quotes": _warm_quotes,
+    "dividends": _warm_dividends,
+})
+
+
+# --- ROTAS ---
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 
 @app.get("/market-data")
 def get_market_data():
-    # Cache de 5 minutos (300s)
-    now = time.time()
-    if now - MARKET_CACHE["last_updated"] < 300 and MARKET_CACHE["data"]:
-        return MARKET_CACHE["data"]
-
-    print("DEBUG: Atualizando Market Data (Indices)...")
-    indices = {
-        "IBOV": "^BVSP",
-        "SP500": "^GSPC",
-        "BTC": "BTC-USD",
-        "USDBRL": "USDBRL=X",
-        "CDI": None,  # CDI é difícil pegar no Yahoo, vamos mockar ou pegar taxa fixa
-    }
+    # Snapshot pré-calculado (atualizado em background): leitura em memória
+    return MARKET_SNAPSHOT.get()
 
-    result = {}
-    for name, ticker in indices.items():
-        if not ticker:
-            result[name] = {"price": 13.65, "change": 0.0}  # CDI Mock
-            continue
 
-        try:
-            obj = yf.Ticker(ticker)
-            # Tenta pegar preço e variação via fast_info
-            # fast_info tem last_price e previous_close
-            current = obj.fast_info.last_price
-            prev = obj.fast_info.previous_close
+def build_portfolio(user_id=USER_ID):
+    # 1. Busca Carteira (paginada, só as colunas usadas)
+    try:
+        rows = list(supabase_rows("portfolios", PORTFOLIO_COLUMNS, {"user_id": f"eq.{user_id}"}))
+    except Exception as e:
+        logger.error("supabase table=portfolios error=%s", e)
+        rows = []
 
-            # Fallback
-            if not current:
-                hist = obj.history(period="2d")
-                if not hist.empty:
-                    current = hist["Close"].iloc[-1]
-                    prev = hist["Close"].iloc[-2] if len(hist) > 1 else current
+    # 2. Busca Preços (V8)
+    live_prices, prev_closes, stale = update_prices(rows)
 
-            if current and prev:
-                change_pct = ((current - prev) / prev) * 100
-                result[name] = {"price": current, "change": change_pct}
-        except Exception:
-            result[name] = {"price": 0.0, "change": 0.0}
+    # 3. Valoriza (vetorizado, câmbio pela moeda de cada ativo)
+    return Portfolio(rows, resolver, live_prices, prev_closes, stale=stale, fx=FX)
 
-    MARKET_CACHE["data"] = result
-    MARKET_CACHE["last_updated"] = now
-    return result
 
+# Portfolio do request atual: montado uma vez e compartilhado pelos endpoints
+_REQUEST_PORTFOLIO = contextvars.ContextVar("request_portfolio", default=None)
 
-@app.get("/assets")
-def get_assets():
-    user_id = "a114b418-ec3c-407e-a2f2-06c3c453b684"
+# Snapshot curto por usuário/versão, compartilhado entre requests (page load dispara 5 de uma vez)
+PORTFOLIO_SNAPSHOTS = SnapshotCache()
 
-    # 1. Busca Carteira
-    assets = supabase_fetch(
-        "portfolios", params={"select": "*", "user_id": f"eq.{user_id}"}
-    )
 
-    # 2. Busca Preços (V8)
-    live_prices, prev_closes = update_prices(assets)
-    usd_rate = MARKET_CACHE.get("usd_rate", 5.0)
-
-    # 3. Processa
-    for a in assets:
-        ticker = a.get("ticker")
-        cat = str(a.get("category", "")).lower()
-        is_intl = (
-            "usa" in cat
-            or "eua" in cat
-            or "int" in cat
-            or "stock" in cat
-            or "reit" in cat
-            or "cripto" in cat
-        )
+def current_portfolio(user_id=USER_ID):
+    portfolio = _REQUEST_PORTFOLIO.get()
+    if portfolio is None:
+        portfolio = PORTFOLIO_SNAPSHOTS.get_or_build(user_id, lambda: build_portfolio(user_id))
+        _REQUEST_PORTFOLIO.set(portfolio)
+    return portfolio
 
-        raw_avg = a.get("average_price")
-        avg = float(raw_avg) if raw_avg is not None else 0.0
-
-        # Preço Atual (Original) e Fechamento Anterior
-        curr_original = live_prices.get(ticker, avg)
-        prev_close_original = prev_closes.get(ticker, curr_original)
-
-        # Conversão para BRL se for internacional
-        if is_intl:
-            a["currency"] = "USD"
-            a["price_original"] = curr_original
-            a["current_price"] = (
-                curr_original * usd_rate
-            )  # Valor em Reais para totalização
-            a["average_price_brl"] = (
-                avg * usd_rate
-            )  # Assumindo que o user cadastrou custo em USD
-            # Lucro em USD
-            if avg > 0:
-                a["profit_percent"] = ((curr_original - avg) / avg) * 100
-            else:
-                a["profit_percent"] = 0.0
-            
-            # Daily Change USD
-            a["daily_change"] = (curr_original - prev_close_original) * a["quantity"] * usd_rate
-            a["daily_change_pct"] = ((curr_original - prev_close_original) / prev_close_original) * 100 if prev_close_original > 0 else 0.0
-        else:
-            a["currency"] = "BRL"
-            a["price_original"] = curr_original
-            a["current_price"] = curr_original
-            a["average_price_brl"] = avg
-            if avg > 0:
-                a["profit_percent"] = ((curr_original - avg) / avg) * 100
-            else:
-                a["profit_percent"] = 0.0
 
-            # Daily Change BRL
-            a["daily_change"] = (curr_original - prev_close_original) * a["quantity"]
-            a["daily_change_pct"] = ((curr_original - prev_close_original) / prev_close_original) * 100 if prev_close_original > 0 else 0.0
+def invalidate_portfolio(user_id):
+    """Carteira mudou: descarta o snapshot e os resultados derivados dela."""
+    PORTFOLIO_SNAPSHOTS.invalidate(user_id)
+    for key in ("dividends", "history"):
+        MARKET_CACHE.pop(key, None)
 
-        a["average_price"] = avg  # Mantém o original cadastrado
 
-    return assets
+@app.get("/assets")
+def get_assets():
+    return current_portfolio().to_records()
 
 
 @app.post("/add-asset")
 def add_asset(item: dict):
     data = {
-        "user_id": "a114b418-ec3c-407e-a2f2-06c3c453b684",
+        "user_id": USER_ID,
         "ticker": str(item.get("ticker", "")).upper(),
         "quantity": int(item.get("amount", 0)),
         "average_price": float(item.get("price", 0)),
         "category": item.get("category", "Ação"),
     }
     supabase_fetch("portfolios", method="POST", json_body=data)
+    invalidate_portfolio(USER_ID)
     return {"status": "ok"}
 
 
 @app.delete("/assets/{asset_id}")
 def delete_asset(asset_id: int):
     supabase_fetch("portfolios", method="DELETE", params={"id": f"eq.{asset_id}"})
+    invalidate_portfolio(USER_ID)
     return {"status": "ok"}
 
 
+def _analysis_message(message, stream):
+    """Notice/error for /analyze; as HTML when streaming (the frontend writes the body into #ai-content)."""
+    if stream:
+        return HTMLResponse(f"<p class='text-red-400'>{html.escape(message)}</p>")
+    return {"ai_analysis": message}
+
 
 @app.post("/analyze")
-def analyze(req: dict):
+async def analyze(req: dict, stream: bool = False):
+    """AI analysis of the current portfolio. ?stream=1 streams the HTML as it is generated."""
+    if not lazy_imports.available(genai):
+        return _analysis_message(UNAVAILABLE_MSG, stream)
     try:
-        genai.configure(api_key=GOOGLE_API_KEY)
-        assets = get_assets()
-
-        # Resumo detalhado para a IA
-        resumo = ""
-        total_patrimonio = 0
-        
-        # Agrupamento por Categoria
-        alloc = {}
-        
-        for a in assets:
-            val = a["quantity"] * a["current_price"]
-            total_patrimonio += val
-            cat = a["category"]
-            alloc[cat] = alloc.get(cat, 0) + val
-            
-            p_l_pct = a.get("profit_percent", 0)
-            resumo += f"- {a['ticker']} ({a['category']}): {a['quantity']} un. Total R$ {val:.2f}. Rentab. {p_l_pct:.2f}%\n"
-
-        prompt = (
-            f"Atue como um Consultor de Wealth Management de Elite (CFA Nível 3).\n"
-            f"Analise esta carteira de R$ {total_patrimonio:.2f}.\n"
-            f"Alocação Atual: {alloc}\n"
-            f"Ativos:\n{resumo}\n\n"
-            "Objetivo: Maximizar retorno ajustado ao risco e garantir diversificação inteligente.\n"
-            "Gere uma resposta em HTML PURO (sem tags html, head, body, sem markdown ```html). "
-            "Use classes CSS do Tailwind se achar pertinente, mas foque na estrutura.\n\n"
-            "Estrutura da Resposta:\n"
-            "<div class='space-y-6'>\n"
-            "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-yellow-500'>\n"
-            "    <h3 class='text-lg font-bold text-white mb-2'>🛡️ Diagnóstico de Risco & Concentração</h3>\n"
-            "    <p class='text-gray-300'>[Análise crítica da alocação. Identifique ativos que ultrapassam 15% da carteira ou setores expostos demais. Seja direto.]</p>\n"
-            "  </div>\n\n"
-            "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-green-500'>\n"
-            "    <h3 class='text-lg font-bold text-white mb-2'>🚀 Destaques & Oportunidades</h3>\n"
-            "    <p class='text-gray-300'>[Cite o melhor ativo e por que ele performou bem. Identifique oportunidades de entrada em classes sub-alocadas (ex: FIIs, Renda Fixa) para equilibrar.]</p>\n"
-            "  </div>\n\n"
-            "  <div class='bg-gray-800 p-4 rounded-lg border-l-4 border-blue-500'>\n"
-            "    <h3 class='text-lg font-bold text-white mb-2'>⚖️ Plano de Ação (Rebalanceamento)</h3>\n"
-            "    <ul class='list-disc list-inside text-gray-300 space-y-1'>\n"
-            "      <li>[Sugestão Prática 1: Ex: 'Reduzir exposição em VALE3 em 5%...']</li>\n"
-            "      <li>[Sugestão Prática 2]</li>\n"
-            "      <li>[Sugestão Prática 3]</li>\n"
-            "    </ul>\n"
-            "  </div>\n"
-            "</div>"
-        )
-
-        # Tenta modelos
-        for m in ["gemini-2.0-pro-exp", "gemini-1.5-pro", "gemini-1.5-flash"]:
-            try:
-                model = genai.GenerativeModel(m)
-                response = model.generate_content(prompt)
-                return {"ai_analysis": response.text}
-            except Exception as e:
-                print(f"Erro Model {m}: {e}")
-                continue
-        return {"ai_analysis": "Sistema de IA temporariamente indisponível. Tente novamente em instantes."}
-
+        portfolio = await run_in_threadpool(current_portfolio)
     except Exception as e:
-        return {"ai_analysis": f"Erro Interno IA: {str(e)}"}
+        return _analysis_message(f"Erro Interno IA: {str(e)}", stream)
+
+    # Métricas de risco só entram no prompt quando a análise não está no cache
+    extra = functools.partial(_risk_context, portfolio)
+    if stream:
+        return StreamingResponse(analyst.stream(portfolio, extra), media_type="text/html; charset=utf-8")
+    return {"ai_analysis": await analyst.analyze(portfolio, extra)}
 
 
 @app.get("/dividends")
@@ -436,151 +444,141 @@ def get_dividends():
         "dividends" in MARKET_CACHE
         and now - MARKET_CACHE.get("div_last_updated", 0) < 3600
     ):
+        record_cache("dividends", hit=True)
         return MARKET_CACHE["dividends"]
+    record_cache("dividends", hit=False)
+
+    portfolio = current_portfolio()
+    if not len(portfolio):
+        return {"history": [], "upcoming": [], "total_12m": 0, "forecast": [], "forecast_12m": 0,
+                "stale": [], "pending": []}
+
+    # 1. Posições elegíveis (Cripto / Renda Fixa não têm proventos no Yahoo), somadas por ticker
+    holdings = pd.DataFrame(
+        [
+            (p.row.get("ticker"), p.instrument.yahoo, qty, p.instrument.currency)
+            for p, qty in zip(portfolio.positions, portfolio.qty.tolist())
+            if qty > 0 and p.instrument.dividends
+        ],
+        columns=["ticker", "symbol", "qty", "currency"],
+    )
+    holdings = holdings.groupby(["ticker", "symbol", "currency"], as_index=False)["qty"].sum()
+    logger.debug("dividends assets=%s", len(holdings))
+
+    # 2. Eventos por ação do store diário: só leitura, nenhuma chamada ao Yahoo no request.
+    # Símbolo nunca carregado fica pendente e é buscado pelo loop em background
+    # (pending: nunca carregado; stale: servido do download de um dia anterior)
+    pending_symbols = DIVIDEND_FORECAST.request(holdings["symbol"])
+    pending = sorted(set(holdings.loc[holdings["symbol"].isin(pending_symbols), "ticker"]))
+    stale_symbols = DIVIDEND_FORECAST.outdated(holdings["symbol"])
+    stale = sorted(set(holdings.loc[holdings["symbol"].isin(stale_symbols), "ticker"]))
+    events = DIVIDEND_FORECAST.events(holdings["symbol"]).merge(holdings, on="symbol")
+
+    # Provento vem na moeda do ativo (câmbio já atualizado pelo current_portfolio)
+    events["payment"] = events["amount"] * events["qty"] * FX.factors(events["currency"].tolist())
+    events["month"] = events["date"].dt.strftime("%Y-%m")
+    paid = events[events["status"] == PAID]
+    future = events[events["status"] != PAID].sort_values(["date", "ticker"], kind="stable")
+
+    # 3. Histórico (últimos 12m) e previsão (próximos 12m) por mês
+    history = paid.groupby("month")["payment"].sum()
+    forecast = future.groupby("month")["payment"].sum()
+    total_12m, forecast_12m = float(history.sum()), float(forecast.sum())
+    upcoming = [
+        {"ticker": t, "date": d, "amount": a, "currency": c, "is_intl": c != FX.base, "status": st}
+        for t, d, a, c, st in zip(
+            future["ticker"], future["date"].dt.strftime("%d/%m/%Y"), future["payment"].tolist(),
+            future["currency"], future["status"],
+        )
+    ]
 
-    assets = get_assets()
-    if not assets:
-        return {"history": [], "upcoming": [], "total_12m": 0}
-
-    history = {}  # "YYYY-MM" -> val
-    upcoming = []
-    total_12m = 0
-
-    import pandas as pd
-
-    today = pd.Timestamp.now().tz_localize("UTC")  # YF usa timezone
-    one_year_ago = today - pd.DateOffset(months=12)
-
-    print(f"DEBUG: Buscando dividendos para {len(assets)} ativos...")
-
-    for a in assets:
-        ticker = a.get("ticker")
-        qty = a.get("quantity", 0)
-        if qty <= 0:
-            continue
-
-        # Logica Simplificada de Sufixo (igual update_prices)
-        yticker = ticker
-        if a.get("category") == "Ação" or a.get("category") == "FII":
-            if not (ticker.endswith(".SA") or ticker.endswith(".SAO")):
-                yticker = f"{ticker}.SA"
-        elif a.get("category") == "Cripto":
-            yticker = f"{ticker}-USD"
-
-        # Pular se for "Cripto" genérico ou não tiver sufixo correto
-        # (Melhorar essa lógica depois)
-
-        try:
-            # Otimização: Se for Cripto, não tem dividendo (exceto alguns casos raros staking, mas YF n traz)
-            if (
-                "cripto" in str(a.get("category")).lower()
-                or "btc" in str(a.get("category")).lower()
-            ):
-                continue
-
-            obj = yf.Ticker(yticker)
-            divs = obj.dividends
-
-            if divs.empty:
-                continue
-
-            # Filtra últimos 12 meses (pagos)
-            # YF divs index é DatetimeTZ
-            # Vamos converter tudo para UTC para comparar
-            if divs.index.tz is None:
-                divs.index = divs.index.tz_localize("UTC")
-            else:
-                divs.index = divs.index.tz_convert("UTC")
-
-            # Histórico (Ultimos 12m)
-            mask_hist = (divs.index >= one_year_ago) & (divs.index <= today)
-            recent_divs = divs.loc[mask_hist]
-
-            for date, val in recent_divs.items():
-                month_key = date.strftime("%Y-%m")
-                payment = val * qty
-
-                # Conversão USD se necessário (já temos rate no cache)
-                is_intl = (
-                    "usa" in str(a.get("category")).lower()
-                    or "eua" in str(a.get("category")).lower()
-                    or "int" in str(a.get("category")).lower()
-                    or "stock" in str(a.get("category")).lower()
-                    or "reit" in str(a.get("category")).lower()
-                    or "cripto" in str(a.get("category")).lower()
-                )
-                if is_intl:
-                    usd_rate = MARKET_CACHE.get("usd_rate", 5.0)
-                    payment = payment * usd_rate
-
-                history[month_key] = history.get(month_key, 0) + payment
-                total_12m += payment
-
-            # Futuros (Anunciados > Hoje)
-            # YF as vezes não traz futuros em .dividends, e sim em .calendar, mas .dividends costuma ter ex-date recente.
-            # Vamos checar se tem algo > today na lista de dividendos (Data Com costuma ser a key)
-            # Na verdade, yfinance .dividends keys são Ex-Dividend Dates.
-            # Se ex-dividend > today, ou payment date (que nao temos facil aqui) > today.
-            # Vamos assumir: Se data > today, é futuro.
-            mask_future = divs.index > today
-            future_divs = divs.loc[mask_future]
-
-            for date, val in future_divs.items():
-                payment = val * qty
-                if is_intl:
-                    payment *= MARKET_CACHE.get("usd_rate", 5.0)
-
-                upcoming.append(
-                    {
-                        "ticker": ticker,
-                        "date": date.strftime("%d/%m/%Y"),
-                        "amount": payment,
-                        "is_intl": is_intl,
-                    }
-                )
-
-        except Exception as e:
-            print(f"Erro Divs {ticker}: {e}")
-            continue
+    result = {
+        "history": [{"month": k, "value": v} for k, v in zip(history.index, history.tolist())],
+        "total_12m": total_12m,
+        "upcoming": upcoming,
+        "forecast": [{"month": k, "value": v} for k, v in zip(forecast.index, forecast.tolist())],
+        "forecast_12m": forecast_12m,
+        "stale": stale,
+        "pending": pending,  # sem proventos ainda para estes tickers (resultado parcial)
+    }
 
-    # Formatar Histórico para Lista Ordenada
-    sorted_hist = [{"month": k, "value": v} for k, v in sorted(history.items())]
+    # Resultado parcial não fica 1h no cache
+    if not pending and not stale:
+        MARKET_CACHE["dividends"] = result
+        MARKET_CACHE["div_last_updated"] = now
 
-    result = {"history": sorted_hist, "total_12m": total_12m, "upcoming": upcoming}
+    return result
 
-    MARKET_CACHE["dividends"] = result
-    MARKET_CACHE["div_last_updated"] = now
 
-    return result
+def _ibov_history(start_date, end_date):
+    try:
+        return yahoo.download("^BVSP", start_date, end_date)
+    except Exception as e:
+        logger.warning("history ibov failed error=%s", e)
+        return yahoo.last_good("download", "^BVSP")
+
+
+def _history_from_snapshots(daily, ibov_df):
+    """Real TWR line from portfolio_daily, benchmarks aligned to the snapshot dates."""
+    points = twr_points(daily)
+    dates = pd.DatetimeIndex([d for d, _ in points])
+    ibov_data = []
+    if ibov_df is not None and not ibov_df.empty:
+        close = ibov_df["Close"]
+        if close.index.tz is not None:
+            close = close.tz_localize(None)
+        close = close.reindex(close.index.union(dates)).ffill().bfill().reindex(dates)
+        ibov_norm = close / close.iloc[0] * 100
+        ibov_data = [{"date": d, "value": v} for (d, _), v in zip(points, ibov_norm.tolist())]
+    cdi_index = RATES.index_on("CDI", dates)
+    return {
+        "portfolio": [{"date": d, "value": v} for d, v in points],
+        "ibov": ibov_data,
+        "cdi": [{"date": d, "value": v} for (d, _), v in zip(points, cdi_index.tolist())],
+        "stale": [] if ibov_data else ["IBOV"],
+        "source": "snapshots",
+    }
 
 
 @app.get("/history")
 def get_history():
     """
-    Returns simulated historical performance vs benchmarks (IBOV, CDI).
-    Since we don't have full transaction history, we simulate:
-    "If I held this current portfolio for the last 12 months..."
+    Performance vs benchmarks (IBOV, CDI) over the last 12 months.
+    With daily snapshots (portfolio_history) the portfolio line is the real
+    time-weighted return, read as one range query. Until there are two of them
+    we simulate: "If I held this current portfolio for the last 12 months..."
     """
     # Cache
     now = time.time()
     if now - MARKET_CACHE.get("hist_last_updated", 0) < 3600 and "history" in MARKET_CACHE:
+         record_cache("history", hit=True)
          return MARKET_CACHE["history"]
+    record_cache("history", hit=False)
 
-    assets = get_assets()
-    if not assets:
-        return {"portfolio": [], "ibov": [], "cdi": []}
-    
-    import pandas as pd
-    import numpy as np
-    
-    # 1. Download Benchmarks (1y)
-    tickers = {"IBOV": "^BVSP", "CDI": "CDI"} # CDI is tricky, usually we use a constant rate or mock
-    
+    # 1. Download Benchmarks (1y): IBOV no Yahoo, CDI da série local (RATES)
     end_date = pd.Timestamp.now()
     start_date = end_date - pd.DateOffset(months=12)
-    
+
+    try:
+        daily = PORTFOLIO_HISTORY.series(USER_ID, start_date.date())
+    except Exception as e:
+        logger.warning("history snapshots failed error=%s", e)
+        daily = []
+    if len(daily) >= 2:
+        result = _history_from_snapshots(daily, _ibov_history(start_date, end_date))
+        if not result["stale"]:
+            MARKET_CACHE["history"] = result
+            MARKET_CACHE["hist_last_updated"] = now
+        return result
+
+    portfolio = current_portfolio()
+    if not len(portfolio):
+        return {"portfolio": [], "ibov": [], "cdi": [], "stale": [], "source": "simulated"}
+
     # IBOV
-    ibov_df = yf.download("^BVSP", start=start_date, end=end_date, progress=False)
+    ibov_df = _ibov_history(start_date, end_date)
+    if ibov_df is None:
+        return {"portfolio": [], "ibov": [], "cdi": [], "stale": ["IBOV"], "source": "simulated"}
     # Normalize IBOV to start at 100
     if not ibov_df.empty:
         ibov_norm = (ibov_df["Close"] / ibov_df["Close"].iloc[0]) * 100
@@ -588,17 +586,14 @@ def get_history():
     else:
         ibov_data = []
 
-    # CDI Mock (Constante 13.65% a.a -> ~0.05% ao dia util)
-    # Simulator linear growth
+    # CDI real (série local do BCB / meta do COPOM), acumulado nos pregões do IBOV
     cdi_data = []
-    days = len(ibov_data)
-    if days > 0:
-        daily_rate = (1 + 0.1365)**(1/252) - 1
-        curr = 100.0
-        for item in ibov_data:
-            cdi_data.append({"date": item["date"], "value": curr})
-            curr *= (1 + daily_rate)
-            
+    if ibov_data:
+        cdi_index = RATES.index_on("CDI", ibov_df.index)
+        cdi_data = [
+            {"date": item["date"], "value": v} for item, v in zip(ibov_data, cdi_index.tolist())
+        ]
+
     # Portfolio Simulation
     # We take current weights and apply to individual asset histories
     # This is expensive. We will do a simplified version: 
@@ -609,37 +604,37 @@ def get_history():
     # Let's try fetching history for the portfolio items.
     
     portfolio_series = pd.Series(0.0, index=ibov_df.index)
-    total_current_value = sum(a["current_price"] * a["quantity"] for a in assets)
+    stale = []
+    total_current_value = portfolio.total_value
     
     if total_current_value > 0:
-        # Fetch history for each asset
-        for a in assets:
-            qty = a["quantity"]
-            if qty <= 0: continue
-            
-            ticker = a["ticker"]
-            # Suffix logic again...
-            yticker = ticker
-            cat = str(a.get("category", "")).lower()
-            is_intl = "usa" in cat or "stock" in cat
-            
-            if not is_intl and not ticker.endswith(".SA") and len(ticker) <= 6:
-                yticker = f"{ticker}.SA"
-                
+        # Fetch history for each asset (em paralelo, limitado pelo prazo do request)
+        positions = [
+            (p.row.get("ticker"), p.instrument.yahoo, qty, p.instrument.currency)
+            for p, qty in zip(portfolio.positions, portfolio.qty.tolist())
+            if qty > 0 and p.instrument.priced
+        ]
+
+        results, stale_symbols = yahoo.fetch_many(
+            "download", {y for _, y, _, _ in positions}, start=start_date, end=end_date
+        )
+        stale = sorted({t for t, y, _, _ in positions if y in stale_symbols})
+
+        for ticker, yticker, qty, currency in positions:
+            hist = results.get(yticker)
+            if hist is None:
+                continue
             try:
-                hist = yf.download(yticker, start=start_date, end=end_date, progress=False)
                 if not hist.empty:
                     # Reindex to match IBOV dates (fill fwd)
                     hist = hist["Close"].reindex(ibov_df.index, method="ffill").fillna(0)
                     
-                    # Convert to BRL if intl
-                    val_series = hist * qty
-                    if is_intl:
-                         val_series *= MARKET_CACHE.get("usd_rate", 5.0)
-                         
+                    # Convert to BRL (câmbio atual da moeda do ativo)
+                    val_series = hist * qty * FX.rate(currency)
+                    
                     portfolio_series = portfolio_series.add(val_series, fill_value=0)
-            except:
-                pass
+            except Exception as e:
+                logger.warning("history failed ticker=%s error=%s", yticker, e)
         
         # Normalize Portfolio
         if not portfolio_series.empty and portfolio_series.iloc[0] > 0:
@@ -653,68 +648,243 @@ def get_history():
     result = {
         "portfolio": port_data,
         "ibov": ibov_data,
-        "cdi": cdi_data
+        "cdi": cdi_data,
+        "stale": stale,
+        "source": "simulated",
     }
     
-    MARKET_CACHE["history"] = result
-    MARKET_CACHE["hist_last_updated"] = now
+    # Resultado parcial não fica 1h no cache
+    if not stale:
+        MARKET_CACHE["history"] = result
+        MARKET_CACHE["hist_last_updated"] = now
     return result
 
 
+# --- RISCO (matriz de preços diários compartilhada, cache por fingerprint) ---
+PRICE_STORE = PriceStore(yahoo)
+RISK = RiskEngine(PRICE_STORE)
+# Métricas de risco calculadas entram no prompt do /analyze
+AI_INCLUDE_RISK = os.getenv("AI_INCLUDE_RISK", "1") == "1"
+
+
+@app.get("/risk")
+def get_risk(covariance: bool = False):
+    """
+    Volatility, beta vs IBOV, max drawdown, correlation and per-asset risk
+    contribution of the current holdings. ?covariance=1 adds the annualized matrix.
+    """
+    result = dict(RISK.analyze(current_portfolio()))
+    if not covariance:
+        result.pop("covariance", None)
+    return result
+
+
+def _risk_context(portfolio):
+    """Risk summary for the /analyze prompt (empty when disabled or unavailable)."""
+    if not AI_INCLUDE_RISK:
+        return None
+    try:
+        return prompt_summary(RISK.analyze(portfolio)) or None
+    except Exception as e:
+        logger.warning("risk context failed error=%s", e)
+        return None
+
+
+# --- BACKTEST (cenários sobre o price store local) ---
+BACKTEST = Backtester(PRICE_STORE, RATES, resolver.resolve)
+
+
+@app.post("/backtest")
+def run_backtest(req: dict):
+    """
+    What-if of target weights over past prices (adjusted: dividends reinvested).
+    Body: {"weights": {"BOVA11": 40, "IVVB11": 30, "CDI": 30}, "rebalance": "monthly",
+           "start": "2015-01-01", "end": null, "initial": 10000, "fee_pct": 0.0003,
+           "scenarios": [{"name": "anual", "rebalance": "yearly"}, ...]}
+    Each scenario overrides the top-level fields; benchmarks IBOV and CDI come along.
+    """
+    try:
+        return BACKTEST.run(req)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# --- REBALANCEAMENTO (determinístico, por categoria) ---
+@app.post("/rebalance")
+def rebalance_portfolio(req: dict):
+    """
+    Buy/sell list to reach target weights per category (held categories
+    without a target are not traded, see "untouched").
+    Body: {"targets": {"Ação": 40, "FII": 30, ...}, "cash": 0, "allow_sell": true,
+           "fee_pct": 0.0003, "fee_fixed": 0, "min_trade": 0, "lots": {"Ação": 100}}
+    """
+    options = {k: req[k] for k in ("cash", "fee_pct", "fee_fixed", "min_trade", "lots") if req.get(k) is not None}
+    try:
+        # Validação (números finitos, faixas, lotes > 0) fica no rebalance.plan
+        return rebalance.plan(
+            current_portfolio(), req.get("targets"), allow_sell=bool(req.get("allow_sell", True)), **options
+        )
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @app.get("/news")
 def get_news():
     """
     Returns personalized news feed based on portfolio assets.
-    Uses Google News RSS.
+    Uses Google News RSS (one feed per ticker, kept in NEWS_STORE).
     """
-    # Cache
-    now = time.time()
-    if now - MARKET_CACHE.get("news_last_updated", 0) < 1800 and "news" in MARKET_CACHE:
-         return MARKET_CACHE["news"]
-
-    assets = get_assets()
-    if not assets:
+    portfolio = current_portfolio()
+    if not len(portfolio):
         return []
 
-    # Extract unique tickers/names
-    # Limit to top 5 holdings to avoid huge query
-    sorted_assets = sorted(assets, key=lambda x: x["current_price"] * x["quantity"], reverse=True)
-    top_assets = sorted_assets[:5]
-    
-    query_terms = [a["ticker"] for a in top_assets]
-    # Add some general terms
+    # Top 5 posições + termo geral
+    query_terms = [portfolio.positions[i].row.get("ticker") for i in portfolio.top(5)]
     query_terms.append("Mercado Financeiro")
-    
-    query_str = " OR ".join(query_terms)
-    rss_url = f"https://news.google.com/rss/search?q={query_str}&hl=pt-BR&gl=BR&ceid=BR:pt-419"
-    
+
     try:
-        import xml.etree.ElementTree as ET
-        resp = requests.get(rss_url, timeout=5)
-        root = ET.fromstring(resp.content)
-        
-        items = []
-        for item in root.findall(".//item")[:10]:
-            title = item.find("title").text
-            link = item.find("link").text
-            pubDate = item.find("pubDate").text
-            source = item.find("source").text if item.find("source") is not None else "Google News"
-            
-            items.append({
-                "title": title,
-                "link": link,
-                "date": pubDate,
-                "source": source
-            })
-            
-        MARKET_CACHE["news"] = items
-        MARKET_CACHE["news_last_updated"] = now
-        return items
+        downloaded = NEWS_STORE.refresh(query_terms)
+        record_cache("news", hit=not downloaded)
+        return NEWS_STORE.feed(query_terms, limit=10)
     except Exception as e:
-        print(f"Erro News: {e}")
+        logger.warning("news failed error=%s", e)
         return []
 
 
+# --- DASHBOARD (carga inicial agregada) ---
+# Pool próprio: as seções fazem fan-out no pool de upstream (deadline) e não podem ocupá-lo
+_SECTION_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="dashboard")
+
+# Seções que dependem do portfolio (o snapshot é montado antes e herdado via contexto)
+DASHBOARD_SECTIONS = {
+    "dividends": lambda: get_dividends(),
+    "history": lambda: get_history(),
+    "news": lambda: get_news(),
+}
+
+
+def _run_section(name, fn):
+    try:
+        return {"section": name, "data": fn()}
+    except Exception as e:
+        logger.warning("dashboard section failed section=%s error=%s", name, e)
+        return {"section": name, "error": str(e)}
+
+
+def _submit_section(name, fn):
+    return _SECTION_EXECUTOR.submit(contextvars.copy_context().run, _run_section, name, fn)
+
+
+@app.get("/dashboard")
+def get_dashboard(stream: bool = False):
+    """
+    Everything the page needs on load in one request. The portfolio snapshot is
+    built once and shared by every section; dividends, history and news run
+    concurrently. With ?stream=1 the response is NDJSON, one
+    {"section": ..., "data": ...} line per section as soon as it is ready.
+    """
+    # Índices não dependem da carteira: já sai enquanto o snapshot é montado
+    futures = [_submit_section("market", lambda: get_market_data())]
+    portfolio = current_portfolio()
+    futures += [_submit_section(name, fn) for name, fn in DASHBOARD_SECTIONS.items()]
+    assets = {"section": "assets", "data": portfolio.to_records()}
+
+    if stream:
+        def lines():
+            yield json.dumps(jsonable_encoder(assets)) + "\n"
+            for fut in as_completed(futures):
+                yield json.dumps(jsonable_encoder(fut.result())) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    result = {"assets": assets["data"], "errors": {}}
+    for fut in futures:
+        section = fut.result()
+        if "error" in section:
+            result["errors"][section["section"]] = section["error"]
+        else:
+            result[section["section"]] = section["data"]
+    return result
+
+
+# --- JOBS EM BACKGROUND ---
+JOBS = JobQueue()
+
+
+def _portfolio_job(fn):
+    """Runs an endpoint function on a worker, for the given user's snapshot."""
+    def run(user_id):
+        _REQUEST_PORTFOLIO.set(current_portfolio(user_id))
+        return fn()
+    return run
+
+
+def _analyze_job():
+    portfolio = current_portfolio()
+    return {"ai_analysis": asyncio.run(analyst.analyze(portfolio, functools.partial(_risk_context, portfolio)))}
+
+
+JOBS.register("analyze", _portfolio_job(_analyze_job))
+JOBS.register("history", _portfolio_job(lambda: get_history()))
+JOBS.register("dividends", _portfolio_job(lambda: get_dividends()))
+PUBLIC_JOB_KINDS = ("analyze", "history", "dividends")
+
+
+# --- SNAPSHOT DIÁRIO DA CARTEIRA (histórico real do /history) ---
+PORTFOLIO_HISTORY = PortfolioHistory(supabase_client)
+
+
+def _snapshot_users():
+    """Distinct user_ids with positions (one streamed pass over a single column)."""
+    return list(dict.fromkeys(r["user_id"] for r in supabase_rows("portfolios", "user_id") if r.get("user_id")))
+
+
+@app.post("/jobs/{kind}", status_code=202)
+def submit_job(kind: str):
+    """
+    Enqueues analyze/history/dividends for the current holdings. Identical jobs
+    (same user, same holdings) already queued, running or recently done are reused.
+    """
+    # Só leitura: nada que grave no banco (ex.: snapshot diário) fica exposto aqui
+    if kind not in PUBLIC_JOB_KINDS:
+        raise HTTPException(status_code=404, detail=f"Job desconhecido: {kind}")
+    portfolio = current_portfolio()
+    return JOBS.submit(kind, USER_ID, portfolio.fingerprint())
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status/result. `wait` (s, máx 30) segura a resposta até o job terminar (long-poll)."""
+    # Async: quem espera não ocupa thread do threadpool (os outros endpoints sync dependem dele)
+    job = await JOBS.wait_async(job_id, min(wait, 30)) if wait > 0 else JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: the current status, then the final job when it finishes."""
+    job = JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+
+    async def events():
+        current = job
+        yield f"event: status\ndata: {json.dumps({'id': job_id, 'status': current['status']})}\n\n"
+        while current["status"] in ACTIVE:
+            current = await JOBS.wait_async(job_id, 15)
+            if current is None:
+                # Removido do banco (retenção) enquanto o cliente esperava
+                yield f"event: {FAILED}\ndata: {json.dumps({'id': job_id, 'error': 'not found'})}\n\n"
+                return
+            if current["status"] in ACTIVE:
+                yield ": keep-alive\n\n"
+        yield f"event: {current['status']}\ndata: {json.dumps(current, default=str)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
 @app.get("/taxes")
 def get_taxes():
     """
@@ -773,7 +943,7 @@ def search_assets(q: str):
         data = supabase_fetch("assets_master", params=params)
         return data
     except Exception as e:
-        print(f"Erro Search: {e}")
+        logger.warning("search failed q=%s error=%s", q, e)
         return []
 
 
@@ -795,8 +965,9 @@ async def upload_note(file: UploadFile = File(...)):
             shutil.copyfileobj(file.file, buffer)
 
         # Parse
-        parser = BrokerageNoteParser(file_path)
-        data = parser.parse()
+        parser = ocr_parser.BrokerageNoteParser(file_path)
+        with span("ocr", op="parse"):
+            data = parser.parse()
 
         # Clean up
         if os.path.exists(file_path):
@@ -812,10 +983,13 @@ async def upload_note(file: UploadFile = File(...)):
     except Exception as e:
         if os.path.exists(file_path):
             os.remove(file_path)
-        print(f"Erro Upload: {e}")
+        logger.error("upload failed file=%s error=%s", safe_filename, e)
         raise HTTPException(500, f"Erro ao processar nota: {str(e)}")
 
 
+lazy_imports.mark("main_import")
+
+
 if __name__ == "__main__":
     import uvicorn
 
@@ -0,0 +1,237 @@
+"""
+Bulk maintenance of the portfolios table.
+
+Changes are computed locally from a streamed (keyset-paginated) read and
+applied set-based: consolidations as batched upserts + chunked id=in.(...)
+DELETEs, category fixes as one filtered PATCH per target category. --rpc runs
+the same operation server-side in one statement (functions in
+supabase_schema.sql). --dry-run only prints the diff.
+
+The REST upserts and DELETEs are separate requests, not one transaction: if
+the DELETE fails after the totals were written, planning again would sum the
+duplicates a second time. The local path therefore writes its plan to
+CONSOLIDATE_JOURNAL before applying and removes it at the end; a run that finds
+the journal replays that exact plan first (idempotent: absolute values and ids)
+and refuses to apply if it cannot be read. --rpc is the atomic (safe) path.
+
+Uso:
+    python maintenance.py consolidate --dry-run
+    python maintenance.py consolidate --user <uuid> --batch-size 500
+    python maintenance.py fix-categories
+    python maintenance.py consolidate --rpc
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from supabase_rest import SupabaseREST, chunks
+from ticker_resolver import TickerResolver
+
+load_dotenv()
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", os.getenv("SUPABASE_KEY"))
+
+DEFAULT_CATEGORY = "Ação"  # default do /add-asset
+PORTFOLIO_COLUMNS = "id,user_id,ticker,quantity,average_price,category"
+# Plano em aplicação (removido quando termina): presença = execução anterior incompleta
+CONSOLIDATE_JOURNAL = os.getenv("CONSOLIDATE_JOURNAL", "consolidate.journal.json")
+
+
+# --- PLANEJAMENTO (local, streaming) ---
+def plan_consolidation(rows):
+    """
+    Duplicated (user_id, ticker) positions -> (upserts, delete_ids).
+    Keeps the lowest id with summed quantity, weighted average price and the
+    latest category other than the default.
+    """
+    groups = {}
+    for r in rows:
+        key = (r["user_id"], r["ticker"])
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {"keep": r, "ids": [], "qty": 0.0, "invested": 0.0, "cat": r["category"]}
+        q = float(r["quantity"] or 0)
+        g["ids"].append(r["id"])
+        g["qty"] += q
+        g["invested"] += q * float(r["average_price"] or 0)
+        if r["category"] and r["category"] != DEFAULT_CATEGORY:
+            g["cat"] = r["category"]
+
+    upserts, deletes = [], []
+    for g in groups.values():
+        if len(g["ids"]) < 2:
+            continue
+        keep = g["keep"]
+        upserts.append({
+            **keep,
+            "quantity": g["qty"],
+            "average_price": g["invested"] / g["qty"] if g["qty"] > 0 else 0.0,
+            "category": g["cat"],
+            "_before": keep,
+            "_merged": len(g["ids"]),
+        })
+        deletes.extend(i for i in g["ids"] if i != keep["id"])
+    return upserts, deletes
+
+
+def plan_category_fixes(rows, resolver):
+    """Rows still on the default/empty category -> {expected category: [(id, ticker, old)]}."""
+    fixes = {}
+    for r in rows:
+        cat = r.get("category")
+        if cat and cat != DEFAULT_CATEGORY:
+            continue  # categoria escolhida pelo usuário fica
+        inst = resolver.resolve(r["ticker"], cat)
+        expected = inst.category if inst.source == "master" else None
+        # Fora do master: só corrige Renda Fixa (SELIC, CDB...)
+        if expected is None and inst.type == "bond":
+            expected = "Renda Fixa"
+        if expected and cat != expected:
+            fixes.setdefault(expected, []).append((r["id"], r["ticker"], cat))
+    return fixes
+
+
+# --- DIFF ---
+def print_consolidation(upserts, deletes, out=sys.stdout):
+    for u in upserts:
+        b = u["_before"]
+        print(
+            f"~ portfolios id={u['id']} ({u['user_id']} {u['ticker']}, {u['_merged']} linhas): "
+            f"quantity {b['quantity']} -> {u['quantity']:g}, "
+            f"average_price {float(b['average_price'] or 0):.2f} -> {u['average_price']:.2f}, "
+            f"category {b['category']} -> {u['category']}",
+            file=out,
+        )
+    for i in deletes:
+        print(f"- portfolios id={i}", file=out)
+    print(f"{len(upserts)} posições consolidadas, {len(deletes)} linhas removidas", file=out)
+
+
+def print_category_fixes(fixes, out=sys.stdout):
+    total = 0
+    for expected, items in sorted(fixes.items()):
+        for row_id, ticker, old in items:
+            print(f"~ portfolios id={row_id} ({ticker}): category {old} -> {expected}", file=out)
+        total += len(items)
+    print(f"{total} categorias corrigidas", file=out)
+
+
+# --- APLICAÇÃO ---
+def _write_journal(path, upserts, deletes):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"upserts": upserts, "deletes": deletes}, f, default=str)
+    os.replace(tmp, path)  # nunca fica um journal pela metade
+
+
+def _apply(db, upserts, deletes, batch_size):
+    for part in chunks(upserts, batch_size):
+        db.upsert("portfolios", part)
+    # Só remove depois que os totais foram gravados
+    db.delete_in("portfolios", "id", deletes)
+
+
+def apply_consolidation(db, upserts, deletes, batch_size, journal=CONSOLIDATE_JOURNAL):
+    clean = [{k: v for k, v in u.items() if not k.startswith("_")} for u in upserts]
+    if journal:
+        _write_journal(journal, clean, deletes)
+    _apply(db, clean, deletes, batch_size)
+    if journal:
+        os.remove(journal)
+
+
+def resume_consolidation(db, batch_size, journal=CONSOLIDATE_JOURNAL):
+    """
+    Replays the plan of an interrupted run (journal present); returns it, or
+    None if there is nothing to resume. RuntimeError if the journal is unreadable.
+    """
+    if not journal or not os.path.exists(journal):
+        return None
+    try:
+        with open(journal, encoding="utf-8") as f:
+            plan = json.load(f)
+        upserts, deletes = plan["upserts"], plan["deletes"]
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        raise RuntimeError(
+            f"execução anterior incompleta e journal ilegível ({journal}): {e}. "
+            "Confira a tabela antes de aplicar de novo (ou use --rpc)."
+        ) from e
+    print(f"Retomando consolidação incompleta: {len(upserts)} posições, {len(deletes)} remoções ({journal})")
+    _apply(db, upserts, deletes, batch_size)
+    os.remove(journal)
+    return upserts, deletes
+
+
+def apply_category_fixes(db, fixes):
+    for expected, items in fixes.items():
+        db.update_in("portfolios", "id", [row_id for row_id, _, _ in items], {"category": expected})
+
+
+def _scan(db, user_id, select):
+    filters = {"user_id": f"eq.{user_id}"} if user_id else None
+    return db.iter_rows("portfolios", select, filters)
+
+
+def consolidate(db, user_id=None, dry_run=False, rpc=False, batch_size=500, journal=CONSOLIDATE_JOURNAL):
+    if dry_run:
+        if journal and os.path.exists(journal):
+            print(f"Atenção: execução anterior incompleta ({journal}); o diff abaixo conta as duplicatas de novo")
+    else:
+        # Antes de planejar (ou do RPC): senão as linhas já somadas entram de novo na soma
+        resume_consolidation(db, batch_size, journal)
+    if rpc and not dry_run:
+        merged = db.rpc("consolidate_portfolios", {"p_user_id": user_id})
+        print(f"RPC consolidate_portfolios: {len(merged)} posições consolidadas")
+        return merged
+    upserts, deletes = plan_consolidation(_scan(db, user_id, PORTFOLIO_COLUMNS))
+    print_consolidation(upserts, deletes)
+    if not dry_run:
+        apply_consolidation(db, upserts, deletes, batch_size, journal)
+    return upserts, deletes
+
+
+def fix_categories(db, user_id=None, dry_run=False, rpc=False):
+    if rpc and not dry_run:
+        count = db.rpc("fix_portfolio_categories", {"p_user_id": user_id})
+        print(f"RPC fix_portfolio_categories: {count} categorias corrigidas")
+        return count
+    resolver = TickerResolver(
+        lambda: list(db.iter_rows("assets_master", "ticker,type,currency,exchange", key="ticker"))
+    )
+    fixes = plan_category_fixes(_scan(db, user_id, "id,ticker,category"), resolver)
+    print_category_fixes(fixes)
+    if not dry_run:
+        apply_category_fixes(db, fixes)
+    return fixes
+
+
+def main_cli(argv=None):
+    ap = argparse.ArgumentParser(description="Manutenção em lote da tabela portfolios")
+    ap.add_argument("command", choices=["consolidate", "fix-categories"])
+    ap.add_argument("--user", help="restringe a um user_id")
+    ap.add_argument("--dry-run", action="store_true", help="só mostra o diff")
+    ap.add_argument("--rpc", action="store_true", help="executa no banco numa transação (funções do supabase_schema.sql): caminho seguro")
+    ap.add_argument("--batch-size", type=int, default=500, help="linhas por upsert")
+    args = ap.parse_args(argv)
+
+    if not SUPABASE_URL or not SUPABASE_KEY:
+        print("SUPABASE_URL / SUPABASE_KEY não configurados")
+        return 1
+    db = SupabaseREST(SUPABASE_URL, SUPABASE_KEY)
+    if args.command == "consolidate":
+        try:
+            consolidate(db, args.user, args.dry_run, args.rpc, args.batch_size)
+        except RuntimeError as e:
+            print(e)
+            return 1
+    else:
+        fix_categories(db, args.user, args.dry_run, args.rpc)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,322 @@
+"""
+Shared Yahoo Finance client: token-bucket rate limiting + circuit breaker.
+
+Every yfinance call in the service goes through YahooClient, so a throttled or
+failing Yahoo is detected once for everybody instead of per ticker:
+
+- TokenBucket: caps the call rate; halves it on 429 and recovers additively
+- CircuitBreaker: opens after N consecutive failures, rejects calls while open,
+  then lets a single probe through after a jittered, growing cool-down
+- Last good value per (op, symbol) is kept; fetch_many() serves it (flagged
+  stale) while the circuit is open or the request deadline has passed, and
+  without calling Yahoo at all while it is younger than `max_age` (quotes are
+  shared by every user for YAHOO_QUOTE_TTL_S; the warmup fills them at boot).
+  The cache is an LRU of YAHOO_CACHE_MAX entries; bulk download_many frames
+  (never read back, keyed by the whole symbol list) are not kept
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import deadline
+import metrics
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+YAHOO_RATE = float(os.getenv("YAHOO_RATE", "25"))  # chamadas/s
+YAHOO_BURST = int(os.getenv("YAHOO_BURST", "100"))
+BREAKER_THRESHOLD = int(os.getenv("YAHOO_BREAKER_THRESHOLD", "5"))
+BREAKER_COOLDOWN_S = float(os.getenv("YAHOO_BREAKER_COOLDOWN_S", "30"))
+BREAKER_MAX_COOLDOWN_S = float(os.getenv("YAHOO_BREAKER_MAX_COOLDOWN_S", "600"))
+QUOTE_TTL_S = float(os.getenv("YAHOO_QUOTE_TTL_S", "60"))
+YAHOO_CACHE_MAX = int(os.getenv("YAHOO_CACHE_MAX", "5000"))  # entradas (op, símbolo) de último valor bom
+
+
+class UpstreamUnavailable(Exception):
+    """Raised when a call is rejected (circuit open / no rate budget)."""
+
+
+class RateLimited(Exception):
+    pass
+
+
+def is_rate_limit(exc):
+    if type(exc).__name__ == "YFRateLimitError" or isinstance(exc, RateLimited):
+        return True
+    text = str(exc)
+    return "429" in text or "Too Many Requests" in text or "Rate limited" in text
+
+
+class TokenBucket:
+    """Thread-safe token bucket with AIMD rate adaptation."""
+
+    def __init__(self, rate, burst, min_rate=0.5):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, timeout):
+        """Takes one token, waiting at most `timeout` seconds. Returns False on timeout."""
+        end = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > end:
+                return False
+            time.sleep(wait)
+
+    def penalize(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+        logger.warning("yahoo rate limited, new_rate=%.2f/s", self.rate)
+
+    def reward(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + 0.1)
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold, cooldown_s, max_cooldown_s, name="upstream"):
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown = cooldown_s
+        self.max_cooldown = max_cooldown_s
+        self.cooldown = cooldown_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out. In half-open only one probe is let through."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                logger.info("circuit %s half-open, probing", self.name)
+                return True
+            return False
+
+    def release(self):
+        """The half-open probe was not used (rejected before going out): next call may probe."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.retry_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("circuit %s closed", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self.cooldown = self.base_cooldown
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN:
+                # Probe falhou: volta a abrir com cool-down maior
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+                self._open()
+            elif self.state == self.CLOSED and self.failures >= self.threshold:
+                self._open()
+
+    def _open(self):
+        # Jitter evita que várias instâncias testem o Yahoo ao mesmo tempo
+        delay = self.cooldown * random.uniform(0.8, 1.2)
+        self.state = self.OPEN
+        self.retry_at = time.monotonic() + delay
+        metrics.CIRCUIT_OPENED.inc(upstream=self.name)
+        logger.warning("circuit %s open for %.1fs (failures=%s)", self.name, delay, self.failures)
+
+
+class YahooClient:
+    """
+    Facade over yfinance. `module` is a callable returning the yfinance module,
+    so tests/benchmarks can swap it after construction.
+    """
+
+    def __init__(self, module, cache_max=YAHOO_CACHE_MAX):
+        self._module = module
+        self.cache_max = cache_max
+        self.bucket = TokenBucket(YAHOO_RATE, YAHOO_BURST)
+        self.breaker = CircuitBreaker(
+            BREAKER_THRESHOLD, BREAKER_COOLDOWN_S, BREAKER_MAX_COOLDOWN_S, name="yahoo"
+        )
+        self.cache = OrderedDict()  # (op, symbol) -> último valor bom, LRU
+        self.fetched_at = {}  # (op, symbol) -> monotonic do último valor bom
+        self._lock = threading.Lock()
+
+    @property
+    def yf(self):
+        return self._module()
+
+    def last_good(self, op, symbol):
+        with self._lock:
+            value = self.cache.get((op, symbol))
+            if value is not None:
+                self.cache.move_to_end((op, symbol))
+        return value
+
+    def _remember(self, op, symbol, value):
+        with self._lock:
+            self.cache[(op, symbol)] = value
+            self.cache.move_to_end((op, symbol))
+            self.fetched_at[(op, symbol)] = time.monotonic()
+            while len(self.cache) > self.cache_max:
+                key, _ = self.cache.popitem(last=False)
+                self.fetched_at.pop(key, None)
+
+    def _call(self, op, symbol, fn, remember=True):
+        if not self.breaker.allow():
+            metrics.CIRCUIT_REJECTIONS.inc(upstream="yahoo", op=op)
+            raise UpstreamUnavailable(f"yahoo {op} {symbol}: circuit open")
+        if not self.bucket.acquire(timeout=deadline.current().remaining()):
+            # Sem resultado para registrar: devolve o probe (senão fica half-open para sempre)
+            self.breaker.release()
+            metrics.CIRCUIT_REJECTIONS.inc(upstream="yahoo", op="rate_limit")
+            raise UpstreamUnavailable(f"yahoo {op} {symbol}: rate budget exhausted")
+
+        try:
+            with span("yfinance", op=op):
+                value = fn()
+        except LookupError:
+            # Yahoo respondeu, só não tem dado para o símbolo: não conta para o breaker
+            self.breaker.record_success()
+            raise
+        except Exception as e:
+            self.breaker.record_failure()
+            if is_rate_limit(e):
+                self.bucket.penalize()
+            raise
+
+        self.breaker.record_success()
+        self.bucket.reward()
+        if remember:
+            self._remember(op, symbol, value)
+        return value
+
+    def fresh(self, op, symbol, max_age):
+        """Last good value if it is at most `max_age` seconds old, else None."""
+        with self._lock:
+            value = self.cache.get((op, symbol))
+            fetched_at = self.fetched_at.get((op, symbol))
+        if value is None or fetched_at is None or time.monotonic() - fetched_at > max_age:
+            return None
+        return value
+
+    def fetch_many(self, op, symbols, max_age=None, **kwargs):
+        """
+        Runs `op` for every symbol concurrently within the request deadline.
+        Returns (results, stale): symbols that failed, were rejected by the
+        breaker/rate limiter or missed the deadline get their last good value
+        (if any) and are reported as stale. With `max_age`, symbols fetched
+        less than `max_age` seconds ago are answered from the cache.
+        """
+        method = getattr(self, op)
+        hot = {}
+        if max_age:
+            for s in symbols:
+                value = self.fresh(op, s, max_age)
+                if value is not None:
+                    hot[s] = value
+            metrics.record_cache(f"yahoo_{op}", hit=True, n=len(hot))
+            metrics.record_cache(f"yahoo_{op}", hit=False, n=len(symbols) - len(hot))
+        jobs = {s: (lambda s=s: method(s, **kwargs)) for s in symbols if s not in hot}
+        results, pending = deadline.fetch_all(jobs)
+
+        stale = set()
+        for s in jobs:
+            if s in results:
+                continue
+            cached = self.last_good(op, s)
+            if cached is not None:
+                results[s] = cached
+                stale.add(s)
+            elif s in pending:
+                stale.add(s)
+        if stale:
+            logger.warning("yahoo %s stale symbols=%s breaker=%s", op, sorted(stale), self.breaker.state)
+        results.update(hot)
+        return results, stale
+
+    # --- Operações usadas pelos endpoints ---
+    def quote(self, symbol):
+        """(last_price, previous_close) via fast_info, history(2d) as fallback."""
+
+        def fetch():
+            obj = self.yf.Ticker(symbol)
+            price = prev = None
+            try:
+                info = obj.fast_info
+                price = info.last_price
+                prev = info.previous_close
+            except Exception as e:
+                if is_rate_limit(e):
+                    raise
+            if not price:
+                hist = obj.history(period="2d", timeout=deadline.upstream_timeout())
+                if not hist.empty:
+                    price = hist["Close"].iloc[-1]
+                    if len(hist) > 1:
+                        prev = hist["Close"].iloc[-2]
+            if not price:
+                raise LookupError(f"no price for {symbol}")
+            return float(price), (float(prev) if prev else None)
+
+        return self._call("quote", symbol, fetch)
+
+    def dividends(self, symbol):
+        return self._call("dividends", symbol, lambda: self.yf.Ticker(symbol).dividends)
+
+    def calendar(self, symbol):
+        """Upcoming events dict (Ex-Dividend Date, Dividend Date, Earnings Date...)."""
+        return self._call("calendar", symbol, lambda: self.yf.Ticker(symbol).calendar or {})
+
+    def download_many(self, symbols, period="5d"):
+        """Close prices for several symbols in one batched yf.download (columns = symbols)."""
+        symbols = sorted(set(symbols))
+
+        def fetch():
+            df = self.yf.download(
+                symbols, period=period, progress=False, timeout=deadline.upstream_timeout(),
+            )
+            if df is None or df.empty:
+                raise LookupError(f"no data for {symbols}")
+            return df["Close"]
+
+        # Frame de 5d/10y por composição de carteira: ninguém relê, não vai para o cache
+        return self._call("download_many", ",".join(symbols), fetch, remember=False)
+
+    def download(self, symbol, start, end):
+        return self._call(
+            "download",
+            symbol,
+            lambda: self.yf.download(
+                symbol, start=start, end=end, progress=False,
+                timeout=deadline.upstream_timeout(),
+            ),
+        )
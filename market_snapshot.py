@@ -0,0 +1,134 @@
+"""
+Precomputed market-data snapshot for /market-data.
+
+The watchlist (MARKET_WATCHLIST) lists what the ticker tape shows:
+
+    NAME=SYMBOL       Yahoo symbol (index, FX pair, crypto), e.g. IBOV=^BVSP
+    NAME=rate:RATE    local rate series (rates.RateStore), e.g. CDI=rate:CDI
+
+All Yahoo symbols are fetched in one batched download; a background thread
+rebuilds the snapshot every MARKET_SNAPSHOT_REFRESH_S and requests only read
+the current dict. A symbol missing from a refresh keeps its previous value.
+"""
+import logging
+import os
+import threading
+import time
+
+import deadline
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCHLIST = "IBOV=^BVSP,SP500=^GSPC,BTC=BTC-USD,USDBRL=USDBRL=X,CDI=rate:CDI"
+MARKET_WATCHLIST = os.getenv("MARKET_WATCHLIST", DEFAULT_WATCHLIST)
+MARKET_SNAPSHOT_REFRESH_S = float(os.getenv("MARKET_SNAPSHOT_REFRESH_S", "300"))
+
+
+def parse_watchlist(spec):
+    """'IBOV=^BVSP,CDI=rate:CDI' -> [("IBOV", "yahoo", "^BVSP"), ("CDI", "rate", "CDI")]"""
+    entries = []
+    for item in spec.split(","):
+        name, sep, source = item.strip().partition("=")
+        if not sep or not name or not source:
+            continue
+        if source.startswith("rate:"):
+            entries.append((name, "rate", source[len("rate:"):]))
+        else:
+            entries.append((name, "yahoo", source))
+    return entries
+
+
+class MarketSnapshot:
+    def __init__(self, watchlist, yahoo, rates, refresh_s=MARKET_SNAPSHOT_REFRESH_S):
+        self.watchlist = watchlist
+        self.yahoo = yahoo
+        self.rates = rates
+        self.refresh_s = refresh_s
+        self.data = {}
+        self.updated_at = 0.0
+        self._refresh_lock = threading.Lock()
+        self._built = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _quotes(self, symbols):
+        """{symbol: (last, previous)} from one batched download."""
+        if not symbols:
+            return {}
+        try:
+            closes = self.yahoo.download_many(symbols, period="5d")
+        except Exception as e:
+            logger.warning("market snapshot download failed error=%s", e)
+            return {}
+        quotes = {}
+        for sym in symbols:
+            if sym not in closes:
+                continue
+            series = closes[sym].dropna()
+            if series.empty:
+                continue
+            last = float(series.iloc[-1])
+            prev = float(series.iloc[-2]) if len(series) > 1 else last
+            quotes[sym] = (last, prev)
+        return quotes
+
+    def refresh(self):
+        with self._refresh_lock:
+            quotes = self._quotes([src for _, kind, src in self.watchlist if kind == "yahoo"])
+            result = {}
+            for name, kind, source in self.watchlist:
+                if kind == "rate":
+                    try:
+                        result[name] = {"price": self.rates.annual(source), "change": 0.0}
+                    except (KeyError, LookupError) as e:
+                        logger.warning("market snapshot rate=%s error=%s", source, e)
+                        result[name] = {"price": 0.0, "change": 0.0}
+                    continue
+                quote = quotes.get(source)
+                if quote is None:
+                    result[name] = self.data.get(name, {"price": 0.0, "change": 0.0})
+                    continue
+                last, prev = quote
+                change = (last - prev) / prev * 100 if prev else 0.0
+                result[name] = {"price": last, "change": change}
+
+            # Troca a referência inteira: leitores nunca veem um dict pela metade
+            self.data = result
+            self.updated_at = time.time()
+            self._built.set()
+            return result
+
+    def get(self):
+        """Current snapshot; only the very first call (before any refresh) builds it inline."""
+        data = self.data
+        if not data:
+            data = self.refresh()
+        return data
+
+    def wait(self, timeout=None):
+        """Blocks until the first snapshot is built (warmup); False on timeout."""
+        return self._built.wait(timeout)
+
+    def clear(self):
+        self.data = {}
+        self.updated_at = 0.0
+        self._built.clear()
+
+    # --- Atualização em background ---
+    def _loop(self):
+        while not self._stop.is_set():
+            deadline.start()  # cada rodada com prazo próprio
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("market snapshot refresh failed error=%s", e)
+            self._stop.wait(self.refresh_s)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="market-snapshot", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
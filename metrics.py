@@ -0,0 +1,155 @@
+"""
+In-process metrics (Prometheus text format) and timing spans.
+
+Uso:
+    with span("supabase", table="portfolios"):
+        ...
+    record_cache("market_data", hit=True)
+
+GET /metrics renders everything with render().
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Buckets em segundos (de 5ms até 30s)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+
+
+def _key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _fmt_labels(key, extra=None):
+    items = list(key) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in items)
+    return "{" + body + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, val in sorted(self.values.items()):
+            lines.append(f"{self.name}{_fmt_labels(key)} {val}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self.series = {}  # key -> [bucket_counts, sum, count]
+
+    def observe(self, value, **labels):
+        key = _key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            s = self.series.get(key)
+            if s is None:
+                s = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if idx < len(self.buckets):
+                s[0][idx] += 1
+            s[1] += value
+            s[2] += 1
+
+    def count(self, **labels):
+        s = self.series.get(_key(labels))
+        return s[2] if s else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, n) in sorted(self.series.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f"{self.name}_bucket{_fmt_labels(key, {'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(key, {'le': '+Inf'})} {n}")
+            lines.append(f"{self.name}_sum{_fmt_labels(key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_fmt_labels(key)} {n}")
+        return lines
+
+
+# --- MÉTRICAS DO SERVIÇO ---
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Latência por endpoint")
+REQUEST_ERRORS = Counter("http_request_errors_total", "Respostas 5xx/exceções por endpoint")
+UPSTREAM_LATENCY = Histogram("upstream_duration_seconds", "Latência de chamadas externas (yfinance, supabase, ...)")
+UPSTREAM_CALLS = Counter("upstream_calls_total", "Chamadas externas")
+UPSTREAM_ERRORS = Counter("upstream_errors_total", "Erros em chamadas externas")
+CIRCUIT_OPENED = Counter("circuit_opened_total", "Aberturas do circuit breaker")
+CIRCUIT_REJECTIONS = Counter("circuit_rejections_total", "Chamadas barradas (circuito aberto / sem token)")
+CACHE_HITS = Counter("cache_hits_total", "Cache hits")
+CACHE_MISSES = Counter("cache_misses_total", "Cache misses")
+JOBS = Counter("jobs_total", "Jobs em background por tipo/resultado")
+
+REGISTRY = [
+    REQUEST_LATENCY,
+    REQUEST_ERRORS,
+    UPSTREAM_LATENCY,
+    UPSTREAM_CALLS,
+    UPSTREAM_ERRORS,
+    CIRCUIT_OPENED,
+    CIRCUIT_REJECTIONS,
+    CACHE_HITS,
+    CACHE_MISSES,
+    JOBS,
+]
+
+
+@contextmanager
+def span(upstream, **labels):
+    """Times an upstream call: latency histogram + call/error counters + debug log."""
+    labels = {"upstream": upstream, **labels}
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        UPSTREAM_ERRORS.inc(**labels)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        UPSTREAM_CALLS.inc(**labels)
+        UPSTREAM_LATENCY.observe(elapsed, **labels)
+        logger.debug("span upstream=%s labels=%s elapsed_ms=%.1f", upstream, labels, elapsed * 1000)
+
+
+def record_cache(cache, hit, n=1):
+    if n:
+        (CACHE_HITS if hit else CACHE_MISSES).inc(n, cache=cache)
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+
+    # Hit ratio derivado (conveniência para dashboards simples)
+    lines.append("# HELP cache_hit_ratio Hits / (hits + misses)")
+    lines.append("# TYPE cache_hit_ratio gauge")
+    caches = {dict(k)["cache"] for k in list(CACHE_HITS.values) + list(CACHE_MISSES.values)}
+    for cache in sorted(caches):
+        hits = CACHE_HITS.get(cache=cache)
+        total = hits + CACHE_MISSES.get(cache=cache)
+        lines.append(f'cache_hit_ratio{{cache="{cache}"}} {hits / total if total else 0:.4f}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,195 @@
+"""
+Persistent per-ticker news store (Google News RSS).
+
+- One feed per ticker (plus a general market query), fetched concurrently within
+  the request deadline and at most every NEWS_FEED_TTL_S
+- Conditional requests: ETag / Last-Modified are stored per feed, so an
+  unchanged feed costs a 304 instead of a full download + parse
+- Feeds are parsed incrementally (iterparse, elements cleared as they go) and
+  capped at NEWS_ITEMS_PER_FEED
+- Items are deduped by link across feeds; a user's feed is a merge of the
+  tickers they hold, read straight from SQLite (NEWS_DB_PATH)
+"""
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from email.utils import parsedate_to_datetime
+
+import requests
+
+import deadline
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+NEWS_DB_PATH = os.getenv("NEWS_DB_PATH", "news.db")
+NEWS_FEED_TTL_S = float(os.getenv("NEWS_FEED_TTL_S", "1800"))
+NEWS_ITEMS_PER_FEED = int(os.getenv("NEWS_ITEMS_PER_FEED", "20"))
+NEWS_RETENTION_S = 30 * 86400
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS news_feeds (
+    term TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    fetched_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS news_items (
+    link TEXT PRIMARY KEY,
+    title TEXT,
+    source TEXT,
+    pub_date TEXT,
+    published REAL
+);
+CREATE TABLE IF NOT EXISTS news_item_terms (
+    link TEXT NOT NULL,
+    term TEXT NOT NULL,
+    PRIMARY KEY (link, term)
+);
+CREATE INDEX IF NOT EXISTS news_items_published ON news_items (published);
+"""
+
+
+def _published(pub_date):
+    try:
+        return parsedate_to_datetime(pub_date).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_items(content, limit=NEWS_ITEMS_PER_FEED):
+    """Incremental RSS parse: stops after `limit` <item>s and frees each element."""
+    items = []
+    for _, elem in ET.iterparse(io.BytesIO(content), events=("end",)):
+        if elem.tag != "item":
+            continue
+        link = elem.findtext("link")
+        if link:
+            pub_date = elem.findtext("pubDate")
+            items.append({
+                "title": elem.findtext("title"),
+                "link": link,
+                "date": pub_date,
+                "source": elem.findtext("source") or "Google News",
+                # Sem data legível: conta como recebida agora
+                "published": _published(pub_date) or time.time(),
+            })
+        elem.clear()
+        if len(items) >= limit:
+            break
+    return items
+
+
+class NewsStore:
+    """
+    `feed_url(term)` builds the RSS URL for a term; `http_get` is requests.get
+    (swapped in the tests for a local fixture server).
+    """
+
+    def __init__(self, feed_url, db_path=NEWS_DB_PATH, ttl_s=NEWS_FEED_TTL_S, http_get=requests.get):
+        self.feed_url = feed_url
+        self.ttl = ttl_s
+        self.http_get = http_get
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            if db_path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+            self._db.commit()
+
+    def _feeds(self, terms):
+        marks = ",".join("?" * len(terms))
+        cur = self._db.execute(
+            f"SELECT term, etag, last_modified, fetched_at FROM news_feeds WHERE term IN ({marks})", terms
+        )
+        return {row[0]: row[1:] for row in cur}
+
+    def _fetch(self, term, etag, last_modified):
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        with span("google_news"):
+            resp = self.http_get(self.feed_url(term), headers=headers, timeout=deadline.upstream_timeout())
+        if resp.status_code == 304:
+            return None
+        resp.raise_for_status()
+        return {
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "items": parse_items(resp.content),
+        }
+
+    def refresh(self, terms):
+        """Fetches the feeds older than the TTL; returns how many were downloaded (non-304)."""
+        terms = list(dict.fromkeys(terms))
+        now = time.time()
+        with self._lock:
+            known = self._feeds(terms)
+        due = {}
+        for term in terms:
+            etag, last_modified, fetched_at = known.get(term, (None, None, 0.0))
+            if now - fetched_at >= self.ttl:
+                due[term] = (etag, last_modified)
+        if not due:
+            return 0
+
+        jobs = {t: (lambda t=t, s=s: self._fetch(t, s[0], s[1])) for t, s in due.items()}
+        results, pending = deadline.fetch_all(jobs)
+        failed = set(due) - set(results) - pending
+        if failed or pending:
+            logger.warning("news feeds failed=%s pending=%s", sorted(failed), sorted(pending))
+
+        downloaded = 0
+        with self._lock:
+            for term, fetched in results.items():
+                etag, last_modified = due[term]
+                if fetched is not None:
+                    downloaded += 1
+                    etag, last_modified = fetched["etag"], fetched["last_modified"]
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO news_items (link, title, source, pub_date, published) "
+                        "VALUES (:link, :title, :source, :date, :published)",
+                        fetched["items"],
+                    )
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO news_item_terms (link, term) VALUES (?, ?)",
+                        [(i["link"], term) for i in fetched["items"]],
+                    )
+                self._db.execute(
+                    "INSERT OR REPLACE INTO news_feeds (term, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?)",
+                    (term, etag, last_modified, now),
+                )
+            self._db.commit()
+        return downloaded
+
+    def feed(self, terms, limit=10):
+        """Merged, deduplicated feed for `terms`, newest first."""
+        terms = list(dict.fromkeys(terms))
+        if not terms:
+            return []
+        marks = ",".join("?" * len(terms))
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT i.title, i.link, i.pub_date, i.source FROM news_items i "
+                f"WHERE i.link IN (SELECT link FROM news_item_terms WHERE term IN ({marks})) "
+                "ORDER BY i.published DESC LIMIT ?",
+                (*terms, limit),
+            )
+            return [{"title": t, "link": l, "date": d, "source": s} for t, l, d, s in cur]
+
+    def prune(self, older_than_s=NEWS_RETENTION_S):
+        cutoff = time.time() - older_than_s
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM news_item_terms WHERE link IN (SELECT link FROM news_items WHERE published < ?)",
+                (cutoff,),
+            )
+            self._db.execute("DELETE FROM news_items WHERE published < ?", (cutoff,))
+            self._db.commit()
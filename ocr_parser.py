@@ -1,7 +1,10 @@
+import logging
 import re
 import sys
 import pdfplumber
 
+logger = logging.getLogger(__name__)
+
 
 class BrokerageNoteParser:
     def __init__(self, pdf_path):
@@ -106,7 +109,7 @@ class BrokerageNoteParser:
                     }
                 )
         except Exception as e:
-            print(f"Erro parsing line '{line}': {e}")
+            logger.warning("ocr line parse failed line=%r error=%s", line, e)
 
 
 if __name__ == "__main__":
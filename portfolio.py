@@ -0,0 +1,133 @@
+"""
+Columnar in-memory portfolio used for valuation.
+
+Positions keep their metadata in __slots__ records; every number that takes
+part in valuation lives in a NumPy array (one slot per position), so value,
+P&L and daily change are computed in one vectorized pass instead of per-row
+float math on the PostgREST dicts.
+
+Each position is converted to BRL from its own currency (assets_master) by a
+CurrencyEngine (`fx`): one rate lookup per distinct currency, then a take over
+the currency column. Without an engine, every non-BRL position uses `usd_rate`.
+"""
+import hashlib
+
+from lazy_imports import optional
+
+np = optional("numpy")
+
+
+class Position:
+    __slots__ = ("id", "ticker", "category", "instrument", "row")
+
+    def __init__(self, row, instrument):
+        self.id = row.get("id")
+        self.ticker = instrument.ticker
+        self.category = row.get("category")
+        self.instrument = instrument
+        self.row = row  # linha original do Supabase (devolvida no /assets)
+
+
+def _floats(values):
+    return np.array([float(v) if v is not None else 0.0 for v in values], dtype=np.float64)
+
+
+class Portfolio:
+    def __init__(self, rows, resolver, live_prices, prev_closes, usd_rate=None, stale=(), fx=None):
+        rows = rows or []
+        self.positions = [Position(r, resolver.resolve(r.get("ticker"), r.get("category"))) for r in rows]
+        self.stale = set(stale)
+        self.usd_rate = fx.rate("USD") if fx is not None else usd_rate
+
+        n = len(self.positions)
+        self.qty = _floats(r.get("quantity") for r in rows)
+        self.avg_cost = _floats(r.get("average_price") for r in rows)
+
+        # Sem cotação: usa o preço médio (mesma regra de antes)
+        self.price = np.array(
+            [live_prices.get(p.ticker, self.avg_cost[i]) for i, p in enumerate(self.positions)],
+            dtype=np.float64,
+        )
+        self.prev_close = np.array(
+            [prev_closes.get(p.ticker, self.price[i]) for i, p in enumerate(self.positions)],
+            dtype=np.float64,
+        )
+        self.is_intl = np.fromiter((p.instrument.is_intl for p in self.positions), dtype=bool, count=n)
+        self.currency = [p.instrument.currency for p in self.positions]
+        if fx is not None:
+            self.fx = fx.factors(self.currency)
+            # Moeda sem cotação ainda (usou o fallback): sinaliza como stale
+            missing = fx.unavailable(self.currency)
+            if missing:
+                self.stale.update(p.ticker for p in self.positions if p.instrument.currency in missing)
+        else:
+            self.fx = np.where(self.is_intl, usd_rate, 1.0)
+
+        self._valuate()
+
+    def _valuate(self):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.price_brl = self.price * self.fx
+            self.avg_cost_brl = self.avg_cost * self.fx
+            self.value_brl = self.qty * self.price_brl
+            self.cost_brl = self.qty * self.avg_cost_brl
+            # Rentabilidade na moeda original do ativo
+            self.profit_pct = np.where(
+                self.avg_cost > 0, (self.price - self.avg_cost) / self.avg_cost * 100, 0.0
+            )
+            diff = self.price - self.prev_close
+            self.daily_change = diff * self.qty * self.fx
+            self.daily_change_pct = np.where(self.prev_close > 0, diff / self.prev_close * 100, 0.0)
+
+    def __len__(self):
+        return len(self.positions)
+
+    @property
+    def total_value(self):
+        return float(self.value_brl.sum())
+
+    def fingerprint(self):
+        """Hash of the holdings (ticker, category, quantity, average price); prices excluded."""
+        raw = "\n".join(sorted(
+            f"{p.ticker}|{p.category}|{q:g}|{c:g}"
+            for p, q, c in zip(self.positions, self.qty.tolist(), self.avg_cost.tolist())
+        ))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def allocation(self):
+        """BRL value per category."""
+        cats = [p.category for p in self.positions]
+        labels, codes = np.unique(np.array(cats, dtype=object).astype(str), return_inverse=True)
+        sums = np.bincount(codes, weights=self.value_brl, minlength=len(labels))
+        return {str(c): float(v) for c, v in zip(labels, sums)}
+
+    def top(self, n):
+        """Indexes of the n largest positions by BRL value."""
+        return np.argsort(-self.value_brl, kind="stable")[:n]
+
+    def to_records(self):
+        """Rows as returned by /assets (original columns + enrichment)."""
+        records = []
+        price = self.price.tolist()
+        price_brl = self.price_brl.tolist()
+        avg = self.avg_cost.tolist()
+        avg_brl = self.avg_cost_brl.tolist()
+        profit = self.profit_pct.tolist()
+        change = self.daily_change.tolist()
+        change_pct = self.daily_change_pct.tolist()
+        fx = self.fx.tolist()
+        for i, p in enumerate(self.positions):
+            rec = dict(p.row)
+            rec["currency"] = p.instrument.currency
+            rec["price_original"] = price[i]
+            rec["fx_rate"] = fx[i]  # moeda do ativo -> BRL
+            rec["current_price"] = price_brl[i]  # Valor em Reais para totalização
+            rec["average_price_brl"] = avg_brl[i]
+            rec["profit_percent"] = profit[i]
+            rec["daily_change"] = change[i]
+            rec["daily_change_pct"] = change_pct[i]
+            rec["average_price"] = avg[i]  # Mantém o original cadastrado
+            # Cotação não chegou dentro do prazo: valor veio do cache (ou do preço médio)
+            rec["stale"] = p.ticker in self.stale
+            records.append(rec)
+        return records
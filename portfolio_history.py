@@ -0,0 +1,222 @@
+"""
+Daily portfolio snapshots (real performance history).
+
+Once a day, after the close (PORTFOLIO_SNAPSHOT_AT on a weekday, both in
+MARKET_TZ: the container clock is UTC), every user's valued portfolio is
+written to Supabase:
+
+- portfolio_snapshots: end-of-day positions (one row per user/date/ticker)
+- portfolio_daily: one row per user/date with value, cost, net flow and the
+  time-weighted return index (twr_index, base 100)
+
+Flows are the quantity changes since the previous snapshot priced at today's
+close, so buys and sells move the value but not the index:
+r_t = (V_t - F_t) / V_{t-1} - 1, twr_t = twr_{t-1} * (1 + r_t).
+
+/history reads portfolio_daily with one keyset range query (one row per day,
+independent of how many assets the user holds) cached in memory for the day.
+
+Uso:
+    history = PortfolioHistory(lambda: SupabaseREST(url, key))
+    history.record(user_id, portfolio)           # job diário
+    history.series(user_id, since)               # linhas de portfolio_daily, por data
+"""
+import datetime as dt
+import logging
+import os
+import threading
+from zoneinfo import ZoneInfo
+
+import deadline
+from lazy_imports import optional
+
+np = optional("numpy")
+
+logger = logging.getLogger(__name__)
+
+PORTFOLIO_SNAPSHOT_AT = os.getenv("PORTFOLIO_SNAPSHOT_AT", "18:30")  # depois do fechamento da B3
+MARKET_TZ = ZoneInfo(os.getenv("MARKET_TZ", "America/Sao_Paulo"))
+PORTFOLIO_SNAPSHOT_BUDGET_S = float(os.getenv("PORTFOLIO_SNAPSHOT_BUDGET_S", "60"))
+SNAPSHOT_CHECK_S = 600
+TWR_BASE = 100.0
+
+
+def market_now():
+    """Current time at the exchange (B3), whatever the server timezone."""
+    return dt.datetime.now(MARKET_TZ)
+
+
+def position_rows(user_id, portfolio, day):
+    """End-of-day rows for portfolio_snapshots, aggregated by ticker (duplicated lines summed)."""
+    if not len(portfolio):
+        return []
+    tickers = np.array([p.ticker or "" for p in portfolio.positions], dtype=object).astype(str)
+    labels, first, codes = np.unique(tickers, return_index=True, return_inverse=True)
+    n = len(labels)
+    qty = np.bincount(codes, weights=portfolio.qty, minlength=n)
+    value = np.bincount(codes, weights=portfolio.value_brl, minlength=n)
+    cost = np.bincount(codes, weights=portfolio.cost_brl, minlength=n)
+    price_brl = np.divide(value, qty, out=np.zeros(n), where=qty != 0)
+    rows = []
+    for i, ticker in enumerate(labels.tolist()):
+        if not ticker:
+            continue
+        pos = portfolio.positions[first[i]]
+        rows.append({
+            "user_id": user_id,
+            "date": day.isoformat(),
+            "ticker": ticker,
+            "category": pos.category,
+            "quantity": float(qty[i]),
+            "price": float(portfolio.price[first[i]]),
+            "price_brl": float(price_brl[i]),
+            "value_brl": float(value[i]),
+            "cost_brl": float(cost[i]),
+        })
+    return rows
+
+
+def daily_row(user_id, day, positions, prev_daily=None, prev_positions=()):
+    """Aggregate row for portfolio_daily, chaining the TWR index from the previous one."""
+    value = sum(p["value_brl"] for p in positions)
+    cost = sum(p["cost_brl"] for p in positions)
+
+    prev_qty = {p["ticker"]: float(p["quantity"] or 0) for p in prev_positions}
+    prev_price = {p["ticker"]: float(p["price_brl"] or 0) for p in prev_positions}
+    flow = 0.0
+    for p in positions:
+        flow += (p["quantity"] - prev_qty.pop(p["ticker"], 0.0)) * p["price_brl"]
+    # Zerados desde o último snapshot: saída pelo último preço conhecido
+    for ticker, q in prev_qty.items():
+        flow -= q * prev_price.get(ticker, 0.0)
+
+    index = TWR_BASE
+    if prev_daily is not None:
+        index = float(prev_daily["twr_index"])
+        prev_value = float(prev_daily["value_brl"] or 0)
+        if prev_value > 0:
+            index *= (value - flow) / prev_value
+    return {
+        "user_id": user_id,
+        "date": day.isoformat(),
+        "value_brl": value,
+        "cost_brl": cost,
+        "flow_brl": flow if prev_daily is not None else value,
+        "twr_index": index,
+        "positions": len(positions),
+    }
+
+
+class PortfolioHistory:
+    """`db` is a callable returning a SupabaseREST client (or None when unconfigured)."""
+
+    def __init__(self, db):
+        self._db = db
+        self._series = {}  # (user_id, desde) -> (dia, linhas de portfolio_daily)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_run = None
+
+    # --- Escrita ---
+    def _previous(self, db, user_id, day):
+        filters = {"user_id": f"eq.{user_id}", "date": f"lt.{day.isoformat()}"}
+        prev = db.latest("portfolio_daily", "date,value_brl,twr_index", filters, key="date")
+        if prev is None:
+            return None, []
+        positions = list(db.iter_rows(
+            "portfolio_snapshots", "ticker,quantity,price_brl",
+            {"user_id": f"eq.{user_id}", "date": f"eq.{prev['date']}"}, key="ticker",
+        ))
+        return prev, positions
+
+    def record(self, user_id, portfolio, day=None):
+        """Writes today's positions and daily row (idempotent for the same day)."""
+        db = self._db()
+        if db is None:
+            raise RuntimeError("supabase not configured")
+        day = day or market_now().date()
+        positions = position_rows(user_id, portfolio, day)
+        prev_daily, prev_positions = self._previous(db, user_id, day)
+        daily = daily_row(user_id, day, positions, prev_daily, prev_positions)
+
+        # Reexecução no mesmo dia: posições vendidas desde a última não podem sobrar
+        db.delete_where("portfolio_snapshots", {"user_id": f"eq.{user_id}", "date": f"eq.{day.isoformat()}"})
+        db.upsert("portfolio_snapshots", positions, on_conflict="user_id,date,ticker")
+        db.upsert("portfolio_daily", [daily], on_conflict="user_id,date")
+        with self._lock:
+            for key in [k for k in self._series if k[0] == user_id]:
+                del self._series[key]
+        return daily
+
+    # --- Leitura ---
+    def series(self, user_id, since):
+        """portfolio_daily rows from `since` on, oldest first (one range query, cached per day)."""
+        today = market_now().date()
+        since = since.isoformat() if isinstance(since, dt.date) else str(since)[:10]
+        key = (user_id, since)
+        with self._lock:
+            cached = self._series.get(key)
+        if cached is None or cached[0] != today:
+            db = self._db()
+            if db is None:
+                return []
+            rows = list(db.iter_rows(
+                "portfolio_daily", "date,value_brl,twr_index",
+                {"user_id": f"eq.{user_id}", "date": f"gte.{since}"}, key="date",
+            ))
+            cached = (today, rows)
+            with self._lock:
+                self._series[key] = cached
+        return cached[1]
+
+    # --- Job diário ---
+    def _due(self, now):
+        """`now` is aware (converted to MARKET_TZ) or naive already in market time."""
+        if now.tzinfo is not None:
+            now = now.astimezone(MARKET_TZ)
+        at = dt.datetime.strptime(PORTFOLIO_SNAPSHOT_AT, "%H:%M").time()
+        return now.weekday() < 5 and now.time() >= at and self.last_run != now.date()
+
+    def run_daily(self, user_ids, build):
+        """Snapshots every user; `build(user_id)` returns the valued Portfolio."""
+        done = failed = 0
+        for user_id in user_ids:
+            deadline.start(PORTFOLIO_SNAPSHOT_BUDGET_S)
+            try:
+                self.record(user_id, build(user_id))
+                done += 1
+            except Exception as e:
+                failed += 1
+                logger.warning("portfolio snapshot failed user=%s error=%s", user_id, e)
+        self.last_run = market_now().date()
+        logger.info("portfolio snapshots done users=%s failed=%s", done, failed)
+        return done, failed
+
+    def _loop(self, users, build):
+        while not self._stop.is_set():
+            if self._due(market_now()):
+                try:
+                    self.run_daily(users(), build)
+                except Exception as e:
+                    logger.warning("portfolio snapshot run failed error=%s", e)
+            self._stop.wait(SNAPSHOT_CHECK_S)
+
+    def start(self, users, build):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._loop, args=(users, build), name="portfolio-snapshots", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def twr_points(rows, base=TWR_BASE):
+    """[(date, index rebased to `base` on the first row)]"""
+    if not rows:
+        return []
+    first = float(rows[0]["twr_index"]) or 1.0
+    return [(str(r["date"])[:10], float(r["twr_index"]) / first * base) for r in rows]
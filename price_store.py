@@ -0,0 +1,159 @@
+"""
+Shared daily close matrix (dates x symbols) for the analytics endpoints
+(/risk, /backtest).
+
+- Symbols not in memory are read from the local cache (PRICE_CACHE_DIR, one
+  CSV per symbol) or downloaded together in batched yf.download calls
+  (YahooClient.download_many, PRICE_DOWNLOAD_CHUNK symbols each)
+- Each symbol keeps PRICE_HISTORY_PERIOD of closes. Once a day, symbols that
+  already have history only download the last PRICE_REFRESH_PERIOD and
+  append it; closes are dividend/split adjusted, so the stored part is
+  rescaled by the ratio on the first overlapping day
+- matrix() aligns the requested symbols on one date index (forward-filled), as
+  a float64 DataFrame ready for vectorized NumPy work
+"""
+import datetime as dt
+import logging
+import os
+import threading
+from urllib.parse import quote
+
+from lazy_imports import optional
+from supabase_rest import chunks
+
+np = optional("numpy")
+pd = optional("pandas")
+
+logger = logging.getLogger(__name__)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+PRICE_HISTORY_PERIOD = os.getenv("PRICE_HISTORY_PERIOD", "10y")
+PRICE_REFRESH_PERIOD = os.getenv("PRICE_REFRESH_PERIOD", "1mo")
+PRICE_DOWNLOAD_CHUNK = int(os.getenv("PRICE_DOWNLOAD_CHUNK", "100"))
+PRICE_CACHE_DIR = os.getenv("PRICE_CACHE_DIR", os.path.join(_HERE, "data", "cache", "prices"))
+# Histórico mais velho que isso não é emendado com o período curto: baixa tudo de novo
+REFRESH_MAX_GAP_DAYS = 20
+
+
+def merge_adjusted(old, new):
+    """Appends `new` to `old`, rescaling `old` to the adjustment basis of `new`."""
+    if old.empty:
+        return new
+    if new.empty:
+        return old
+    overlap = old.index.intersection(new.index)
+    if len(overlap) and old[overlap[0]] > 0:
+        factor = new[overlap[0]] / old[overlap[0]]
+        if abs(factor - 1) > 1e-9:
+            old = old * factor
+    return pd.concat([old[old.index < new.index[0]], new])
+
+
+class PriceStore:
+    def __init__(self, yahoo, period=PRICE_HISTORY_PERIOD, cache_dir=PRICE_CACHE_DIR):
+        self.yahoo = yahoo
+        self.period = period
+        self.cache_dir = cache_dir or None
+        self.series = {}  # símbolo -> pd.Series de fechamentos (índice sem timezone)
+        self.fetched_on = {}  # símbolo -> dia do download (também para os que vieram vazios)
+        self._lock = threading.Lock()
+
+    # --- Cache local (CSV por símbolo) ---
+    def _path(self, symbol):
+        return os.path.join(self.cache_dir, quote(symbol, safe="") + ".csv")
+
+    def _read(self, symbol):
+        if not self.cache_dir or not os.path.exists(self._path(symbol)):
+            return None
+        try:
+            df = pd.read_csv(self._path(symbol), parse_dates=["date"])
+        except Exception as e:
+            logger.warning("price cache read failed symbol=%s error=%s", symbol, e)
+            return None
+        return pd.Series(df["close"].to_numpy(dtype=np.float64), index=pd.DatetimeIndex(df["date"]))
+
+    def _write(self, symbol, series):
+        if not self.cache_dir:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            series.rename("close").rename_axis("date").to_csv(self._path(symbol), date_format="%Y-%m-%d")
+        except OSError as e:
+            logger.warning("price cache write failed symbol=%s error=%s", symbol, e)
+
+    # --- Download ---
+    def _download(self, symbols, period):
+        """{symbol: closes} for the batches that succeeded, plus the symbols in failed batches."""
+        found, failed = {}, set()
+        for part in chunks(sorted(symbols), PRICE_DOWNLOAD_CHUNK):
+            try:
+                closes = self.yahoo.download_many(part, period=period)
+            except Exception as e:
+                logger.warning("price store download failed symbols=%s error=%s", len(part), e)
+                failed.update(part)
+                continue
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(part[0])
+            for sym in part:
+                if sym in closes:
+                    series = closes[sym].dropna().astype("float64")
+                    if series.index.tz is not None:
+                        series.index = series.index.tz_localize(None)
+                    found[sym] = series
+        return found, failed
+
+    def ensure(self, symbols):
+        """Loads/downloads what is missing or from a previous day; returns the symbols without data."""
+        today = dt.date.today()
+        with self._lock:
+            missing = {s for s in symbols if self.fetched_on.get(s) != today}
+            unloaded = {s for s in missing if s not in self.series}
+        for sym in unloaded:
+            cached = self._read(sym)
+            if cached is not None and not cached.empty:
+                with self._lock:
+                    self.series.setdefault(sym, cached)
+
+        if missing:
+            recent = pd.Timestamp(today) - pd.Timedelta(days=REFRESH_MAX_GAP_DAYS)
+            with self._lock:
+                tail = {s for s in missing if s in self.series and self.series[s].index[-1] >= recent}
+            found, failed = self._download(missing - tail, self.period)
+            if tail:
+                short, short_failed = self._download(tail, PRICE_REFRESH_PERIOD)
+                found.update(short)
+                failed |= short_failed
+            with self._lock:
+                updated = {}
+                for sym in missing - failed:
+                    # Sem dado no Yahoo também conta como buscado (não tenta de novo hoje)
+                    if sym in found and not found[sym].empty:
+                        base = self.series.get(sym) if sym in tail else None
+                        self.series[sym] = found[sym] if base is None else merge_adjusted(base, found[sym])
+                        updated[sym] = self.series[sym]
+                    self.fetched_on[sym] = today
+            for sym, series in updated.items():
+                self._write(sym, series)
+        with self._lock:
+            return {s for s in symbols if s not in self.series}
+
+    def matrix(self, symbols, start=None, end=None):
+        """Closes for `symbols` (those with data) on a common date index, forward-filled."""
+        symbols = list(dict.fromkeys(symbols))
+        self.ensure(symbols)
+        with self._lock:
+            columns = {s: self.series[s] for s in symbols if s in self.series}
+        if not columns:
+            return pd.DataFrame(dtype="float64")
+        frame = pd.concat(columns, axis=1).sort_index().ffill()
+        if start is not None:
+            frame = frame[frame.index >= pd.Timestamp(start)]
+        if end is not None:
+            frame = frame[frame.index <= pd.Timestamp(end)]
+        return frame
+
+    def clear(self):
+        """Drops the in-memory series (the local cache files stay)."""
+        with self._lock:
+            self.series.clear()
+            self.fetched_on.clear()
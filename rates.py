@@ -0,0 +1,290 @@
+"""
+Local Brazilian rate series (SELIC / CDI / IPCA) and benchmark curves.
+
+- The SELIC target history ships with the repo (data/selic_copom.csv, one row
+  per COPOM decision, effective date); CDI is derived from it. This is the
+  fallback for any day the observed series does not cover
+- Observed series come from the BCB SGS API (SERIES) and are cached in
+  RATES_CACHE_DIR as CSV; update() only asks for the days after the last one
+  stored, and runs in the background once a day (start())
+- curve() compounds daily rates with a vectorized cumprod into an index
+  (base 100); curves are cached per day and shared by every user/request
+- Days before the first rate known for a series (first_date()) raise
+  LookupError instead of compounding at 0%
+"""
+import bisect
+import csv
+import datetime as dt
+import logging
+import os
+import threading
+
+import requests
+
+from lazy_imports import optional
+from metrics import record_cache, span
+
+np = optional("numpy")
+pd = optional("pandas")
+
+logger = logging.getLogger(__name__)
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+RATES_FILE = os.getenv("RATES_FILE", os.path.join(_HERE, "data", "selic_copom.csv"))
+RATES_CACHE_DIR = os.getenv("RATES_CACHE_DIR", os.path.join(_HERE, "data", "cache"))
+RATES_UPDATE_S = float(os.getenv("RATES_UPDATE_S", "86400"))
+CDI_SPREAD = 0.10  # CDI ~ meta SELIC - 0,10 p.p.
+BUSINESS_DAYS = 252
+
+SGS_URL = "https://api.bcb.gov.br/dados/serie/bcdata.sgs.{code}/dados"
+SGS_HISTORY_YEARS = 5  # primeira carga (a API limita séries diárias a janelas de 10 anos)
+
+# nome -> (código SGS, periodicidade: "D" = % a.d. por dia útil, "M" = % a.m.)
+SERIES = {
+    "SELIC": (11, "D"),
+    "CDI": (12, "D"),
+    "IPCA": (433, "M"),
+}
+
+
+def _parse_date(value):
+    if isinstance(value, dt.datetime):
+        return value.date()
+    return value if isinstance(value, dt.date) else dt.date.fromisoformat(str(value)[:10])
+
+
+def _daily_from_annual(annual_pct):
+    return ((1 + np.asarray(annual_pct, dtype=np.float64) / 100) ** (1 / BUSINESS_DAYS) - 1) * 100
+
+
+class RateStore:
+    def __init__(self, path=RATES_FILE, cache_dir=RATES_CACHE_DIR, http_get=requests.get):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.http_get = http_get
+        self.dates = []
+        self.selic = []
+        self._observed = None  # nome -> pd.Series (% por período, índice = data)
+        self._curves = {}
+        self._curves_day = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.load()
+
+    # --- Série base (COPOM) ---
+    def load(self):
+        with open(self.path, newline="") as f:
+            rows = [r for r in csv.DictReader(line for line in f if not line.startswith("#"))]
+        rows.sort(key=lambda r: r["date"])
+        with self._lock:
+            self.dates = [_parse_date(r["date"]) for r in rows]
+            self.selic = [float(r["selic"]) for r in rows]
+            self._observed = None  # relido no próximo uso
+            self._curves = {}
+
+    @property
+    def observed(self):
+        # Cache do SGS lido no primeiro uso: o boot não importa pandas
+        observed = self._observed
+        if observed is None:
+            loaded = {name: self._read_cache(name) for name in SERIES}
+            with self._lock:
+                if self._observed is None:
+                    self._observed = loaded
+                observed = self._observed
+        return observed
+
+    def _target(self, name, on):
+        with self._lock:
+            i = bisect.bisect_right(self.dates, on) - 1
+            if i < 0:
+                raise LookupError(f"{name}: no rate before {on}")
+            selic = self.selic[i]
+        if name == "SELIC":
+            return selic
+        if name == "CDI":
+            return round(selic - CDI_SPREAD, 2)
+        raise KeyError(f"unknown rate: {name}")
+
+    def annual(self, name, on=None):
+        """Annual rate (% a.a.) in force on `on` (default: today); observed value when cached."""
+        on = _parse_date(on) if on else dt.date.today()
+        observed = self.observed.get(name)
+        if observed is not None and not observed.empty and SERIES[name][1] == "D":
+            upto = observed[observed.index <= pd.Timestamp(on)]
+            # Só usa o observado se for recente (senão a meta vigente é mais fiel)
+            if not upto.empty and (pd.Timestamp(on) - upto.index[-1]).days <= 7:
+                return round(((1 + upto.iloc[-1] / 100) ** BUSINESS_DAYS - 1) * 100, 2)
+        return self._target(name, on)
+
+    @property
+    def last_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def first_date(self, name):
+        """First day with a known rate for `name` (COPOM series or observed, whichever starts first)."""
+        observed = self.observed.get(name)
+        first = observed.index[0].date() if observed is not None and not observed.empty else None
+        if SERIES[name][1] == "M":
+            return first
+        with self._lock:
+            target = self.dates[0] if self.dates else None
+        known = [d for d in (first, target) if d is not None]
+        return min(known) if known else None
+
+    # --- Cache local da série observada (SGS) ---
+    def _cache_path(self, name):
+        return os.path.join(self.cache_dir, f"sgs_{name.lower()}.csv")
+
+    def _read_cache(self, name):
+        path = self._cache_path(name)
+        if not os.path.exists(path):
+            return pd.Series(dtype=np.float64)
+        df = pd.read_csv(path, parse_dates=["date"])
+        return pd.Series(df["value"].to_numpy(dtype=np.float64), index=pd.DatetimeIndex(df["date"]))
+
+    def update(self, name, today=None):
+        """Fetches only the SGS points after the last cached one; returns how many were added."""
+        code, _ = SERIES[name]
+        today = today or dt.date.today()
+        current = self.observed.get(name)
+        if current is not None and not current.empty:
+            start = current.index[-1].date() + dt.timedelta(days=1)
+        else:
+            start = today.replace(year=today.year - SGS_HISTORY_YEARS)
+        if start > today:
+            return 0
+
+        params = {
+            "formato": "json",
+            "dataInicial": start.strftime("%d/%m/%Y"),
+            "dataFinal": today.strftime("%d/%m/%Y"),
+        }
+        with span("bcb_sgs", series=name):
+            resp = self.http_get(SGS_URL.format(code=code), params=params, timeout=10)
+        if resp.status_code == 404:
+            return 0  # SGS responde 404 quando não há dados no intervalo
+        resp.raise_for_status()
+        rows = [
+            (dt.datetime.strptime(r["data"], "%d/%m/%Y").date(), float(str(r["valor"]).replace(",", ".")))
+            for r in resp.json()
+        ]
+        rows = [(d, v) for d, v in rows if d >= start]
+        if not rows:
+            return 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._cache_path(name)
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["date", "value"])
+            writer.writerows((d.isoformat(), v) for d, v in rows)
+
+        added = pd.Series([v for _, v in rows], index=pd.DatetimeIndex([pd.Timestamp(d) for d, _ in rows]))
+        observed = self.observed
+        with self._lock:
+            base = observed.get(name)
+            observed[name] = added if base is None or base.empty else pd.concat([base, added])
+            self._curves = {}
+        logger.info("rates updated series=%s added=%s last=%s", name, len(rows), rows[-1][0])
+        return len(rows)
+
+    def update_all(self):
+        for name in SERIES:
+            try:
+                self.update(name)
+            except Exception as e:
+                logger.warning("rates update failed series=%s error=%s", name, e)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.update_all()
+            self._stop.wait(RATES_UPDATE_S)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="rates-update", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- Curvas (índice acumulado) ---
+    def daily_rates(self, name, start, end):
+        """% per business day between start and end (weekdays), observed where available."""
+        days = pd.bdate_range(pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+        _, freq = SERIES[name]
+        observed = self.observed.get(name)
+        has_obs = observed is not None and not observed.empty
+        first = self.first_date(name)
+        if first is None:
+            raise LookupError(f"{name}: no data (run update)")
+        # Mensal: vale a partir do mês do primeiro ponto
+        floor = pd.Timestamp(first).to_period("M").start_time if freq == "M" else pd.Timestamp(first)
+        if len(days) and days[0] < floor:
+            raise LookupError(f"{name}: rates available from {first.isoformat()}")
+
+        if freq == "M":
+            # Taxa mensal distribuída geometricamente pelos dias úteis do mês
+            periods = days.to_period("M")
+            monthly = observed.copy()
+            monthly.index = monthly.index.to_period("M")
+            monthly = monthly[~monthly.index.duplicated(keep="last")]
+            rate = monthly.reindex(periods).ffill().fillna(0.0).to_numpy()
+            n_days = pd.Series(1, index=periods).groupby(level=0).transform("size").to_numpy()
+            return pd.Series(((1 + rate / 100) ** (1 / n_days) - 1) * 100, index=days)
+
+        # Diária: meta do COPOM como base, sobrescrita pelo observado dentro da cobertura
+        with self._lock:
+            targets = np.array(self.selic, dtype=np.float64)
+            target_dates = pd.DatetimeIndex(self.dates)
+        idx = np.searchsorted(target_dates.values, days.values, side="right") - 1
+        annual = np.where(idx >= 0, targets[np.clip(idx, 0, None)], 0.0)
+        if name == "CDI":
+            annual = annual - CDI_SPREAD
+        rates = pd.Series(_daily_from_annual(annual), index=days)
+
+        if has_obs:
+            covered = (days >= observed.index[0]) & (days <= observed.index[-1])
+            # Dia útil sem ponto na série observada (feriado): não rende
+            obs = observed[~observed.index.duplicated(keep="last")].reindex(days[covered]).fillna(0.0)
+            rates[covered] = obs.to_numpy()
+        return rates
+
+    def curve(self, name, start, end, base=100.0):
+        """Cumulative index over business days, `base` on the first day. Cached per day."""
+        start, end = _parse_date(start), _parse_date(end)
+        today = dt.date.today()
+        key = (name, start, end, base)
+        with self._lock:
+            if self._curves_day != today:
+                self._curves, self._curves_day = {}, today
+            cached = self._curves.get(key)
+        if cached is not None:
+            record_cache("benchmark_curve", hit=True)
+            return cached
+        record_cache("benchmark_curve", hit=False)
+
+        rates = self.daily_rates(name, start, end)
+        factors = 1 + rates.to_numpy() / 100
+        # Taxa do dia d rende de d para d+1: o índice em d acumula só os dias anteriores
+        growth = np.concatenate(([1.0], np.cumprod(factors)[:-1])) if len(factors) else factors
+        result = pd.Series(growth * base, index=rates.index)
+        with self._lock:
+            self._curves[key] = result
+        return result
+
+    def index_on(self, name, dates, base=100.0):
+        """Benchmark index aligned to `dates` (e.g. IBOV trading days), `base` on the first one."""
+        dates = pd.DatetimeIndex(dates)
+        if dates.empty:
+            return np.array([], dtype=np.float64)
+        naive = dates.tz_localize(None) if dates.tz is not None else dates
+        curve = self.curve(name, naive.min(), naive.max())
+        values = curve.reindex(curve.index.union(naive.normalize())).ffill().bfill()
+        values = values.reindex(naive.normalize()).to_numpy()
+        return values / values[0] * base
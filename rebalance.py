@@ -0,0 +1,242 @@
+"""
+Deterministic rebalancing to target weights per category.
+
+Given target weights per category (Ação, FII, Stocks, REITs, ETF, Cripto,
+Renda Fixa, or any other category the user holds) and optional extra cash, computes the buy/sell list that brings the portfolio to
+the targets with the least turnover:
+
+- the BRL gap per category (target - current) is the minimum that has to
+  trade; categories already on target are not touched
+- inside a category the gap is split across its holdings proportionally to
+  their value (keeps the user's picks and their relative sizes)
+- quantities are rounded down to the category's lot size, trades below
+  `min_trade` are dropped, fees (percentage + fixed per order) come out of
+  the cash available for buys
+- leftover cash from the rounding buys extra lots greedily, largest gap first
+
+Everything is vectorized over the holdings (np.unique/bincount per ticker
+and per category), so thousands of positions solve in a few milliseconds.
+Categories with a target but no holdings cannot be bought (no ticker to pick)
+and are reported in `unreachable`; their share stays in cash. Held categories
+without a target are left untouched: they are kept out of the rebalanced total
+and reported in `untouched`.
+
+Uso:
+    plan(portfolio, {"Ação": 40, "FII": 30, "Stocks": 20, "Renda Fixa": 10}, cash=1000)
+"""
+import math
+import os
+
+from lazy_imports import optional
+
+np = optional("numpy")
+
+# Mesmas opções do formulário do frontend (TYPE_CATEGORY do ticker_resolver)
+CATEGORIES = ("Ação", "FII", "Stocks", "REITs", "ETF", "Cripto", "Renda Fixa")
+# Corretagem zero é o comum; emolumentos da B3 ~0,03% por ordem
+REBALANCE_FEE_PCT = float(os.getenv("REBALANCE_FEE_PCT", "0.0003"))
+REBALANCE_FEE_FIXED = float(os.getenv("REBALANCE_FEE_FIXED", "0"))
+REBALANCE_MIN_TRADE = float(os.getenv("REBALANCE_MIN_TRADE", "0"))
+# Lote por categoria (fracionário na B3 = 1 ação)
+REBALANCE_LOTS = os.getenv("REBALANCE_LOTS", "Ação=1,FII=1,Stocks=1,REITs=1,ETF=1,Cripto=0.00000001,Renda Fixa=0.01")
+EPS = 1e-9
+
+
+def parse_lots(spec):
+    """'Ação=1,Cripto=0.0001' -> {"Ação": 1.0, "Cripto": 0.0001}"""
+    lots = {}
+    for item in spec.split(","):
+        name, sep, size = item.strip().partition("=")
+        if sep and name and size:
+            lots[name.strip()] = float(size)
+    return lots
+
+
+def _finite(name, value):
+    """float(value), ValueError if it is not a finite number."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} deve ser numérico") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} deve ser um número finito")
+    return value
+
+
+def parse_lot_sizes(lots):
+    """REBALANCE_LOTS merged with the request's {category: lot size}. ValueError if invalid."""
+    if lots is not None and not isinstance(lots, dict):
+        raise ValueError("lots deve ser um objeto {categoria: tamanho do lote}")
+    sizes = {**parse_lots(REBALANCE_LOTS), **(lots or {})}
+    sizes = {c: _finite(f"lote de {c}", v) for c, v in sizes.items()}
+    invalid = sorted(c for c, v in sizes.items() if v <= 0)
+    if invalid:
+        raise ValueError(f"lote deve ser maior que zero: {', '.join(invalid)}")
+    return sizes
+
+
+def parse_targets(targets, held=()):
+    """
+    {category: weight} in percent (or fractions) -> fractions summing to 1.
+    Categories are CATEGORIES plus the `held` ones. ValueError if invalid.
+    """
+    if not isinstance(targets, dict) or not targets:
+        raise ValueError("targets deve ser um objeto {categoria: peso}")
+    unknown = sorted(set(targets) - set(CATEGORIES) - set(held))
+    if unknown:
+        raise ValueError(f"categorias desconhecidas: {', '.join(unknown)}")
+    weights = {c: _finite(f"peso de {c}", w) for c, w in targets.items()}
+    if any(w < 0 for w in weights.values()):
+        raise ValueError("pesos não podem ser negativos")
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("a soma dos pesos deve ser positiva")
+    return {c: w / total for c, w in weights.items()}
+
+
+def _floor_lots(qty, lot):
+    return np.floor(qty / lot + EPS) * lot
+
+
+def plan(portfolio, targets, cash=0.0, fee_pct=REBALANCE_FEE_PCT, fee_fixed=REBALANCE_FEE_FIXED,
+         min_trade=REBALANCE_MIN_TRADE, lots=None, allow_sell=True):
+    categories = [p.category or "" for p in portfolio.positions]
+    weights = parse_targets(targets, held=set(categories) - {""})
+    cash = _finite("cash", cash or 0.0)
+    if cash < 0:
+        raise ValueError("cash não pode ser negativo")
+    fee_pct = _finite("fee_pct", fee_pct)
+    if not 0 <= fee_pct < 1:
+        raise ValueError("fee_pct deve estar entre 0 e 1 (fração)")
+    fee_fixed = _finite("fee_fixed", fee_fixed)
+    min_trade = _finite("min_trade", min_trade)
+    if fee_fixed < 0 or min_trade < 0:
+        raise ValueError("fee_fixed e min_trade não podem ser negativos")
+    lot_sizes = parse_lot_sizes(lots)
+
+    # Por ticker (linhas duplicadas somam)
+    tickers = np.array([p.ticker or "" for p in portfolio.positions], dtype=object).astype(str)
+    labels, first, codes = np.unique(tickers, return_index=True, return_inverse=True)
+    n = len(labels)
+    qty = np.bincount(codes, weights=portfolio.qty, minlength=n)
+    value = np.bincount(codes, weights=portfolio.value_brl, minlength=n)
+    price = np.divide(value, qty, out=np.zeros(n), where=qty > 0)
+    categories = [categories[i] for i in first.tolist()]
+
+    # Categoria sem alvo não é tocada: fica fora do total rebalanceado
+    untouched = {}
+    for c, v in zip(categories, value.tolist()):
+        if c not in weights:
+            untouched[c] = untouched.get(c, 0.0) + v
+    keep = np.array([c in weights for c in categories], dtype=bool)
+    labels, qty, value, price = labels[keep], qty[keep], value[keep], price[keep]
+    categories = [c for c in categories if c in weights]
+    n = len(labels)
+    tradable = (price > 0) & (labels != "")
+
+    # Por categoria
+    cat_labels = sorted(set(categories) | set(weights))
+    cat_index = {c: i for i, c in enumerate(cat_labels)}
+    cat = np.array([cat_index[c] for c in categories], dtype=np.int64)
+    m = len(cat_labels)
+    held = np.bincount(cat, weights=value, minlength=m)
+    tradable_value = np.bincount(cat, weights=np.where(tradable, value, 0.0), minlength=m)
+    w = np.array([weights.get(c, 0.0) for c in cat_labels])
+    total = held.sum() + cash
+    gap = w * total - held  # >0 compra, <0 venda
+    reachable = tradable_value > 0
+    unreachable = [c for c, g, ok in zip(cat_labels, gap.tolist(), reachable.tolist()) if g > 0 and not ok]
+    gap = np.where(reachable, gap, 0.0)
+    lot = np.array([lot_sizes.get(c, 1.0) for c in categories], dtype=np.float64)
+
+    # Parcela de cada ticker no gap da sua categoria
+    share = np.divide(
+        np.where(tradable, value, 0.0), tradable_value[cat],
+        out=np.zeros(n), where=tradable_value[cat] > 0,
+    )
+    desired = gap[cat] * share  # R$ por ticker
+
+    # 1. Vendas
+    sell_qty = np.zeros(n)
+    if allow_sell:
+        want = np.where(desired < 0, -desired, 0.0)
+        sell_qty = np.minimum(_floor_lots(np.divide(want, price, out=np.zeros(n), where=price > 0), lot), qty)
+        sell_qty = np.where(sell_qty * price >= max(min_trade, EPS), sell_qty, 0.0)
+    sell_notional = sell_qty * price
+    sell_fees = np.where(sell_qty > 0, sell_notional * fee_pct + fee_fixed, 0.0)
+    budget = cash + sell_notional.sum() - sell_fees.sum()
+
+    # 2. Compras, escaladas ao caixa disponível (com taxas)
+    want = np.where(desired > 0, desired, 0.0)
+    n_orders = int(np.count_nonzero(want))
+    wanted_cost = want.sum() * (1 + fee_pct) + fee_fixed * n_orders
+    scale = min(1.0, max(budget, 0.0) / wanted_cost) if wanted_cost > 0 else 0.0
+    buy_qty = _floor_lots(np.divide(want * scale, price, out=np.zeros(n), where=price > 0), lot)
+    buy_qty = np.where(buy_qty * price >= max(min_trade, EPS), buy_qty, 0.0)
+
+    # 3. Sobra do arredondamento: um lote a mais onde o gap restante é maior
+    spent = (buy_qty * price).sum() * (1 + fee_pct) + fee_fixed * np.count_nonzero(buy_qty)
+    leftover = budget - spent
+    lot_value = lot * price
+    remaining = want - buy_qty * price
+    extra_cost = lot_value * (1 + fee_pct) + np.where(buy_qty > 0, 0.0, fee_fixed)
+    candidates = (remaining >= lot_value / 2) & (lot_value > 0) & (lot_value >= min_trade)
+    if leftover > 0 and candidates.any():
+        order = np.argsort(-np.where(candidates, remaining, -np.inf), kind="stable")
+        order = order[candidates[order]]
+        fits = np.cumsum(extra_cost[order]) <= leftover
+        buy_qty[order[fits]] += lot[order[fits]]
+
+    buy_notional = buy_qty * price
+    buy_fees = np.where(buy_qty > 0, buy_notional * fee_pct + fee_fixed, 0.0)
+    cash_left = budget - buy_notional.sum() - buy_fees.sum()
+
+    # Resultado
+    after_value = value - sell_notional + buy_notional
+    after = np.bincount(cat, weights=after_value, minlength=m)
+    total_after = after.sum() + cash_left
+    trades = []
+    ticker_list, price_list = labels.tolist(), price.tolist()
+    for side, q, notional, fees in (("sell", sell_qty, sell_notional, sell_fees), ("buy", buy_qty, buy_notional, buy_fees)):
+        idx = np.flatnonzero(q > 0)
+        idx = idx[np.argsort(-notional[idx], kind="stable")]
+        for i, qi, ni, fi in zip(idx.tolist(), q[idx].tolist(), notional[idx].tolist(), fees[idx].tolist()):
+            trades.append({
+                "ticker": ticker_list[i],
+                "category": categories[i],
+                "side": side,
+                "quantity": round(qi, 8),
+                "price_brl": round(price_list[i], 4),
+                "notional": round(ni, 2),
+                "fee": round(fi, 2),
+            })
+
+    def pct(x, base):
+        return round(float(x) / float(base) * 100, 4) if base > 0 else 0.0
+
+    return {
+        "total_value": round(float(total), 2),
+        "categories": [
+            {
+                "category": c,
+                "target_pct": round(float(w[i]) * 100, 4),
+                "current_pct": pct(held[i], total),
+                "after_pct": pct(after[i], total_after),
+                "current": round(float(held[i]), 2),
+                "target": round(float(w[i] * total), 2),
+                "after": round(float(after[i]), 2),
+            }
+            for i, c in enumerate(cat_labels)
+        ],
+        "trades": trades,
+        "summary": {
+            "buy": round(float(buy_notional.sum()), 2),
+            "sell": round(float(sell_notional.sum()), 2),
+            "fees": round(float(buy_fees.sum() + sell_fees.sum()), 2),
+            "orders": len(trades),
+            "turnover_pct": pct(buy_notional.sum() + sell_notional.sum(), total),
+            "cash_left": round(float(cash_left), 2),
+        },
+        "unreachable": unreachable,
+        "untouched": [{"category": c, "value": round(v, 2)} for c, v in sorted(untouched.items())],
+    }
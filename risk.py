@@ -0,0 +1,245 @@
+"""
+Portfolio risk analytics over the daily price matrix (price_store).
+
+Everything is computed on the whole (days x assets) return matrix at once:
+
+- annualized covariance / correlation (one matrix product)
+- volatility, beta vs IBOV and max drawdown per asset and for the portfolio
+- risk contribution per asset: w_i * (Σw)_i / σ_p (the contributions sum to σ_p)
+
+Positions are grouped by Yahoo symbol and valued in BRL: assets quoted in
+another currency are converted day by day with their <CCY>BRL=X pair
+(currency.daily_rates), so FX risk is part of their returns.
+Positions without a price series (fixed income, missing data) count in the
+weights with zero return, so they dilute risk instead of being ignored.
+Results are cached per holdings fingerprint (Portfolio.fingerprint()).
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import metrics
+from currency import daily_rates, pair_symbols
+from lazy_imports import optional
+
+np = optional("numpy")
+pd = optional("pandas")
+
+logger = logging.getLogger(__name__)
+
+RISK_CACHE_TTL_S = float(os.getenv("RISK_CACHE_TTL_S", "3600"))
+RISK_WINDOW_DAYS = int(os.getenv("RISK_WINDOW_DAYS", "365"))
+BENCHMARK_SYMBOL = "^BVSP"
+TRADING_DAYS = 252
+MIN_OBSERVATIONS = 20
+
+
+def _max_drawdown(prices):
+    """Max drawdown per column of a (days x n) price/equity matrix (negative fraction)."""
+    peaks = np.maximum.accumulate(prices, axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peaks > 0, prices / peaks - 1.0, 0.0)
+    return dd.min(axis=0)
+
+
+def compute(prices, values, benchmark=None, unpriced_value=0.0):
+    """
+    prices: (days x n) BRL closes, values: (n,) BRL position values,
+    benchmark: (days,) closes on the same dates. Returns a dict of NumPy results.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    total = values.sum() + unpriced_value
+    w = values / total if total > 0 else np.zeros_like(values)
+
+    returns = prices[1:] / prices[:-1] - 1.0
+    returns = np.nan_to_num(returns, nan=0.0, posinf=0.0, neginf=0.0)
+    n_obs = returns.shape[0]
+    centered = returns - returns.mean(axis=0)
+    cov = centered.T @ centered / max(n_obs - 1, 1) * TRADING_DAYS
+    vol = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where(np.outer(vol, vol) > 0, cov / np.outer(vol, vol), 0.0)
+    np.fill_diagonal(corr, np.where(vol > 0, 1.0, 0.0))
+
+    port_var = float(w @ cov @ w)
+    port_vol = np.sqrt(max(port_var, 0.0))
+    marginal = cov @ w
+    contribution = w * marginal / port_vol if port_vol > 0 else np.zeros_like(w)
+
+    port_returns = returns @ w
+    equity = np.cumprod(1.0 + port_returns)
+    result = {
+        "cov": cov,
+        "corr": corr,
+        "vol": vol,
+        "weights": w,
+        "contribution": contribution,
+        "asset_drawdown": _max_drawdown(prices),
+        "portfolio_vol": port_vol,
+        "portfolio_drawdown": float(_max_drawdown(np.concatenate(([1.0], equity))[:, None])[0]),
+        "observations": n_obs,
+        "beta": np.full(len(w), np.nan),
+        "portfolio_beta": None,
+    }
+
+    if benchmark is not None:
+        bench = np.asarray(benchmark, dtype=np.float64)
+        b = np.nan_to_num(bench[1:] / bench[:-1] - 1.0, nan=0.0, posinf=0.0, neginf=0.0)
+        b_centered = b - b.mean()
+        var_b = float(b_centered @ b_centered)
+        if var_b > 0:
+            result["beta"] = centered.T @ b_centered / var_b
+            result["portfolio_beta"] = float(result["beta"] @ w)
+    return result
+
+
+class RiskEngine:
+    """`prices` is a PriceStore; results cached per (fingerprint, window)."""
+
+    def __init__(self, prices, ttl_s=RISK_CACHE_TTL_S, window_days=RISK_WINDOW_DAYS, max_entries=256):
+        self.prices = prices
+        self.ttl = ttl_s
+        self.window_days = window_days
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # chave -> (created_at, resultado)
+        self._lock = threading.Lock()
+
+    def _cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                metrics.record_cache("risk", hit=False)
+                return None
+            self._entries.move_to_end(key)
+        metrics.record_cache("risk", hit=True)
+        return entry[1]
+
+    def _put(self, key, result):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def analyze(self, portfolio):
+        key = (portfolio.fingerprint(), self.window_days)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        result = self._analyze(portfolio)
+        if not result["stale"]:
+            self._put(key, result)
+        return result
+
+    def _analyze(self, portfolio):
+        # Agrupa por símbolo do Yahoo (linhas duplicadas somam)
+        groups = {}
+        unpriced_value = 0.0
+        excluded = []
+        for p, value in zip(portfolio.positions, portfolio.value_brl.tolist()):
+            inst = p.instrument
+            if not inst.priced or not inst.yahoo or value <= 0:
+                unpriced_value += max(value, 0.0)
+                if value > 0:
+                    excluded.append(p.ticker)
+                continue
+            g = groups.setdefault(inst.yahoo, {"ticker": p.ticker, "value": 0.0, "currency": inst.currency})
+            g["value"] += value
+
+        symbols = list(groups)
+        fx_symbols = pair_symbols(g["currency"] for g in groups.values())
+        start = pd.Timestamp.now().normalize() - pd.Timedelta(days=self.window_days)
+        frame = self.prices.matrix(symbols + [BENCHMARK_SYMBOL] + fx_symbols, start)
+
+        missing = [s for s in symbols if s not in frame.columns]
+        for s in missing:
+            unpriced_value += groups[s]["value"]
+            excluded.append(groups[s]["ticker"])
+        symbols = [s for s in symbols if s in frame.columns]
+        empty = {
+            "fingerprint": portfolio.fingerprint(),
+            "window": None,
+            "portfolio": None,
+            "assets": [],
+            "correlation": {"tickers": [], "matrix": []},
+            "covariance": [],
+            "coverage": 0.0,
+            "excluded": sorted(excluded),
+            "stale": bool(missing),
+        }
+        if not symbols:
+            return empty
+
+        # Janela comum: a partir do primeiro dia em que todos os ativos têm preço
+        frame = frame.dropna(subset=symbols)
+        if len(frame) < MIN_OBSERVATIONS:
+            return empty
+        prices = frame[symbols].to_numpy(dtype=np.float64)
+        if fx_symbols:
+            prices = prices * daily_rates(frame, [groups[s]["currency"] for s in symbols])
+        bench = None
+        if BENCHMARK_SYMBOL in frame.columns:
+            bench = frame[BENCHMARK_SYMBOL].ffill().bfill().to_numpy(dtype=np.float64)
+
+        values = np.array([groups[s]["value"] for s in symbols])
+        r = compute(prices, values, bench, unpriced_value)
+
+        tickers = [groups[s]["ticker"] for s in symbols]
+        order = np.argsort(-r["contribution"], kind="stable")
+        total_vol = r["portfolio_vol"]
+        assets = []
+        for i in order.tolist():
+            beta = r["beta"][i]
+            assets.append({
+                "ticker": tickers[i],
+                "symbol": symbols[i],
+                "weight": round(float(r["weights"][i]) * 100, 4),
+                "volatility": round(float(r["vol"][i]) * 100, 4),
+                "beta": None if np.isnan(beta) else round(float(beta), 4),
+                "max_drawdown": round(float(r["asset_drawdown"][i]) * 100, 4),
+                "risk_contribution": round(float(r["contribution"][i]) * 100, 4),
+                "risk_contribution_pct": round(float(r["contribution"][i] / total_vol) * 100, 4) if total_vol > 0 else 0.0,
+            })
+        total = values.sum() + unpriced_value
+        return {
+            "fingerprint": portfolio.fingerprint(),
+            "window": {
+                "start": frame.index[0].strftime("%Y-%m-%d"),
+                "end": frame.index[-1].strftime("%Y-%m-%d"),
+                "observations": r["observations"],
+            },
+            "portfolio": {
+                "volatility": round(total_vol * 100, 4),
+                "beta": None if r["portfolio_beta"] is None else round(r["portfolio_beta"], 4),
+                "max_drawdown": round(r["portfolio_drawdown"] * 100, 4),
+            },
+            "assets": assets,
+            "correlation": {"tickers": tickers, "matrix": np.round(r["corr"], 4).tolist()},
+            "covariance": np.round(r["cov"], 6).tolist(),
+            "coverage": round(float(values.sum() / total) * 100, 4) if total > 0 else 0.0,
+            "excluded": sorted(excluded),
+            "stale": bool(missing),
+        }
+
+
+def prompt_summary(result, top=5):
+    """Short text block with the computed metrics for the /analyze prompt."""
+    port = result.get("portfolio")
+    if not port:
+        return ""
+    lines = [
+        f"Volatilidade anualizada: {port['volatility']:.2f}%",
+        f"Beta vs IBOV: {port['beta']:.2f}" if port["beta"] is not None else "Beta vs IBOV: n/d",
+        f"Drawdown máximo (janela): {port['max_drawdown']:.2f}%",
+        f"Cobertura (valor com série de preço): {result['coverage']:.1f}%",
+        "Maiores contribuições de risco:",
+    ]
+    for a in result["assets"][:top]:
+        lines.append(
+            f"- {a['ticker']}: peso {a['weight']:.1f}%, vol {a['volatility']:.1f}%, "
+            f"{a['risk_contribution_pct']:.1f}% do risco"
+        )
+    return "\n".join(lines)
@@ -1,7 +1,15 @@
+"""
+Seed mínimo (instituições + instrumentos mais comuns).
+
+Listas completas de B3/NYSE/NASDAQ/cripto: load_instruments.py.
+"""
 import os
-import requests
+
 from dotenv import load_dotenv
 
+from load_instruments import load
+from supabase_rest import SupabaseREST
+
 load_dotenv()
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -12,19 +20,8 @@ if not SUPABASE_URL or not SUPABASE_KEY:
     exit(1)
 
 
-def supabase_post(table, data):
-    url = f"{SUPABASE_URL.rstrip('/')}/rest/v1/{table}"
-    headers = {
-        "apikey": SUPABASE_KEY,
-        "Authorization": f"Bearer {SUPABASE_KEY}",
-        "Content-Type": "application/json",
-        "Prefer": "resolution=merge-duplicates",  # Upsert basic
-    }
-    resp = requests.post(url, headers=headers, json=data)
-    if resp.status_code < 300:
-        print(f"{table}: Inserido/Atualizado {len(data)} registros.")
-    else:
-        print(f"{table} Erro {resp.status_code}: {resp.text}")
+def _db():
+    return SupabaseREST(SUPABASE_URL, SUPABASE_KEY)
 
 
 def seed_institutions():
@@ -66,7 +63,8 @@ def seed_institutions():
             "logo_url": "https://logodownload.org/wp-content/uploads/2017/11/banco-inter-logo.png",
         },
     ]
-    supabase_post("institutions", institutions)
+    stats = load(_db(), None, "institutions", rows=institutions)
+    print(f"institutions: Inserido/Atualizado {stats['rows']} registros.")
 
 
 def seed_assets_master():
@@ -189,7 +187,8 @@ def seed_assets_master():
             "exchange": "CRYPTO",
         },
     ]
-    supabase_post("assets_master", assets)
+    stats = load(_db(), None, "assets", rows=assets)
+    print(f"assets_master: Inserido/Atualizado {stats['rows']} registros.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,67 @@
+"""
+Short-lived per-user portfolio snapshots.
+
+The dashboard fires /assets, /analyze, /dividends, /history and /news within a
+second of each other; they all share one computed Portfolio per (user, version).
+Writes (/add-asset, DELETE /assets/{id}) bump the user's version, which
+invalidates the snapshot immediately. Concurrent misses for the same user wait
+for a single build instead of each hitting Supabase + Yahoo.
+"""
+import os
+import threading
+import time
+
+from metrics import record_cache
+
+SNAPSHOT_TTL_S = float(os.getenv("PORTFOLIO_SNAPSHOT_TTL_S", "30"))
+
+
+class SnapshotCache:
+    def __init__(self, ttl_s=SNAPSHOT_TTL_S, name="portfolio_snapshot"):
+        self.ttl = ttl_s
+        self.name = name
+        self._versions = {}  # user_id -> int
+        self._entries = {}  # user_id -> (version, built_at, value)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def version(self, user_id):
+        return self._versions.get(user_id, 0)
+
+    def invalidate(self, user_id):
+        with self._guard:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._entries.pop(user_id, None)
+
+    def _fresh(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        version, built_at, value = entry
+        if version != self.version(user_id) or time.monotonic() - built_at > self.ttl:
+            return None
+        return value
+
+    def get_or_build(self, user_id, builder):
+        value = self._fresh(user_id)
+        if value is not None:
+            record_cache(self.name, hit=True)
+            return value
+
+        with self._guard:
+            lock = self._locks.setdefault(user_id, threading.Lock())
+        with lock:
+            # Outro request pode ter montado enquanto esperávamos
+            value = self._fresh(user_id)
+            if value is not None:
+                record_cache(self.name, hit=True)
+                return value
+            record_cache(self.name, hit=False)
+
+            version = self.version(user_id)
+            value = builder()
+            with self._guard:
+                # Escrita durante o build: não guarda um snapshot já velho
+                if version == self.version(user_id):
+                    self._entries[user_id] = (version, time.monotonic(), value)
+            return value
@@ -0,0 +1,83 @@
+"""
+Static file serving with precompressed variants and long-lived caching.
+
+Files produced by build_static.py live in static/dist as name.<hash>.ext plus
+.br/.gz siblings. Fingerprinted files never change, so they are served as
+immutable; everything else is revalidated on every visit.
+"""
+import mimetypes
+import os
+import re
+
+from fastapi.responses import FileResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import NotModifiedResponse
+
+DIST_DIR = os.path.join("static", "dist")
+FINGERPRINT_RE = re.compile(r"\.[0-9a-f]{12}\.[a-z0-9]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+# Ordem de preferência: brotli > gzip
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def accepted_encodings(headers):
+    accept = headers.get("accept-encoding", "")
+    return {part.split(";")[0].strip() for part in accept.split(",") if part.strip()}
+
+
+def precompressed_response(full_path, headers, status_code=200, stat_result=None):
+    """
+    Builds a FileResponse for full_path, swapping in a .br/.gz sibling when the
+    client accepts it. Cache-Control depends on whether the name is fingerprinted.
+    """
+    media_type = mimetypes.guess_type(full_path)[0] or "text/plain"
+    cache_control = (
+        IMMUTABLE_CACHE if FINGERPRINT_RE.search(os.path.basename(full_path)) else REVALIDATE_CACHE
+    )
+
+    accepted = accepted_encodings(headers)
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.isfile(full_path + suffix):
+            return FileResponse(
+                full_path + suffix,
+                status_code=status_code,
+                media_type=media_type,
+                stat_result=os.stat(full_path + suffix),
+                headers={
+                    "Content-Encoding": encoding,
+                    "Vary": "Accept-Encoding",
+                    "Cache-Control": cache_control,
+                },
+            )
+
+    return FileResponse(
+        full_path,
+        status_code=status_code,
+        media_type=media_type,
+        stat_result=stat_result or os.stat(full_path),
+        headers={"Vary": "Accept-Encoding", "Cache-Control": cache_control},
+    )
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200) -> Response:
+        request_headers = Headers(scope=scope)
+        response = precompressed_response(
+            str(full_path), request_headers, status_code, stat_result
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def index_response(request_headers):
+    """Entry page: built (precompressed) version if available, source otherwise."""
+    built = os.path.join(DIST_DIR, "index.html")
+    if os.path.isfile(built):
+        return precompressed_response(built, request_headers)
+    return FileResponse("static/index.html", headers={"Cache-Control": REVALIDATE_CACHE})
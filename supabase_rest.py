@@ -0,0 +1,136 @@
+"""
+Streaming reads from Supabase (PostgREST) with keyset pagination.
+
+iter_rows() walks a table in pages ordered by a unique key column
+(order=<key>.asc & <key>=gt.<last key> & limit=<page size>): each page is an
+index range scan (no OFFSET), only the projected columns travel, and rows are
+yielded page by page, so callers can process millions of rows in constant memory.
+
+Writes are set-based: upsert() posts a batch of rows in one request,
+update_in()/delete_in() apply one filtered PATCH/DELETE to a chunk of keys and
+rpc() calls a SQL function (supabase_schema.sql).
+
+Uso:
+    db = SupabaseREST(SUPABASE_URL, SUPABASE_KEY)
+    for row in db.iter_rows("portfolios", "id,ticker,category"):
+        ...
+    db.update_in("portfolios", "id", [1, 2, 3], {"category": "FII"})
+"""
+import logging
+import os
+
+import requests
+
+from metrics import span
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_PAGE_SIZE = int(os.getenv("SUPABASE_PAGE_SIZE", "1000"))
+# Chaves por PATCH/DELETE filtrado (id=in.(...) vai na URL)
+SUPABASE_IN_CHUNK = int(os.getenv("SUPABASE_IN_CHUNK", "200"))
+
+
+def _in_filter(values):
+    return "in.(" + ",".join(str(v) for v in values) + ")"
+
+
+def chunks(items, size):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def rest_headers(key, prefer=None):
+    headers = {
+        "apikey": key,
+        "Authorization": f"Bearer {key}",
+        "Content-Type": "application/json",
+    }
+    if prefer:
+        headers["Prefer"] = prefer
+    return headers
+
+
+class SupabaseREST:
+    def __init__(self, url, key, session=None, page_size=SUPABASE_PAGE_SIZE):
+        self.base = f"{url.rstrip('/')}/rest/v1"
+        self.key = key
+        self.session = session or requests.Session()
+        self.page_size = page_size
+
+    def iter_pages(self, table, select, filters=None, key="id"):
+        """Yields lists of rows (one per page). `key` must be unique and sortable."""
+        columns = select.split(",")
+        if select != "*" and key not in columns:
+            select = ",".join(columns + [key])
+        last = None
+        pages = 0
+        while True:
+            params = {"select": select, "order": f"{key}.asc", "limit": self.page_size}
+            params.update(filters or {})
+            if last is not None:
+                params[key] = f"gt.{last}"
+            with span("supabase", table=table, method="GET"):
+                resp = self.session.get(
+                    f"{self.base}/{table}", headers=rest_headers(self.key), params=params, timeout=30
+                )
+            resp.raise_for_status()
+            page = resp.json()
+            pages += 1
+            if page:
+                yield page
+            if len(page) < self.page_size:
+                logger.debug("supabase scan table=%s pages=%s", table, pages)
+                return
+            last = page[-1][key]
+
+    def iter_rows(self, table, select, filters=None, key="id"):
+        for page in self.iter_pages(table, select, filters, key):
+            yield from page
+
+    def latest(self, table, select, filters=None, key="id"):
+        """Row with the highest `key` matching `filters` (order=key.desc, limit=1), or None."""
+        params = {"select": select, "order": f"{key}.desc", "limit": 1}
+        params.update(filters or {})
+        with span("supabase", table=table, method="GET"):
+            resp = self.session.get(
+                f"{self.base}/{table}", headers=rest_headers(self.key), params=params, timeout=30
+            )
+        resp.raise_for_status()
+        rows = resp.json()
+        return rows[0] if rows else None
+
+    # --- Escritas em lote ---
+    def _send(self, method, table, params=None, json_body=None, prefer="return=minimal"):
+        with span("supabase", table=table, method=method):
+            resp = self.session.request(
+                method, f"{self.base}/{table}", headers=rest_headers(self.key, prefer),
+                params=params, json=json_body, timeout=60,
+            )
+        resp.raise_for_status()
+        return resp
+
+    def upsert(self, table, rows, on_conflict=None):
+        """Inserts or merges a batch of rows in one request (by primary key or `on_conflict`)."""
+        if not rows:
+            return
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        self._send("POST", table, params, rows, prefer="resolution=merge-duplicates,return=minimal")
+
+    def update_in(self, table, column, values, patch, chunk=SUPABASE_IN_CHUNK):
+        """PATCH rows whose `column` is in `values`, one request per chunk."""
+        for part in chunks(values, chunk):
+            self._send("PATCH", table, {column: _in_filter(part)}, patch)
+
+    def delete_in(self, table, column, values, chunk=SUPABASE_IN_CHUNK):
+        for part in chunks(values, chunk):
+            self._send("DELETE", table, {column: _in_filter(part)})
+
+    def delete_where(self, table, filters):
+        """One filtered DELETE (PostgREST refuses it without filters)."""
+        if not filters:
+            raise ValueError("delete_where needs at least one filter")
+        self._send("DELETE", table, filters)
+
+    def rpc(self, function, args=None):
+        return self._send("POST", f"rpc/{function}", json_body=args or {}, prefer=None).json()
@@ -13,8 +13,8 @@ CREATE TABLE IF NOT EXISTS assets_master (
     ticker TEXT PRIMARY KEY, -- PETR4, AAPL, IVVB11
     name TEXT NOT NULL,
     type TEXT NOT NULL CHECK (type IN ('stock_br', 'stock_us', 'reit', 'fii', 'etf_br', 'etf_us', 'crypto', 'bond')),
-    currency TEXT NOT NULL CHECK (currency IN ('BRL', 'USD')),
-    exchange TEXT NOT NULL CHECK (exchange IN ('B3', 'NYSE', 'NASDAQ', 'CRYPTO')),
+    currency TEXT NOT NULL CHECK (currency IN ('BRL', 'USD', 'EUR', 'GBP', 'GBp', 'GBX', 'CHF', 'JPY', 'CAD', 'AUD', 'HKD', 'USDT', 'USDC', 'DAI')), -- moeda da cotação (currency.py)
+    exchange TEXT NOT NULL CHECK (exchange IN ('B3', 'NYSE', 'NASDAQ', 'AMEX', 'CRYPTO', 'LSE', 'XETRA', 'EURONEXT', 'SIX', 'TSX', 'TSE', 'HKEX', 'ASX')),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT timezone('utc'::text, now()) NOT NULL
 );
 
@@ -50,4 +50,145 @@ CREATE POLICY "Users Manage Own Transactions" ON transactions
 
 -- Indexes for Performance
 CREATE INDEX idx_assets_type ON assets_master(type);
+-- Chave do upsert em lote de institutions (load_instruments.py, on_conflict=code)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_institutions_code ON institutions(code);
 CREATE INDEX idx_transactions_user_date ON transactions(user_id, date);
+
+-- ---------------------------------------------------------------------------
+-- Manutenção em lote (maintenance.py --rpc)
+-- Operam sobre a tabela portfolios (id, user_id, ticker, quantity, average_price, category)
+-- ---------------------------------------------------------------------------
+
+-- Consolida posições duplicadas (mesmo usuário + ticker) em um único statement:
+-- mantém o menor id com quantidade somada, preço médio ponderado e a última
+-- categoria diferente do default ('Ação'); remove as demais linhas.
+CREATE OR REPLACE FUNCTION consolidate_portfolios(p_user_id UUID DEFAULT NULL)
+RETURNS TABLE (user_id UUID, ticker TEXT, merged INT)
+LANGUAGE plpgsql AS $$
+#variable_conflict use_column
+BEGIN
+    RETURN QUERY
+    WITH grouped AS (
+        SELECT
+            p.user_id,
+            p.ticker,
+            MIN(p.id) AS keep_id,
+            COUNT(*)::INT AS n,
+            SUM(p.quantity) AS qty,
+            CASE WHEN SUM(p.quantity) > 0
+                 THEN SUM(p.quantity * COALESCE(p.average_price, 0)) / SUM(p.quantity)
+                 ELSE 0 END AS avg_price,
+            COALESCE(
+                (ARRAY_AGG(p.category ORDER BY p.id DESC)
+                    FILTER (WHERE p.category IS NOT NULL AND p.category <> 'Ação'))[1],
+                (ARRAY_AGG(p.category ORDER BY p.id))[1]
+            ) AS category
+        FROM portfolios p
+        WHERE p_user_id IS NULL OR p.user_id = p_user_id
+        GROUP BY p.user_id, p.ticker
+        HAVING COUNT(*) > 1
+    ),
+    updated AS (
+        UPDATE portfolios t
+        SET quantity = g.qty, average_price = g.avg_price, category = g.category
+        FROM grouped g
+        WHERE t.id = g.keep_id
+        RETURNING t.id
+    ),
+    deleted AS (
+        DELETE FROM portfolios t
+        USING grouped g
+        WHERE t.user_id = g.user_id AND t.ticker = g.ticker AND t.id <> g.keep_id
+        RETURNING t.id
+    )
+    SELECT g.user_id, g.ticker, g.n FROM grouped g;
+END;
+$$;
+
+-- Corrige categorias que ficaram no default: tipo do assets_master ou Renda Fixa
+-- (SELIC, CDB, Tesouro...) para tickers fora do master. Retorna as linhas alteradas.
+CREATE OR REPLACE FUNCTION fix_portfolio_categories(p_user_id UUID DEFAULT NULL)
+RETURNS INT
+LANGUAGE plpgsql AS $$
+DECLARE
+    from_master INT;
+    fixed_income INT;
+BEGIN
+    UPDATE portfolios p
+    SET category = m.category
+    FROM (
+        SELECT ticker, CASE type
+            WHEN 'stock_br' THEN 'Ação'
+            WHEN 'stock_us' THEN 'Stocks'
+            WHEN 'reit' THEN 'REITs'
+            WHEN 'fii' THEN 'FII'
+            WHEN 'etf_br' THEN 'ETF'
+            WHEN 'etf_us' THEN 'ETF'
+            WHEN 'crypto' THEN 'Cripto'
+            WHEN 'bond' THEN 'Renda Fixa'
+        END AS category
+        FROM assets_master
+    ) m
+    WHERE m.ticker = UPPER(TRIM(p.ticker))
+      AND (p_user_id IS NULL OR p.user_id = p_user_id)
+      AND (p.category IS NULL OR p.category IN ('', 'Ação'))
+      AND p.category IS DISTINCT FROM m.category;
+    GET DIAGNOSTICS from_master = ROW_COUNT;
+
+    UPDATE portfolios p
+    SET category = 'Renda Fixa'
+    WHERE NOT EXISTS (SELECT 1 FROM assets_master m WHERE m.ticker = UPPER(TRIM(p.ticker)))
+      AND (p_user_id IS NULL OR p.user_id = p_user_id)
+      AND (p.category IS NULL OR p.category IN ('', 'Ação'))
+      AND UPPER(p.ticker) ~ '(SELIC|CDI|TESOURO|POUPAN|LCI|LCA|CDB)';
+    GET DIAGNOSTICS fixed_income = ROW_COUNT;
+
+    RETURN from_master + fixed_income;
+END;
+$$;
+
+-- ---------------------------------------------------------------------------
+-- Histórico diário da carteira (portfolio_history.py)
+-- Escrito pelo job diário depois do fechamento; /history lê portfolio_daily
+-- por faixa de datas (PK user_id, date)
+-- ---------------------------------------------------------------------------
+CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+    user_id UUID NOT NULL,
+    date DATE NOT NULL,
+    ticker TEXT NOT NULL,
+    category TEXT,
+    quantity NUMERIC NOT NULL,
+    price NUMERIC, -- moeda original
+    price_brl NUMERIC,
+    value_brl NUMERIC NOT NULL,
+    cost_brl NUMERIC NOT NULL,
+    PRIMARY KEY (user_id, date, ticker)
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_daily (
+    user_id UUID NOT NULL,
+    date DATE NOT NULL,
+    value_brl NUMERIC NOT NULL,
+    cost_brl NUMERIC NOT NULL,
+    flow_brl NUMERIC NOT NULL DEFAULT 0, -- aportes (+) / resgates (-) desde o snapshot anterior
+    twr_index NUMERIC NOT NULL, -- retorno ponderado no tempo, base 100
+    positions INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, date)
+);
+
+ALTER TABLE portfolio_snapshots ENABLE ROW LEVEL SECURITY;
+ALTER TABLE portfolio_daily ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Users Read Own Snapshots" ON portfolio_snapshots FOR SELECT USING (auth.uid() = user_id);
+CREATE POLICY "Users Read Own Daily" ON portfolio_daily FOR SELECT USING (auth.uid() = user_id);
+
+-- ---------------------------------------------------------------------------
+-- Migração: moedas/bolsas além de BRL/USD (câmbio por ativo, currency.py)
+-- Bancos criados com o CHECK antigo (só BRL/USD e B3/NYSE/NASDAQ/CRYPTO).
+-- Idempotente. Manter em sincronia com CURRENCIES/EXCHANGES do load_instruments.py
+-- ---------------------------------------------------------------------------
+ALTER TABLE assets_master DROP CONSTRAINT IF EXISTS assets_master_currency_check;
+ALTER TABLE assets_master ADD CONSTRAINT assets_master_currency_check
+    CHECK (currency IN ('BRL', 'USD', 'EUR', 'GBP', 'GBp', 'GBX', 'CHF', 'JPY', 'CAD', 'AUD', 'HKD', 'USDT', 'USDC', 'DAI'));
+ALTER TABLE assets_master DROP CONSTRAINT IF EXISTS assets_master_exchange_check;
+ALTER TABLE assets_master ADD CONSTRAINT assets_master_exchange_check
+    CHECK (exchange IN ('B3', 'NYSE', 'NASDAQ', 'AMEX', 'CRYPTO', 'LSE', 'XETRA', 'EURONEXT', 'SIX', 'TSX', 'TSE', 'HKEX', 'ASX'));
@@ -0,0 +1,103 @@
+import asyncio
+import unittest
+
+from ai_analysis import UNAVAILABLE_MSG, AnalysisCache, Analyst, ModelRouter, allocation_key
+from portfolio import Portfolio
+from ticker_resolver import TickerResolver
+
+ROWS = [
+    {"id": 1, "ticker": "PETR4", "quantity": 100, "average_price": 30.0, "category": "Ação"},
+    {"id": 2, "ticker": "HGLG11", "quantity": 10, "average_price": 160.0, "category": "FII"},
+]
+
+
+def make_portfolio(rows=ROWS, petr=33.0):
+    return Portfolio(rows, TickerResolver(lambda: []), {"PETR4": petr, "HGLG11": 165.0}, {}, usd_rate=5.0)
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Local stand-in for genai.GenerativeModel (async streaming)."""
+
+    def __init__(self, chunks=("<div>", "ok", "</div>"), fail=False, delay=0.0):
+        self.chunks = chunks
+        self.fail = fail
+        self.delay = delay
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("429 quota exceeded")
+
+        async def gen():
+            for c in self.chunks:
+                await asyncio.sleep(self.delay)
+                yield _Chunk(c)
+
+        return gen()
+
+
+def collect(analyst, portfolio):
+    async def run():
+        return [c async for c in analyst.stream(portfolio)]
+
+    return asyncio.run(run())
+
+
+class TestAnalyst(unittest.TestCase):
+    def test_streams_and_caches_by_allocation(self):
+        model = FakeModel()
+        analyst = Analyst(ModelRouter(["m1"], lambda name: model), AnalysisCache())
+
+        self.assertEqual(collect(analyst, make_portfolio()), ["<div>", "ok", "</div>"])
+        # Só o preço mudou: mesma alocação, nenhuma chamada nova
+        self.assertEqual(asyncio.run(analyst.analyze(make_portfolio(petr=33.5))), "<div>ok</div>")
+        self.assertEqual(model.calls, 1)
+
+        # Nova posição: outra chave
+        rows = ROWS + [{"id": 3, "ticker": "VALE3", "quantity": 5, "average_price": 60.0, "category": "Ação"}]
+        collect(analyst, make_portfolio(rows))
+        self.assertEqual(model.calls, 2)
+
+    def test_extra_context_only_computed_on_miss(self):
+        analyst = Analyst(ModelRouter(["m1"], lambda name: FakeModel()), AnalysisCache())
+        calls = []
+
+        def extra():
+            calls.append(1)
+            return "risco"
+
+        asyncio.run(analyst.analyze(make_portfolio(), extra))
+        asyncio.run(analyst.analyze(make_portfolio(petr=33.5), extra))
+        self.assertEqual(len(calls), 1)  # hit no cache não recalcula o risco
+
+    def test_allocation_key_ignores_price_noise(self):
+        self.assertEqual(allocation_key(make_portfolio()), allocation_key(make_portfolio(petr=33.2)))
+        self.assertNotEqual(allocation_key(make_portfolio()), allocation_key(make_portfolio(petr=80.0)))
+
+    def test_failing_model_is_demoted(self):
+        models = {"pro": FakeModel(fail=True), "flash": FakeModel(chunks=("flash",))}
+        router = ModelRouter(["pro", "flash"], lambda name: models[name])
+
+        self.assertEqual(collect(Analyst(router), make_portfolio()), ["flash"])
+        self.assertEqual(router.stats["pro"].errors, 1)
+        # Próximo request vai direto no modelo saudável
+        self.assertEqual(router.order(), ["flash", "pro"])
+        collect(Analyst(router), make_portfolio(petr=90.0))
+        self.assertEqual(models["pro"].calls, 1)
+
+    def test_all_models_down(self):
+        router = ModelRouter(["a", "b"], lambda name: FakeModel(fail=True))
+        analyst = Analyst(router)
+        self.assertEqual(collect(analyst, make_portfolio()), [UNAVAILABLE_MSG])
+        # Falha não é cacheada
+        self.assertIsNone(analyst.cache._entries.get(allocation_key(make_portfolio())))
+
+
+if __name__ == "__main__":
+    unittest.main()
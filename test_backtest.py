@@ -0,0 +1,68 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from backtest import parse_scenario, rebalance_flags, run_many, simulate
+
+
+def _loop(prices, w, flags, fee_pct=0.0):
+    """Day-by-day reference: hold quantities, rebalance to w on flagged days."""
+    value = 1.0
+    qty = value * w / prices[0]
+    out = [value]
+    for t in range(1, len(prices)):
+        value = float(qty @ prices[t])
+        if flags[t]:
+            drifted = qty * prices[t] / value
+            value *= 1 - fee_pct * np.abs(drifted - w).sum()
+            qty = value * w / prices[t]
+        out.append(value)
+    return np.array(out)
+
+
+class TestBacktest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.dates = pd.bdate_range("2020-01-01", periods=400)
+        self.prices = 20 * np.cumprod(1 + rng.normal(0.0005, 0.02, (400, 3)), axis=0)
+        self.w = np.array([0.5, 0.3, 0.2])
+
+    def test_flags(self):
+        flags = rebalance_flags(self.dates, "quarterly")
+        self.assertTrue(flags[0])
+        self.assertEqual([d.strftime("%Y-%m-%d") for d in self.dates[flags][1:3]], ["2020-04-01", "2020-07-01"])
+        self.assertEqual(rebalance_flags(self.dates, "none").sum(), 1)
+
+    def test_matches_reference_loop(self):
+        for freq in ("none", "monthly", "yearly"):
+            r = simulate(self.prices, self.w, self.dates, freq, fee_pct=0.001, initial=1.0)
+            expected = _loop(self.prices, self.w, rebalance_flags(self.dates, freq), 0.001)
+            np.testing.assert_allclose(r["equity"], expected, rtol=1e-10)
+
+        # Um ativo, sem rebalanceamento: curva = preço normalizado
+        r = simulate(self.prices[:, :1], [1.0], self.dates, "none", initial=100.0)
+        np.testing.assert_allclose(r["equity"], self.prices[:, 0] / self.prices[0, 0] * 100)
+        self.assertAlmostEqual(
+            r["stats"]["max_drawdown"] / 100,
+            (self.prices[:, 0] / np.maximum.accumulate(self.prices[:, 0]) - 1).min(), places=5,
+        )
+
+    def test_run_many_and_parse(self):
+        scenarios = [{"weights": self.w, "rebalance": f} for f in ("none", "monthly")]
+        results = run_many(self.prices, self.dates, scenarios, workers=1)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["stats"]["rebalances"], 0)
+
+        s = parse_scenario({"rebalance": "yearly"}, {"weights": {"petr4": 3, "CDI": 1}})
+        self.assertEqual(s["weights"], {"PETR4": 0.75, "CDI": 0.25})
+        with self.assertRaises(ValueError):
+            parse_scenario({"weights": {"PETR4": 1}, "rebalance": "weekly"}, {})
+        for bad in ({"initial": 0}, {"initial": -100}, {"initial": "nan"}, {"fee_pct": 1},
+                    {"fee_pct": -0.001}, {"fee_pct": "inf"}, {"weights": {"PETR4": "nan"}}):
+            with self.assertRaises(ValueError, msg=bad):
+                parse_scenario(bad, {"weights": {"PETR4": 1}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from currency import CurrencyEngine, daily_rates, normalize, pair_symbols
+from load_instruments import normalize_asset
+from portfolio import Portfolio
+from ticker_resolver import TickerResolver
+
+MASTER = [
+    {"ticker": "PETR4", "type": "stock_br", "currency": "BRL", "exchange": "B3"},
+    {"ticker": "VOO", "type": "etf_us", "currency": "USD", "exchange": "NYSE"},
+    {"ticker": "VWCE.DE", "type": "etf_us", "currency": "EUR", "exchange": "XETRA"},
+    {"ticker": "VUSA.L", "type": "etf_us", "currency": "GBp", "exchange": "LSE"},
+    {"ticker": "BTC-USDT", "type": "crypto", "currency": "USDT", "exchange": "CRYPTO"},
+    {"ticker": "7203.T", "type": "stock_us", "currency": "JPY", "exchange": "TSE"},
+]
+
+
+class FakeYahoo:
+    def __init__(self, rates):
+        self.rates = rates
+        self.batches = []
+
+    def fetch_many(self, op, symbols, max_age=None):
+        self.batches.append(sorted(symbols))
+        return {s: (self.rates[s], self.rates[s]) for s in symbols if s in self.rates}, set()
+
+
+class TestCurrency(unittest.TestCase):
+    def setUp(self):
+        self.yahoo = FakeYahoo({"USDBRL=X": 5.0, "EURBRL=X": 6.0, "GBPBRL=X": 7.0})
+        self.fx = CurrencyEngine(self.yahoo, ttl_s=300)
+
+    def test_aliases(self):
+        self.assertEqual(normalize("USDT"), ("USD", 1.0))
+        self.assertEqual(normalize("GBp"), ("GBP", 0.01))
+        self.assertEqual(normalize("gbp"), ("GBP", 1.0))
+        self.assertEqual(pair_symbols(["BRL", "USD", "USDC", "EUR", None]), ["EURBRL=X", "USDBRL=X"])
+
+    def test_one_batch_and_ttl(self):
+        codes = ["BRL", "USD", "USDT", "EUR", "GBp"]
+        self.assertEqual(self.fx.refresh(codes), set())
+        self.assertEqual(self.yahoo.batches, [["EURBRL=X", "GBPBRL=X", "USDBRL=X"]])
+        # Dentro do TTL: nada a buscar
+        self.assertEqual(self.fx.due(codes), set())
+        self.fx.refresh(codes)
+        self.assertEqual(len(self.yahoo.batches), 1)
+        # Par stale continua vencido
+        self.fx.update({"EURBRL=X": (6.5, 6.0)}, stale={"EURBRL=X"})
+        self.assertEqual(self.fx.rate("EUR"), 6.5)
+        self.assertEqual(self.fx.due(codes, now=0), set())
+        self.fx.fetched_at.pop("EUR")
+        self.assertEqual(self.fx.due(codes), {"EURBRL=X"})
+
+        np.testing.assert_allclose(self.fx.factors(codes), [1.0, 5.0, 5.0, 6.5, 0.07])
+
+    def test_portfolio_per_currency(self):
+        self.fx.refresh(["USD", "EUR", "GBp", "JPY"])
+        resolver = TickerResolver(lambda: MASTER)
+        rows = [{"ticker": t, "quantity": 10, "average_price": 100.0} for t in
+                ("PETR4", "VOO", "VWCE.DE", "VUSA.L", "BTC-USDT", "7203.T")]
+        p = Portfolio(rows, resolver, {r["ticker"]: 100.0 for r in rows}, {}, stale=(), fx=self.fx)
+        np.testing.assert_allclose(p.value_brl, [1000.0, 5000.0, 6000.0, 70.0, 5000.0, 1000.0])
+        # JPY sem cotação: valor sem conversão, sinalizado como stale
+        self.assertEqual(p.stale, {"7203.T"})
+        records = {r["ticker"]: r for r in p.to_records()}
+        self.assertEqual((records["VWCE.DE"]["currency"], records["VWCE.DE"]["fx_rate"]), ("EUR", 6.0))
+
+    def test_eur_position_end_to_end(self):
+        # Lista da XETRA -> assets_master -> resolver -> cotação + câmbio num lote só -> BRL
+        master = [normalize_asset({"ticker": "VWCE", "name": "Vanguard FTSE All-World", "type": "etf_us"}, "XETRA")]
+        self.assertEqual(master[0]["currency"], "EUR")
+        resolver = TickerResolver(lambda: master)
+        inst = resolver.resolve("VWCE")
+        self.assertEqual((inst.yahoo, inst.currency, inst.category), ("VWCE.DE", "EUR", "ETF"))
+
+        yahoo = FakeYahoo({"VWCE.DE": 120.0, "EURBRL=X": 6.0})
+        fx = CurrencyEngine(yahoo)
+        quotes, stale = yahoo.fetch_many("quote", {inst.yahoo} | fx.due({inst.currency}))
+        fx.update(quotes, stale)
+        self.assertEqual(yahoo.batches, [["EURBRL=X", "VWCE.DE"]])
+
+        rows = [{"ticker": "VWCE", "quantity": 10, "average_price": 100.0, "category": "ETF"}]
+        p = Portfolio(rows, resolver, {"VWCE": quotes[inst.yahoo][0]}, {}, fx=fx)
+        self.assertEqual(p.total_value, 10 * 120.0 * 6.0)
+        self.assertEqual(p.stale, set())
+        self.assertAlmostEqual(p.to_records()[0]["profit_percent"], 20.0)
+
+    def test_daily_rates(self):
+        frame = pd.DataFrame({"USDBRL=X": [5.0, np.nan, 5.2], "GBPBRL=X": [7.0, 7.1, 7.2]})
+        rates = daily_rates(frame, ["BRL", "USD", "GBp", "EUR"])
+        np.testing.assert_allclose(rates[:, 0], 1.0)
+        np.testing.assert_allclose(rates[:, 1], [5.0, 5.0, 5.2])
+        np.testing.assert_allclose(rates[:, 2], [0.07, 0.071, 0.072])
+        np.testing.assert_allclose(rates[:, 3], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import time
+import unittest
+
+import deadline
+
+
+class TestDeadline(unittest.TestCase):
+    def test_fetch_all_returns_partial_results_at_deadline(self):
+        jobs = {
+            "fast": lambda: 1.0,
+            "slow": lambda: time.sleep(1.0) or 2.0,
+            "broken": lambda: 1 / 0,
+        }
+        start = time.monotonic()
+        results, pending = deadline.fetch_all(jobs, deadline.Deadline(0.2))
+        elapsed = time.monotonic() - start
+
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual(results, {"fast": 1.0})
+        self.assertEqual(pending, {"slow"})
+
+    def test_current_deadline_is_request_scoped(self):
+        d = deadline.start(0.5)
+        self.assertIs(deadline.current(), d)
+        self.assertLessEqual(d.remaining(), 0.5)
+        self.assertGreaterEqual(deadline.upstream_timeout(floor=1.0), 1.0)
+
+    def test_parse_budget_header(self):
+        self.assertEqual(deadline.parse_budget("500"), 0.5)
+        # Cliente só pode apertar o prazo, nunca desligar o teto
+        self.assertEqual(deadline.parse_budget("600000"), deadline.REQUEST_BUDGET_S)
+        for bad in (None, "", "abc", "nan", "inf", "-1", "0"):
+            self.assertIsNone(deadline.parse_budget(bad), bad)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+import datetime as dt
+import time
+import types
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+import deadline
+import dividend_forecast
+from dividend_forecast import ANNOUNCED, PAID, PROJECTED, DividendForecast
+from market_client import YahooClient
+
+
+class FakeYahoo:
+    """fetch_many over fixed per-symbol dividends/calendars, counting calls."""
+
+    def __init__(self, dividends, calendars=None):
+        self.dividends = dividends
+        self.calendars = calendars or {}
+        self.calls = 0
+
+    def fetch_many(self, op, symbols, max_age=None):
+        self.calls += len(symbols)
+        source = self.dividends if op == "dividends" else self.calendars
+        return {s: source[s] for s in symbols if s in source}, set()
+
+
+def make_yf(dividends):
+    """Fake yfinance module for a real YahooClient (each Ticker call takes a little time)."""
+
+    def ticker(symbol):
+        time.sleep(0.01)
+        return types.SimpleNamespace(dividends=dividends[symbol], calendar={})
+
+    return types.SimpleNamespace(Ticker=ticker)
+
+
+def _divs(dates, amounts, tz="America/Sao_Paulo"):
+    return pd.Series(amounts, index=pd.DatetimeIndex(pd.to_datetime(dates)).tz_localize(tz))
+
+
+class TestDividendForecast(unittest.TestCase):
+    def setUp(self):
+        today = pd.Timestamp(dt.date.today())
+        self.today = today
+        months_ago = [today - pd.DateOffset(months=m) for m in (14, 11, 8, 5, 2)]
+        self.yahoo = FakeYahoo(
+            {
+                # Trimestral: 4 pagamentos nos últimos 12m, 1 mais antigo
+                "PETR4.SA": _divs(months_ago, [0.5, 1.0, 1.1, 1.2, 1.3]),
+                # Anúncio com valor já no .dividends
+                "VALE3.SA": _divs([today - pd.DateOffset(months=6), today + pd.Timedelta(days=10)], [2.0, 2.5]),
+                "BTC-USD": pd.Series(dtype=float),
+            },
+            # Ex-date anunciada sem valor, no mês de um projetado de PETR4
+            {"PETR4.SA": {"Ex-Dividend Date": (months_ago[1] + pd.DateOffset(years=1)).date()}},
+        )
+
+    def test_projection_and_announced(self):
+        forecast = DividendForecast(self.yahoo)
+        forecast.refresh({"PETR4.SA", "VALE3.SA", "BTC-USD"})
+        events = forecast.events(["PETR4.SA"])
+
+        paid = events[events["status"] == PAID]
+        self.assertEqual(sorted(paid["amount"]), [1.0, 1.1, 1.2, 1.3])
+        future = events[events["status"] != PAID]
+        self.assertEqual(len(future), 4)
+        self.assertTrue((future["date"] > self.today).all())
+        self.assertTrue((future["date"] <= self.today + pd.DateOffset(years=1)).all())
+        # Anunciado pelo calendar substitui o projetado do mês, com o valor dele
+        announced = future[future["status"] == ANNOUNCED]
+        self.assertEqual(announced["amount"].tolist(), [1.0])
+        self.assertEqual(sorted(future.loc[future["status"] == PROJECTED, "amount"]), [1.1, 1.2, 1.3])
+
+        vale = forecast.events(["VALE3.SA"])
+        self.assertEqual(vale.loc[vale["status"] == ANNOUNCED, "amount"].tolist(), [2.5])
+        self.assertEqual(vale.loc[vale["status"] == PROJECTED, "amount"].tolist(), [2.0])
+        self.assertTrue(forecast.events(["BTC-USD"]).empty)
+
+    def test_served_from_store_once_a_day(self):
+        forecast = DividendForecast(self.yahoo)
+        forecast.refresh({"PETR4.SA", "BTC-USD"})
+        calls = self.yahoo.calls
+        forecast.refresh({"PETR4.SA", "BTC-USD"})
+        self.assertEqual(self.yahoo.calls, calls)
+        # Símbolo novo: só ele é buscado
+        forecast.refresh({"PETR4.SA", "VALE3.SA"})
+        self.assertEqual(self.yahoo.calls, calls + 2)
+
+    def test_construction_does_not_load_pandas(self):
+        with mock.patch.object(type(dividend_forecast.pd), "_lazy_load", side_effect=AssertionError("pandas loaded")):
+            forecast = DividendForecast(self.yahoo)
+            forecast.clear()
+        self.assertIsNone(forecast.table)
+        self.assertTrue(forecast.events(["PETR4.SA"]).empty)
+
+    def test_request_only_queues_unloaded_symbols(self):
+        forecast = DividendForecast(self.yahoo)
+        forecast.refresh({"PETR4.SA"})
+        calls = self.yahoo.calls
+        # Ontem carregado continua servido; só o nunca visto fica pendente
+        forecast.fetched_on["PETR4.SA"] = dt.date.today() - dt.timedelta(days=1)
+        self.assertEqual(forecast.request(["PETR4.SA", "VALE3.SA"]), {"VALE3.SA"})
+        self.assertEqual(forecast.outdated(["PETR4.SA", "VALE3.SA"]), {"PETR4.SA"})  # disjunto de pending
+        self.assertEqual(self.yahoo.calls, calls)
+        self.assertTrue(forecast._wake.is_set())
+        forecast._wake.clear()
+        forecast.request(["VALE3.SA"])
+        self.assertFalse(forecast._wake.is_set())  # já na fila: não acorda o loop de novo
+
+        # Loop em background busca os pendentes
+        forecast.start(lambda: set())
+        forecast._wake.set()
+        for _ in range(250):
+            # fetched_on é gravado antes do rebuild: espera os eventos
+            if not forecast.events(["VALE3.SA"]).empty:
+                break
+            forecast._stop.wait(0.02)
+        forecast.stop()
+        self.assertEqual(forecast.request(["VALE3.SA"]), set())
+        self.assertFalse(forecast.events(["VALE3.SA"]).empty)
+
+    def test_loop_starts_a_deadline_per_pass(self):
+        # YahooClient real + deadline real: um prazo vencido devolveria tudo como stale
+        dividends = {s: self.yahoo.dividends[s] for s in ("PETR4.SA", "VALE3.SA")}
+        forecast = DividendForecast(YahooClient(lambda: make_yf(dividends)), calendar=False)
+
+        def loaded(symbol):
+            forecast._wake.set()
+            for _ in range(100):
+                if not forecast.events([symbol]).empty:
+                    return True
+                forecast._stop.wait(0.02)
+            return False
+
+        with mock.patch.object(deadline, "REQUEST_BUDGET_S", 0.2):
+            forecast.start(lambda: set())
+            try:
+                forecast.request(["PETR4.SA"])
+                self.assertTrue(loaded("PETR4.SA"))
+                time.sleep(0.3)  # mais que um prazo de request
+                forecast.request(["VALE3.SA"])
+                self.assertTrue(loaded("VALE3.SA"))
+            finally:
+                forecast.stop()
+        self.assertEqual(forecast.request(["PETR4.SA", "VALE3.SA"]), set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from jobs import DONE, FAILED, RUNNING, JobQueue
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "jobs.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_identical_jobs_are_coalesced(self):
+        queue = JobQueue(self.path, workers=2)
+        release = threading.Event()
+        calls = []
+
+        def slow(user_id):
+            calls.append(user_id)
+            release.wait(5)
+            return {"user": user_id, "value": 1.5}
+
+        queue.register("history", slow)
+        first = queue.submit("history", "u1", "abc")
+        second = queue.submit("history", "u1", "abc")
+        other = queue.submit("history", "u1", "changed")
+        self.assertFalse(first["coalesced"])
+        self.assertTrue(second["coalesced"])
+        self.assertEqual(first["id"], second["id"])
+        self.assertNotEqual(first["id"], other["id"])
+
+        release.set()
+        done = queue.wait(first["id"], timeout=5)
+        self.assertEqual(done["status"], DONE)
+        self.assertEqual(done["result"], {"user": "u1", "value": 1.5})
+
+        # Resultado recente também é reaproveitado
+        again = queue.submit("history", "u1", "abc")
+        self.assertEqual(again["id"], first["id"])
+        queue.wait(other["id"], timeout=5)
+        self.assertEqual(len(calls), 2)
+
+    def test_failure_is_recorded_and_not_reused(self):
+        queue = JobQueue(self.path, workers=1)
+        queue.register("analyze", lambda user_id: 1 / 0)
+        job = queue.wait(queue.submit("analyze", "u1", "h")["id"], timeout=5)
+        self.assertEqual(job["status"], FAILED)
+        self.assertIn("division", job["error"])
+        self.assertNotEqual(queue.submit("analyze", "u1", "h")["id"], job["id"])
+
+    def test_state_is_persisted(self):
+        queue = JobQueue(self.path, workers=1)
+        release = threading.Event()
+        queue.register("dividends", lambda user_id: release.wait(5) and {"ok": True})
+        stuck = queue.submit("dividends", "u1", "h")
+
+        # Outro worker abrindo o mesmo banco: o job do irmão vivo continua
+        sibling = JobQueue(self.path, workers=1)
+        self.assertIsNone(sibling.get(stuck["id"])["error"])
+
+        # Lease vencido (worker morreu): aí sim é marcado como interrompido
+        db = sqlite3.connect(self.path)
+        db.execute("UPDATE jobs SET lease_at = 0 WHERE id = ?", (stuck["id"],))
+        db.commit()
+        db.close()
+        reopened = JobQueue(self.path, workers=1)
+        self.assertEqual(reopened.get(stuck["id"])["error"], "interrupted")
+        release.set()
+
+    def test_wait_async(self):
+        queue = JobQueue(self.path, workers=1)
+        release = threading.Event()
+        queue.register("history", lambda user_id: release.wait(5) and {"ok": True})
+        job = queue.submit("history", "u1", "h")
+
+        async def scenario():
+            pending = await queue.wait_async(job["id"], timeout=0.05)
+            self.assertIn(pending["status"], (RUNNING, "queued"))
+            threading.Timer(0.1, release.set).start()
+            return await queue.wait_async(job["id"], timeout=5)
+
+        done = asyncio.run(scenario())
+        self.assertEqual((done["status"], done["result"]), (DONE, {"ok": True}))
+        self.assertEqual(queue._waiters, {})
+        self.assertIsNone(asyncio.run(queue.wait_async("missing", timeout=1)))
+
+
+if __name__ == "__main__":
+    unittest.main()
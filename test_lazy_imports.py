@@ -0,0 +1,50 @@
+import os
+import sys
+import tempfile
+import unittest
+
+import lazy_imports
+from lazy_imports import available, missing, optional, preload, report
+
+
+class TestLazyImports(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        with open(os.path.join(self.tmp.name, "heavy_fixture_mod.py"), "w") as f:
+            f.write("VALUE = 42\n")
+        sys.path.insert(0, self.tmp.name)
+        self.addCleanup(sys.path.remove, self.tmp.name)
+        self.addCleanup(sys.modules.pop, "heavy_fixture_mod", None)
+        self.addCleanup(lazy_imports._MODULES.pop, "heavy_fixture_mod", None)
+
+    def test_import_deferred_until_first_use(self):
+        loaded = []
+        mod = optional("heavy_fixture_mod", on_load=loaded.append)
+        self.assertNotIn("heavy_fixture_mod", sys.modules)
+        self.assertTrue(available(mod))
+        self.assertEqual(report()["modules"]["heavy_fixture_mod"]["state"], "deferred")
+
+        self.assertEqual(mod.VALUE, 42)
+        self.assertEqual(len(loaded), 1)
+        entry = report()["modules"]["heavy_fixture_mod"]
+        self.assertEqual((entry["state"], entry["by"]), ("loaded", "request"))
+        self.assertIsNotNone(entry["import_ms"])
+        self.assertIs(optional("heavy_fixture_mod"), mod)
+
+    def test_preload_and_missing(self):
+        preload("heavy_fixture_mod, nao_existe_mod")
+        self.addCleanup(lazy_imports._MODULES.pop, "nao_existe_mod", None)
+        modules = report()["modules"]
+        self.assertEqual(modules["heavy_fixture_mod"]["by"], "preload")
+        self.assertEqual(modules["nao_existe_mod"]["state"], "failed")
+        self.assertIn("preload", report()["marks"])
+
+        broken = optional("nao_existe_mod")
+        with self.assertRaises(ImportError):
+            broken.anything
+        self.assertEqual(len(missing({"x": broken, "ok": optional("heavy_fixture_mod")})), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
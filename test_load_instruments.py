@@ -0,0 +1,120 @@
+import csv
+import json
+import os
+import re
+import tempfile
+import threading
+import unittest
+
+import requests
+
+from load_instruments import CURRENCIES, EXCHANGES, load, normalize_asset
+
+
+class RecordingDB:
+    """Records upserts; fails the first call for each batch whose first ticker is in `fail_on`."""
+
+    def __init__(self, fail_on=()):
+        self.fail_on = set(fail_on)
+        self.upserts = []
+        self._lock = threading.Lock()
+
+    def upsert(self, table, rows, on_conflict=None):
+        if rows[0]["ticker"] in self.fail_on:
+            raise requests.ConnectionError("reset by peer")
+        with self._lock:
+            self.upserts.append((table, on_conflict, [r["ticker"] for r in rows]))
+
+
+def _write_csv(path, n):
+    with open(path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(["ticker", "name", "type"])
+        for i in range(n):
+            w.writerow([f"t{i:06d}", f"Empresa {i}", "fii" if i % 10 == 0 else ""])
+        w.writerow(["T000001", "duplicada", ""])
+        w.writerow(["", "sem ticker", ""])
+
+
+class TestLoadInstruments(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_normalize_defaults_from_exchange(self):
+        self.assertEqual(
+            normalize_asset({"symbol": " aapl ", "name": "Apple"}, "NASDAQ"),
+            {"ticker": "AAPL", "name": "Apple", "type": "stock_us", "currency": "USD", "exchange": "NASDAQ"},
+        )
+        self.assertEqual(normalize_asset({"ticker": "BTC"}, "CRYPTO")["type"], "crypto")
+        with self.assertRaises(ValueError):
+            normalize_asset({"ticker": "PETR4", "type": "option"}, "B3")
+        with self.assertRaises(ValueError):
+            normalize_asset({"ticker": "PETR4"}, "BOVESPA")
+        with self.assertRaises(ValueError):
+            normalize_asset({"ticker": "X", "currency": "XYZ"}, "NYSE")
+
+    def test_currencies_beyond_brl_usd(self):
+        self.assertEqual(normalize_asset({"ticker": "VWCE", "type": "etf_us"}, "XETRA")["currency"], "EUR")
+        # GBp (pence) mantém a caixa; gbp vira GBP
+        self.assertEqual(normalize_asset({"ticker": "VUSA"}, "LSE")["currency"], "GBp")
+        self.assertEqual(normalize_asset({"ticker": "VUSA", "currency": "gbp"}, "LSE")["currency"], "GBP")
+        self.assertEqual(normalize_asset({"ticker": "BTC-USDT", "currency": "usdt"}, "CRYPTO")["currency"], "USDT")
+
+    def test_domains_match_schema(self):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "supabase_schema.sql")
+        with open(path, encoding="utf-8") as f:
+            sql = f.read()
+        for column, domain in (("currency", CURRENCIES), ("exchange", EXCHANGES)):
+            checks = re.findall(rf"CHECK \({column} IN \(([^)]*)\)\)", sql)
+            self.assertEqual(len(checks), 2, column)  # CREATE TABLE + migração
+            for check in checks:
+                self.assertEqual(set(re.findall(r"'([^']+)'", check)), domain)
+
+    def test_csv_chunked_upserts(self):
+        path = os.path.join(self.tmp.name, "b3.csv")
+        _write_csv(path, 100_000)
+        db = RecordingDB()
+        stats = load(db, path, "assets", exchange="B3", batch_size=1000, workers=8)
+        self.assertEqual(stats["rows"], 100_000)
+        self.assertEqual(stats["batches"], 100)
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertEqual(stats["invalid"], 1)
+        self.assertEqual({(t, k) for t, k, _ in db.upserts}, {("assets_master", "ticker")})
+        self.assertEqual(sum(len(r) for _, _, r in db.upserts), 100_000)
+        self.assertFalse(os.path.exists(f"{path}.assets_master.ckpt.json"))
+
+    def test_resume_sends_only_missing_batches(self):
+        path = os.path.join(self.tmp.name, "nasdaq.jsonl")
+        with open(path, "w") as f:
+            for i in range(50):
+                f.write(json.dumps({"ticker": f"S{i:02d}", "name": f"Stock {i}"}) + "\n")
+        ckpt = os.path.join(self.tmp.name, "load.ckpt.json")
+
+        # Batch que começa em S20 falha em todas as tentativas
+        failing = RecordingDB(fail_on={"S20"})
+        stats = load(failing, path, "assets", "NASDAQ", batch_size=10, workers=4, checkpoint_path=ckpt)
+        self.assertEqual((stats["batches"], stats["failed"]), (4, 1))
+        self.assertTrue(os.path.exists(ckpt))
+
+        retry = RecordingDB()
+        stats = load(retry, path, "assets", "NASDAQ", batch_size=10, workers=4, checkpoint_path=ckpt)
+        self.assertEqual((stats["batches"], stats["skipped"], stats["failed"]), (1, 4, 0))
+        self.assertEqual(retry.upserts[0][2][0], "S20")
+        self.assertFalse(os.path.exists(ckpt))
+
+    def test_institutions_by_code(self):
+        calls = []
+
+        class DB:
+            def upsert(self, table, rows, on_conflict=None):
+                calls.append((table, on_conflict, rows))
+
+        rows = [{"name": "XP Investimentos", "code": "102", "country": "BR"}, {"name": "Sem código"}]
+        stats = load(DB(), None, "institutions", rows=rows)
+        self.assertEqual(stats["rows"], 1)
+        self.assertEqual(calls[0][:2], ("institutions", "code"))
+
+
+if __name__ == "__main__":
+    unittest.main()
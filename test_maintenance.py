@@ -0,0 +1,128 @@
+import io
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+from maintenance import (
+    apply_consolidation,
+    consolidate,
+    plan_category_fixes,
+    plan_consolidation,
+    print_consolidation,
+)
+from ticker_resolver import TickerResolver
+
+ROWS = [
+    {"id": 1, "user_id": "u1", "ticker": "PETR4", "quantity": 100, "average_price": 30.0, "category": "Ação"},
+    {"id": 2, "user_id": "u1", "ticker": "PETR4", "quantity": 100, "average_price": 40.0, "category": "Ação"},
+    {"id": 3, "user_id": "u2", "ticker": "PETR4", "quantity": 10, "average_price": 35.0, "category": "Ação"},
+    {"id": 4, "user_id": "u1", "ticker": "KNIP11", "quantity": 5, "average_price": 90.0, "category": "Ação"},
+    {"id": 5, "user_id": "u1", "ticker": "KNIP11", "quantity": 15, "average_price": 100.0, "category": "FII"},
+    {"id": 6, "user_id": "u1", "ticker": "CDB BANCO X", "quantity": 1, "average_price": 1000.0, "category": "Ação"},
+]
+
+
+class RecordingDB:
+    def __init__(self):
+        self.calls = []
+
+    def upsert(self, table, rows, on_conflict=None):
+        self.calls.append(("upsert", len(rows)))
+
+    def delete_in(self, table, column, values, chunk=200):
+        self.calls.append(("delete", list(values)))
+
+
+class TableDB:
+    """portfolios in memory; the first `fail_deletes` delete_in calls fail (network)."""
+
+    def __init__(self, rows, fail_deletes=0):
+        self.rows = {r["id"]: dict(r) for r in rows}
+        self.fail_deletes = fail_deletes
+
+    def iter_rows(self, table, select, filters=None, key="id"):
+        return iter([dict(r) for _, r in sorted(self.rows.items())])
+
+    def upsert(self, table, rows, on_conflict=None):
+        for r in rows:
+            self.rows[r["id"]] = dict(r)
+
+    def delete_in(self, table, column, values, chunk=200):
+        if self.fail_deletes:
+            self.fail_deletes -= 1
+            raise ConnectionError("delete failed")
+        for v in values:
+            self.rows.pop(v, None)
+
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = os.path.join(self.tmp.name, "consolidate.journal.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_consolidation_plan(self):
+        upserts, deletes = plan_consolidation(iter(ROWS))
+        by_id = {u["id"]: u for u in upserts}
+        self.assertEqual(sorted(by_id), [1, 4])  # u2 não é misturado com u1
+        self.assertEqual(by_id[1]["quantity"], 200)
+        self.assertAlmostEqual(by_id[1]["average_price"], 35.0)
+        self.assertEqual(by_id[4]["category"], "FII")
+        self.assertAlmostEqual(by_id[4]["average_price"], 97.5)
+        self.assertEqual(sorted(deletes), [2, 5])
+
+        out = io.StringIO()
+        print_consolidation(upserts, deletes, out=out)
+        self.assertIn("~ portfolios id=1", out.getvalue())
+        self.assertIn("- portfolios id=5", out.getvalue())
+
+    def test_apply_is_batched(self):
+        rows = [
+            {"id": i, "user_id": "u", "ticker": f"T{i // 2}", "quantity": 1, "average_price": 1.0, "category": "Ação"}
+            for i in range(1000)
+        ]
+        upserts, deletes = plan_consolidation(rows)
+        db = RecordingDB()
+        apply_consolidation(db, upserts, deletes, batch_size=200, journal=self.journal)
+        self.assertEqual([c for c in db.calls if c[0] == "upsert"], [("upsert", 200)] * 2 + [("upsert", 100)])
+        self.assertEqual(db.calls[-1], ("delete", deletes))
+        self.assertNotIn("_before", str(db.calls))
+        self.assertFalse(os.path.exists(self.journal))
+
+    def test_interrupted_run_is_resumed_not_recounted(self):
+        db = TableDB(ROWS, fail_deletes=1)
+        with self.assertRaises(ConnectionError):
+            consolidate(db, batch_size=10, journal=self.journal)
+        # Totais gravados, duplicatas ainda lá: o journal ficou
+        self.assertEqual(db.rows[1]["quantity"], 200)
+        self.assertIn(2, db.rows)
+        self.assertTrue(os.path.exists(self.journal))
+
+        with io.StringIO() as out, unittest.mock.patch("sys.stdout", out):
+            consolidate(db, batch_size=10, journal=self.journal)
+        self.assertEqual(db.rows[1]["quantity"], 200)  # não virou 300
+        self.assertEqual(db.rows[4]["quantity"], 20)
+        self.assertNotIn(2, db.rows)
+        self.assertNotIn(5, db.rows)
+        self.assertFalse(os.path.exists(self.journal))
+
+        # Journal corrompido: recusa aplicar
+        with open(self.journal, "w") as f:
+            f.write("{")
+        with self.assertRaises(RuntimeError):
+            consolidate(TableDB(ROWS), journal=self.journal)
+
+    def test_category_fixes(self):
+        master = [{"ticker": "KNIP11", "type": "fii", "currency": "BRL", "exchange": "B3"}]
+        fixes = plan_category_fixes(ROWS, TickerResolver(lambda: master))
+        self.assertEqual(fixes, {
+            "FII": [(4, "KNIP11", "Ação")],
+            "Renda Fixa": [(6, "CDB BANCO X", "Ação")],
+        })
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import MagicMock
+
+import deadline
+from market_client import CircuitBreaker, TokenBucket, UpstreamUnavailable, YahooClient
+
+
+class RateLimitError(Exception):
+    def __str__(self):
+        return "Too Many Requests. Rate limited. Try after a while."
+
+
+def make_yf(prices):
+    """Fake yfinance module: prices maps symbol -> price or an exception to raise."""
+    yf = MagicMock()
+
+    def ticker(symbol):
+        obj = MagicMock()
+        value = prices[symbol]
+        if isinstance(value, Exception):
+            type(obj).fast_info = property(lambda self: (_ for _ in ()).throw(value))
+        else:
+            obj.fast_info.last_price = value
+            obj.fast_info.previous_close = value * 0.99
+        return obj
+
+    yf.Ticker.side_effect = ticker
+    return yf
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_probes_once(self):
+        breaker = CircuitBreaker(threshold=2, cooldown_s=0.0, max_cooldown_s=1.0)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        # Cool-down zerado: um único probe passa
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_probe_grows_cooldown(self):
+        breaker = CircuitBreaker(threshold=1, cooldown_s=10.0, max_cooldown_s=15.0)
+        breaker.record_failure()
+        breaker.retry_at = 0  # força o probe
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.cooldown, 15.0)
+        self.assertFalse(breaker.allow())
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_penalize_halves_rate_and_drains_tokens(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertTrue(bucket.acquire(timeout=0))
+        bucket.penalize()
+        self.assertEqual(bucket.rate, 5)
+        self.assertFalse(bucket.acquire(timeout=0))
+
+
+class TestYahooClient(unittest.TestCase):
+    def setUp(self):
+        deadline.start(2.0)
+
+    def test_serves_last_good_quote_while_open(self):
+        prices = {"PETR4.SA": 30.0}
+        client = YahooClient(lambda: make_yf(prices))
+        client.breaker.threshold = 1
+
+        results, stale = client.fetch_many("quote", ["PETR4.SA"])
+        self.assertEqual(results["PETR4.SA"][0], 30.0)
+        self.assertEqual(stale, set())
+
+        prices["PETR4.SA"] = RateLimitError()
+        rate_before = client.bucket.rate
+        results, stale = client.fetch_many("quote", ["PETR4.SA"])
+        self.assertEqual(results["PETR4.SA"][0], 30.0)
+        self.assertEqual(stale, {"PETR4.SA"})
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertLess(client.bucket.rate, rate_before)
+
+        # Circuito aberto: nem chega no Yahoo
+        with self.assertRaises(UpstreamUnavailable):
+            client.quote("VALE3.SA")
+
+    def test_max_age_serves_fresh_quotes_without_calling(self):
+        yf = make_yf({"PETR4.SA": 30.0, "VALE3.SA": 60.0})
+        client = YahooClient(lambda: yf)
+        client.fetch_many("quote", ["PETR4.SA"])
+        calls = yf.Ticker.call_count
+
+        results, stale = client.fetch_many("quote", ["PETR4.SA", "VALE3.SA"], max_age=60)
+        self.assertEqual(yf.Ticker.call_count - calls, 1)  # só VALE3
+        self.assertEqual((results["PETR4.SA"][0], results["VALE3.SA"][0], stale), (30.0, 60.0, set()))
+
+        client.fetched_at[("quote", "PETR4.SA")] -= 120  # expirou
+        client.fetch_many("quote", ["PETR4.SA"], max_age=60)
+        self.assertEqual(yf.Ticker.call_count - calls, 2)
+
+    def test_probe_rejected_by_rate_limit_is_released(self):
+        yf = make_yf({"PETR4.SA": 30.0})
+        client = YahooClient(lambda: yf)
+        client.breaker.threshold = 1
+        client.breaker.record_failure()
+        client.breaker.retry_at = 0  # cool-down acabou: próximo call é o probe
+        client.bucket.tokens = 0
+        client.bucket.rate = client.bucket.min_rate
+        deadline.start(0.0)
+        with self.assertRaises(UpstreamUnavailable):
+            client.quote("PETR4.SA")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        # Com token de novo, o probe sai e fecha o circuito
+        client.bucket.tokens = 1
+        deadline.start(2.0)
+        self.assertEqual(client.quote("PETR4.SA")[0], 30.0)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_last_good_cache_is_bounded(self):
+        yf = make_yf({"PETR4.SA": 30.0, "VALE3.SA": 60.0, "ITUB4.SA": 25.0})
+        yf.download.return_value = MagicMock(empty=False)
+        client = YahooClient(lambda: yf, cache_max=2)
+        client.fetch_many("quote", ["PETR4.SA", "VALE3.SA"])
+        client.last_good("quote", "PETR4.SA")  # usado: VALE3 é o mais antigo
+        client.quote("ITUB4.SA")
+        self.assertEqual(set(client.cache), {("quote", "PETR4.SA"), ("quote", "ITUB4.SA")})
+        self.assertEqual(set(client.fetched_at), set(client.cache))
+
+        # Frame em lote não fica no cache de último valor bom
+        client.download_many(["PETR4.SA", "VALE3.SA"], period="10y")
+        self.assertNotIn("download_many", {op for op, _ in client.cache})
+
+
+if __name__ == "__main__":
+    unittest.main()
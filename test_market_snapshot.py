@@ -0,0 +1,58 @@
+import unittest
+
+import pandas as pd
+
+from market_snapshot import MarketSnapshot, parse_watchlist
+from rates import RateStore
+
+
+class FakeYahoo:
+    def __init__(self, closes):
+        self.closes = closes
+        self.calls = 0
+
+    def download_many(self, symbols, period="5d"):
+        self.calls += 1
+        return pd.DataFrame({s: self.closes[s] for s in symbols if s in self.closes})
+
+
+class TestMarketSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.watchlist = parse_watchlist("IBOV=^BVSP,USDBRL=USDBRL=X,SELIC=rate:SELIC,CDI=rate:CDI")
+        self.yahoo = FakeYahoo({"^BVSP": [100.0, 110.0], "USDBRL=X": [5.0, 5.5]})
+        self.snapshot = MarketSnapshot(self.watchlist, self.yahoo, RateStore())
+
+    def test_parse_watchlist(self):
+        self.assertEqual(self.watchlist, [
+            ("IBOV", "yahoo", "^BVSP"),
+            ("USDBRL", "yahoo", "USDBRL=X"),
+            ("SELIC", "rate", "SELIC"),
+            ("CDI", "rate", "CDI"),
+        ])
+
+    def test_single_bulk_fetch_and_memory_reads(self):
+        data = self.snapshot.get()
+        self.assertAlmostEqual(data["IBOV"]["price"], 110.0)
+        self.assertAlmostEqual(data["IBOV"]["change"], 10.0)
+        self.assertAlmostEqual(data["USDBRL"]["change"], 10.0)
+        for _ in range(5):
+            self.snapshot.get()
+        self.assertEqual(self.yahoo.calls, 1)
+
+    def test_rates_come_from_local_series(self):
+        data = self.snapshot.get()
+        rates = self.snapshot.rates
+        self.assertAlmostEqual(data["SELIC"]["price"], rates.annual("SELIC"))
+        self.assertAlmostEqual(data["CDI"]["price"], rates.annual("SELIC") - 0.10)
+        self.assertEqual(rates.annual("SELIC", on="2021-01-15"), 2.00)
+        self.assertEqual(rates.annual("SELIC", on="2024-05-09"), 10.50)
+
+    def test_missing_symbol_keeps_previous_value(self):
+        self.snapshot.refresh()
+        del self.yahoo.closes["^BVSP"]
+        data = self.snapshot.refresh()
+        self.assertAlmostEqual(data["IBOV"]["price"], 110.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+
+import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_span_records_latency_and_errors(self):
+        with metrics.span("test_upstream", op="ok"):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.span("test_upstream", op="fail"):
+                raise ValueError("boom")
+
+        self.assertEqual(metrics.UPSTREAM_CALLS.get(upstream="test_upstream", op="ok"), 1)
+        self.assertEqual(metrics.UPSTREAM_ERRORS.get(upstream="test_upstream", op="fail"), 1)
+        self.assertEqual(metrics.UPSTREAM_LATENCY.count(upstream="test_upstream", op="fail"), 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        h = metrics.Histogram("test_seconds", "test", buckets=(0.1, 1.0))
+        h.observe(0.05)
+        h.observe(0.5)
+        h.observe(5.0)
+        text = "\n".join(h.render())
+        self.assertIn('test_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("test_seconds_count 3", text)
+
+    def test_cache_hit_ratio(self):
+        metrics.record_cache("test_cache", hit=True)
+        metrics.record_cache("test_cache", hit=True)
+        metrics.record_cache("test_cache", hit=False)
+        self.assertIn('cache_hit_ratio{cache="test_cache"} 0.6667', metrics.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from news_store import NewsStore, parse_items
+
+
+def rss(items):
+    body = "".join(
+        f"<item><title>{title}</title><link>{link}</link><pubDate>{date}</pubDate>"
+        f"<source>Fonte</source></item>"
+        for title, link, date in items
+    )
+    return f"<?xml version='1.0'?><rss><channel><title>f</title>{body}</channel></rss>".encode()
+
+
+FEEDS = {
+    "PETR4": rss([
+        ("Petrobras sobe", "https://n/1", "Tue, 02 Sep 2025 10:00:00 GMT"),
+        ("Setor de petróleo", "https://n/shared", "Mon, 01 Sep 2025 10:00:00 GMT"),
+    ]),
+    "VALE3": rss([
+        ("Vale anuncia", "https://n/2", "Wed, 03 Sep 2025 10:00:00 GMT"),
+        ("Setor de petróleo", "https://n/shared", "Mon, 01 Sep 2025 10:00:00 GMT"),
+    ]),
+}
+
+
+class FixtureRSS:
+    """Local RSS server with ETag support; counts full responses and 304s."""
+
+    def __init__(self):
+        self.full = 0
+        self.not_modified = 0
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                term = parse_qs(urlparse(self.path).query)["q"][0]
+                etag = f'"{term}-v1"'
+                if self.headers.get("If-None-Match") == etag:
+                    fixture.not_modified += 1
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                fixture.full += 1
+                body = FEEDS.get(term, rss([]))
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/rss"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+class TestNewsStore(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.rss = FixtureRSS()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.rss.server.shutdown()
+
+    def store(self, ttl_s):
+        return NewsStore(lambda term: f"{self.rss.url}?q={term}", db_path=":memory:", ttl_s=ttl_s)
+
+    def test_merged_feed_is_deduped_and_sorted(self):
+        store = self.store(ttl_s=3600)
+        self.assertEqual(store.refresh(["PETR4", "VALE3"]), 2)
+        links = [i["link"] for i in store.feed(["PETR4", "VALE3"])]
+        self.assertEqual(links, ["https://n/2", "https://n/1", "https://n/shared"])
+        self.assertEqual([i["link"] for i in store.feed(["PETR4"])], ["https://n/1", "https://n/shared"])
+
+    def test_ttl_and_conditional_requests(self):
+        fresh = self.store(ttl_s=3600)
+        fresh.refresh(["PETR4"])
+        full = self.rss.full
+        # Dentro do TTL: nenhuma requisição
+        self.assertEqual(fresh.refresh(["PETR4"]), 0)
+        self.assertEqual(self.rss.full, full)
+
+        # TTL vencido: revalida com ETag e recebe 304
+        stale = self.store(ttl_s=0)
+        stale.refresh(["VALE3"])
+        not_modified = self.rss.not_modified
+        self.assertEqual(stale.refresh(["VALE3"]), 0)
+        self.assertEqual(self.rss.not_modified, not_modified + 1)
+        self.assertEqual(len(stale.feed(["VALE3"])), 2)
+
+    def test_parse_items_limit(self):
+        content = rss([(f"t{i}", f"https://n/{i}", "") for i in range(50)])
+        items = parse_items(content, limit=5)
+        self.assertEqual([i["title"] for i in items], ["t0", "t1", "t2", "t3", "t4"])
+
+
+if __name__ == "__main__":
+    unittest.main()
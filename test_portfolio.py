@@ -0,0 +1,55 @@
+import unittest
+
+from portfolio import Portfolio
+from ticker_resolver import TickerResolver
+
+ROWS = [
+    {"id": 1, "ticker": "PETR4", "quantity": 100, "average_price": 30.0, "category": "Ação"},
+    {"id": 2, "ticker": "AAPL", "quantity": 2, "average_price": 150.0, "category": "Stocks"},
+    {"id": 3, "ticker": "SELIC", "quantity": 1000, "average_price": 1.0, "category": "Renda Fixa"},
+    {"id": 4, "ticker": "VALE3", "quantity": 10, "average_price": None, "category": "Ação"},
+]
+
+
+class TestPortfolio(unittest.TestCase):
+    def setUp(self):
+        resolver = TickerResolver(lambda: [])
+        live = {"PETR4": 33.0, "AAPL": 180.0, "VALE3": 60.0}
+        prev = {"PETR4": 30.0, "AAPL": 200.0}
+        self.p = Portfolio(ROWS, resolver, live, prev, usd_rate=5.0, stale={"VALE3"})
+
+    def test_valuation(self):
+        recs = {r["ticker"]: r for r in self.p.to_records()}
+
+        petr = recs["PETR4"]
+        self.assertAlmostEqual(petr["current_price"], 33.0)
+        self.assertAlmostEqual(petr["profit_percent"], 10.0)
+        self.assertAlmostEqual(petr["daily_change"], 300.0)
+        self.assertAlmostEqual(petr["daily_change_pct"], 10.0)
+        self.assertEqual(petr["currency"], "BRL")
+
+        aapl = recs["AAPL"]
+        self.assertEqual(aapl["currency"], "USD")
+        self.assertAlmostEqual(aapl["price_original"], 180.0)
+        self.assertAlmostEqual(aapl["current_price"], 900.0)
+        self.assertAlmostEqual(aapl["average_price_brl"], 750.0)
+        self.assertAlmostEqual(aapl["profit_percent"], 20.0)
+        self.assertAlmostEqual(aapl["daily_change"], -200.0)
+
+        # Sem cotação: preço médio; sem preço médio: 0% de rentabilidade
+        self.assertAlmostEqual(recs["SELIC"]["current_price"], 1.0)
+        self.assertEqual(recs["VALE3"]["profit_percent"], 0.0)
+        self.assertEqual(recs["VALE3"]["average_price"], 0.0)
+        self.assertTrue(recs["VALE3"]["stale"])
+        self.assertFalse(recs["PETR4"]["stale"])
+
+    def test_aggregates(self):
+        self.assertAlmostEqual(self.p.total_value, 3300 + 1800 + 1000 + 600)
+        self.assertEqual(
+            self.p.allocation(), {"Ação": 3900.0, "Stocks": 1800.0, "Renda Fixa": 1000.0}
+        )
+        self.assertEqual(self.p.positions[self.p.top(1)[0]].ticker, "PETR4")
+
+
+if __name__ == "__main__":
+    unittest.main()
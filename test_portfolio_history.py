@@ -0,0 +1,113 @@
+import datetime as dt
+import unittest
+
+from portfolio import Portfolio
+from portfolio_history import PortfolioHistory, daily_row, position_rows, twr_points
+from ticker_resolver import TickerResolver
+
+
+def _match(row, filters):
+    for col, cond in (filters or {}).items():
+        op, _, val = cond.partition(".")
+        cur = str(row.get(col))
+        if not {"eq": cur == val, "gte": cur >= val, "lt": cur < val}[op]:
+            return False
+    return True
+
+
+class MemoryDB:
+    """Subset of SupabaseREST over dicts; keys per table as the schema's primary keys."""
+
+    KEYS = {"portfolio_snapshots": ("user_id", "date", "ticker"), "portfolio_daily": ("user_id", "date")}
+
+    def __init__(self):
+        self.tables = {t: {} for t in self.KEYS}
+        self.reads = 0
+
+    def iter_rows(self, table, select, filters=None, key="id"):
+        self.reads += 1
+        rows = [r for r in self.tables[table].values() if _match(r, filters)]
+        return iter(sorted(rows, key=lambda r: r[key]))
+
+    def latest(self, table, select, filters=None, key="id"):
+        rows = list(self.iter_rows(table, select, filters, key))
+        return rows[-1] if rows else None
+
+    def delete_where(self, table, filters):
+        self.tables[table] = {k: r for k, r in self.tables[table].items() if not _match(r, filters)}
+
+    def upsert(self, table, rows, on_conflict=None):
+        for r in rows:
+            self.tables[table][tuple(r[k] for k in self.KEYS[table])] = dict(r)
+
+
+RESOLVER = TickerResolver(lambda: [])
+
+
+def _portfolio(holdings, prices):
+    rows = [
+        {"id": i, "ticker": t, "quantity": q, "average_price": 10.0, "category": "Ação"}
+        for i, (t, q) in enumerate(holdings)
+    ]
+    return Portfolio(rows, RESOLVER, prices, {}, 5.0)
+
+
+class TestPortfolioHistory(unittest.TestCase):
+    def test_position_rows_aggregate_duplicates(self):
+        p = _portfolio([("PETR4", 10), ("PETR4", 5), ("VALE3", 2)], {"PETR4": 20.0, "VALE3": 50.0})
+        rows = {r["ticker"]: r for r in position_rows("u", p, dt.date(2025, 1, 2))}
+        self.assertEqual(rows["PETR4"]["quantity"], 15)
+        self.assertEqual(rows["PETR4"]["value_brl"], 300.0)
+        self.assertEqual(rows["VALE3"]["date"], "2025-01-02")
+
+    def test_twr_ignores_flows(self):
+        db = MemoryDB()
+        history = PortfolioHistory(lambda: db)
+        days = [dt.date(2025, 1, d) for d in (2, 3, 6, 7)]
+        history.record("u", _portfolio([("PETR4", 10)], {"PETR4": 10.0}), days[0])
+        history.record("u", _portfolio([("PETR4", 10)], {"PETR4": 11.0}), days[1])  # +10%
+        # Aporte: compra mais 10 e o preço vai a 12 (+9,09% no dia)
+        d3 = history.record("u", _portfolio([("PETR4", 20)], {"PETR4": 12.0}), days[2])
+        self.assertAlmostEqual(d3["flow_brl"], 120.0)
+        self.assertAlmostEqual(d3["twr_index"], 120.0)
+        # Vende tudo de PETR4 a 12 e compra VALE3: sem variação de preço, índice parado
+        d4 = history.record("u", _portfolio([("VALE3", 4)], {"VALE3": 60.0}), days[3])
+        self.assertAlmostEqual(d4["flow_brl"], 0.0)
+        self.assertAlmostEqual(d4["twr_index"], 120.0)
+
+        # Reexecução do mesmo dia não deixa posição antiga nem muda o índice
+        history.record("u", _portfolio([("VALE3", 4)], {"VALE3": 60.0}), days[3])
+        tickers = [r["ticker"] for r in db.tables["portfolio_snapshots"].values() if r["date"] == "2025-01-07"]
+        self.assertEqual(tickers, ["VALE3"])
+
+        rows = history.series("u", dt.date(2025, 1, 3))
+        self.assertEqual([r["date"] for r in rows], ["2025-01-03", "2025-01-06", "2025-01-07"])
+        points = twr_points(rows)
+        self.assertAlmostEqual(points[0][1], 100.0)
+        self.assertAlmostEqual(points[-1][1], 120.0 / 110.0 * 100)
+
+        # Série em cache até o próximo snapshot
+        reads = db.reads
+        history.series("u", dt.date(2025, 1, 3))
+        self.assertEqual(db.reads, reads)
+
+    def test_first_day_and_empty_previous_value(self):
+        row = daily_row("u", dt.date(2025, 1, 2), [{"ticker": "A", "quantity": 1, "price_brl": 5, "value_brl": 5, "cost_brl": 4}])
+        self.assertEqual((row["twr_index"], row["flow_brl"]), (100.0, 5))
+        prev = {"twr_index": 130.0, "value_brl": 0}
+        self.assertEqual(daily_row("u", dt.date(2025, 1, 3), [], prev)["twr_index"], 130.0)
+
+    def test_due_uses_market_time(self):
+        history = PortfolioHistory(lambda: None)
+        utc = dt.timezone.utc
+        # 21:00 UTC = 18:00 em São Paulo: B3 ainda não fechou o dia
+        self.assertFalse(history._due(dt.datetime(2025, 1, 6, 21, 0, tzinfo=utc)))
+        self.assertTrue(history._due(dt.datetime(2025, 1, 6, 21, 45, tzinfo=utc)))
+        # Sábado 01:00 UTC ainda é sexta à noite na B3
+        self.assertTrue(history._due(dt.datetime(2025, 1, 11, 1, 0, tzinfo=utc)))
+        history.last_run = dt.date(2025, 1, 10)
+        self.assertFalse(history._due(dt.datetime(2025, 1, 11, 1, 0, tzinfo=utc)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from price_store import PriceStore, merge_adjusted
+
+
+class FakeYahoo:
+    def __init__(self, closes):
+        self.closes = closes
+        self.periods = []
+
+    def download_many(self, symbols, period="5d"):
+        self.periods.append(period)
+        n = {"1mo": 21}.get(period, len(self.closes))
+        return self.closes[[s for s in symbols if s in self.closes.columns]].iloc[-n:]
+
+
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=300)
+        self.closes = pd.DataFrame({"PETR4.SA": range(1, 301), "^BVSP": range(1000, 1300)}, index=index, dtype=float)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_merge_rescales_old_history(self):
+        index = pd.bdate_range("2025-01-01", periods=6)
+        old = pd.Series([10.0, 10, 10, 10, 10], index=index[:5])
+        # Dividendo depois do dia 3: o Yahoo reajusta o passado para 9
+        new = pd.Series([9.0, 9, 9, 9], index=index[2:])
+        merged = merge_adjusted(old, new)
+        self.assertEqual(merged.tolist(), [9.0] * 6)
+        self.assertTrue(merged.index.equals(index))
+
+    def test_local_cache_and_short_refresh(self):
+        store = PriceStore(FakeYahoo(self.closes), cache_dir=self.dir)
+        frame = store.matrix(["PETR4.SA", "^BVSP"])
+        self.assertEqual(frame.shape, (300, 2))
+
+        # Outro processo: lê o CSV e só baixa o período curto
+        yahoo = FakeYahoo(self.closes)
+        fresh = PriceStore(yahoo, cache_dir=self.dir)
+        frame = fresh.matrix(["PETR4.SA", "^BVSP"], start=self.closes.index[100])
+        self.assertEqual(yahoo.periods, ["1mo"])
+        self.assertEqual(len(frame), 200)
+        self.assertEqual(frame["^BVSP"].iloc[-1], 1299.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
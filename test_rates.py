@@ -0,0 +1,113 @@
+import datetime as dt
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from rates import RateStore
+
+
+class FakeResponse:
+    def __init__(self, rows, status=200):
+        self.rows = rows
+        self.status_code = status
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.rows
+
+
+class FakeSGS:
+    """Stand-in for the BCB SGS API: serves `points` filtered by dataInicial/dataFinal."""
+
+    def __init__(self, points):
+        self.points = points  # {date: valor}
+        self.requests = []
+
+    def __call__(self, url, params=None, timeout=None):
+        start = dt.datetime.strptime(params["dataInicial"], "%d/%m/%Y").date()
+        end = dt.datetime.strptime(params["dataFinal"], "%d/%m/%Y").date()
+        self.requests.append((url, start, end))
+        rows = [
+            {"data": d.strftime("%d/%m/%Y"), "valor": f"{v:.6f}"}
+            for d, v in sorted(self.points.items()) if start <= d <= end
+        ]
+        return FakeResponse(rows, 200 if rows else 404)
+
+
+class TestRateStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def store(self, sgs=None):
+        return RateStore(cache_dir=self.tmp.name, http_get=sgs or FakeSGS({}))
+
+    def test_curve_matches_daily_compounding(self):
+        store = self.store()
+        curve = store.curve("CDI", "2025-07-01", "2025-12-31")
+        daily = (1 + 14.90 / 100) ** (1 / 252) - 1
+        expected = 100 * (1 + daily) ** np.arange(len(curve))
+        np.testing.assert_allclose(curve.to_numpy(), expected)
+        self.assertIs(store.curve("CDI", "2025-07-01", "2025-12-31"), curve)
+
+    def test_index_on_trading_days(self):
+        store = self.store()
+        dates = pd.DatetimeIndex(["2024-01-02", "2024-01-03", "2024-01-05", "2024-01-08"])
+        values = store.index_on("CDI", dates)
+        daily = (1 + 11.65 / 100) ** (1 / 252) - 1
+        # 05/01 acumula 3 dias úteis (02, 03, 04); 08/01 acumula 4
+        np.testing.assert_allclose(values, 100 * (1 + daily) ** np.array([0, 1, 3, 4]))
+
+    def test_incremental_update_and_observed_override(self):
+        points = {dt.date(2025, 9, 1): 0.05, dt.date(2025, 9, 2): 0.06}
+        sgs = FakeSGS(points)
+        store = self.store(sgs)
+        self.assertEqual(store.update("CDI", today=dt.date(2025, 9, 2)), 2)
+
+        points[dt.date(2025, 9, 3)] = 0.07
+        self.assertEqual(store.update("CDI", today=dt.date(2025, 9, 3)), 1)
+        self.assertEqual(sgs.requests[-1][1], dt.date(2025, 9, 3))  # só o que falta
+
+        # Recarregado do CSV local
+        reloaded = self.store()
+        self.assertEqual(reloaded.observed["CDI"].tolist(), [0.05, 0.06, 0.07])
+        rates = reloaded.daily_rates("CDI", "2025-09-01", "2025-09-05").tolist()
+        self.assertEqual(rates[:3], [0.05, 0.06, 0.07])
+        self.assertAlmostEqual(rates[3], ((1 + 14.90 / 100) ** (1 / 252) - 1) * 100)
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, "sgs_cdi.csv")))
+
+    def test_monthly_series(self):
+        store = self.store(FakeSGS({dt.date(2025, 1, 1): 0.16, dt.date(2025, 2, 1): 1.31}))
+        store.update("IPCA", today=dt.date(2025, 2, 28))
+        curve = store.curve("IPCA", "2025-01-01", "2025-02-28")
+        # Janeiro inteiro acumula 0,16%
+        self.assertAlmostEqual(curve[pd.Timestamp("2025-02-03")], 100.16)
+
+    def test_before_first_rate_raises(self):
+        store = self.store()
+        self.assertEqual(store.first_date("CDI"), dt.date(2016, 10, 20))
+        # Antes da série não rende 0% (nem -0,10% no CDI): recusa
+        with self.assertRaises(LookupError):
+            store.curve("CDI", "2012-01-02", "2017-01-02")
+        with self.assertRaises(LookupError):
+            store.index_on("CDI", pd.DatetimeIndex(["2016-10-19", "2016-10-21"]))
+        self.assertEqual(store.index_on("CDI", pd.DatetimeIndex(["2016-10-20", "2016-10-21"]))[0], 100.0)
+
+        # Observado anterior ao COPOM estende a cobertura; IPCA sem observado não tem dado
+        store = self.store(FakeSGS({dt.date(2016, 10, 3): 0.05}))
+        store.update("CDI", today=dt.date(2016, 10, 3))
+        self.assertEqual(store.first_date("CDI"), dt.date(2016, 10, 3))
+        self.assertIsNone(store.first_date("IPCA"))
+        with self.assertRaises(LookupError):
+            store.curve("IPCA", "2025-01-01", "2025-02-28")
+
+
+if __name__ == "__main__":
+    unittest.main()
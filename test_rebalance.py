@@ -0,0 +1,101 @@
+import unittest
+
+from portfolio import Portfolio
+from rebalance import parse_lots, parse_targets, plan
+from ticker_resolver import TickerResolver
+
+RESOLVER = TickerResolver(lambda: [])
+
+
+def _portfolio(holdings, prices):
+    rows = [
+        {"id": i, "ticker": t, "quantity": q, "average_price": prices[t], "category": c}
+        for i, (t, c, q) in enumerate(holdings)
+    ]
+    return Portfolio(rows, RESOLVER, prices, {}, 5.0)
+
+
+def _trades(result):
+    return {(t["ticker"], t["side"]): t["quantity"] for t in result["trades"]}
+
+
+class TestRebalance(unittest.TestCase):
+    def test_minimum_trade_to_targets(self):
+        # 600 em ações, 400 em FII -> alvo 50/50: vende 100 de um lado, compra 100 do outro
+        p = _portfolio(
+            [("PETR4", "Ação", 30), ("HGLG11", "FII", 4)],
+            {"PETR4": 20.0, "HGLG11": 100.0},
+        )
+        result = plan(p, {"Ação": 50, "FII": 50}, fee_pct=0)
+        self.assertEqual(_trades(result), {("PETR4", "sell"): 5.0, ("HGLG11", "buy"): 1.0})
+        self.assertEqual(result["summary"]["cash_left"], 0.0)
+        self.assertEqual([c["after_pct"] for c in result["categories"]], [50.0, 50.0])
+
+    def test_on_target_does_not_trade(self):
+        p = _portfolio([("PETR4", "Ação", 10), ("HGLG11", "FII", 2)], {"PETR4": 10.0, "HGLG11": 50.0})
+        self.assertEqual(plan(p, {"Ação": 0.5, "FII": 0.5})["trades"], [])
+
+    def test_lots_fees_and_cash(self):
+        p = _portfolio(
+            [("PETR4", "Ação", 100), ("VALE3", "Ação", 100), ("HGLG11", "FII", 1)],
+            {"PETR4": 10.0, "VALE3": 10.0, "HGLG11": 100.0},
+        )
+        # Só aportes: nada é vendido, compras cabem no caixa com as taxas
+        result = plan(p, {"Ação": 50, "FII": 50}, cash=1000, fee_pct=0.01, fee_fixed=1, allow_sell=False)
+        self.assertTrue(all(t["side"] == "buy" for t in result["trades"]))
+        spent = result["summary"]["buy"] + result["summary"]["fees"]
+        self.assertLessEqual(spent, 1000)
+        self.assertGreaterEqual(result["summary"]["cash_left"], 0)
+        self.assertEqual(_trades(result), {("HGLG11", "buy"): 9.0})
+
+        # Lote padrão de 100: a venda de ações arredonda para baixo
+        result = plan(p, {"Ação": 50, "FII": 50}, lots={"Ação": 100}, fee_pct=0)
+        self.assertEqual(_trades(result).get(("PETR4", "sell"), 0) % 100, 0)
+
+    def test_unreachable_and_validation(self):
+        p = _portfolio([("PETR4", "Ação", 10)], {"PETR4": 10.0})
+        result = plan(p, {"Ação": 50, "Cripto": 50}, fee_pct=0)
+        self.assertEqual(result["unreachable"], ["Cripto"])
+        self.assertEqual(result["summary"]["cash_left"], 50.0)
+        with self.assertRaises(ValueError):
+            parse_targets({"Ouro": 10})
+        with self.assertRaises(ValueError):
+            parse_targets({"Ação": 0})
+        self.assertEqual(parse_lots("Ação=100, Cripto=0.001,x"), {"Ação": 100.0, "Cripto": 0.001})
+
+    def test_invalid_options(self):
+        p = _portfolio([("PETR4", "Ação", 10)], {"PETR4": 10.0})
+        targets = {"Ação": 100}
+        for options in (
+            {"lots": {"Ação": 0}}, {"lots": {"Ação": -1}}, {"lots": {"Ação": "nan"}}, {"lots": [100]},
+            {"cash": "nan"}, {"cash": "inf"}, {"cash": -1}, {"cash": "abc"},
+            {"fee_pct": -0.01}, {"fee_pct": 1}, {"fee_fixed": -1}, {"min_trade": -5}, {"min_trade": "nan"},
+        ):
+            with self.assertRaises(ValueError, msg=options):
+                plan(p, targets, **options)
+        with self.assertRaises(ValueError):
+            plan(p, {"Ação": "nan"})
+        # Strings numéricas (JSON do endpoint) continuam aceitas
+        self.assertEqual(plan(p, targets, cash="100", fee_pct="0")["summary"]["buy"], 100.0)
+
+    def test_untargeted_categories_are_untouched(self):
+        # 100 IVVB11 (ETF) e alvo só para Ação: o ETF não é vendido
+        p = _portfolio(
+            [("IVVB11", "ETF", 100), ("PETR4", "Ação", 10), ("XPML11", "Outro", 3)],
+            {"IVVB11": 300.0, "PETR4": 10.0, "XPML11": 100.0},
+        )
+        result = plan(p, {"Ação": 100}, cash=100, fee_pct=0)
+        self.assertEqual(_trades(result), {("PETR4", "buy"): 10.0})
+        self.assertEqual(result["untouched"], [{"category": "ETF", "value": 30000.0},
+                                               {"category": "Outro", "value": 300.0}])
+        self.assertEqual(result["total_value"], 200.0)
+
+        # ETF, REITs e categorias que o usuário tem são aceitos como alvo
+        self.assertEqual(parse_targets({"ETF": 1, "REITs": 1}), {"ETF": 0.5, "REITs": 0.5})
+        result = plan(p, {"ETF": 50, "Outro": 25, "Ação": 25}, fee_pct=0)
+        self.assertEqual(result["untouched"], [])
+        self.assertIn(("IVVB11", "sell"), _trades(result))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from portfolio import Portfolio
+from risk import BENCHMARK_SYMBOL, RiskEngine, compute
+from ticker_resolver import TickerResolver
+
+
+def _walk(seed, days=300, vol=0.015):
+    rng = np.random.default_rng(seed)
+    return 50 * np.cumprod(1 + rng.normal(0.0003, vol, days))
+
+
+class FakePrices:
+    """PriceStore stand-in: fixed closes per symbol, counts matrix() calls."""
+
+    def __init__(self, closes):
+        index = pd.bdate_range(end=pd.Timestamp.now().normalize(), periods=len(next(iter(closes.values()))))
+        self.frame = pd.DataFrame(closes, index=index)
+        self.calls = 0
+
+    def matrix(self, symbols, start=None):
+        self.calls += 1
+        cols = [s for s in dict.fromkeys(symbols) if s in self.frame.columns]
+        frame = self.frame[cols]
+        return frame[frame.index >= start] if start is not None else frame
+
+
+class TestRisk(unittest.TestCase):
+    def test_identities(self):
+        bench = _walk(1)
+        a = _walk(2)
+        prices = np.column_stack([bench, a, a * 0 + 10.0])  # terceira coluna constante
+        r = compute(prices, [300.0, 500.0, 200.0], bench)
+        # Contribuições somam a volatilidade da carteira
+        self.assertAlmostEqual(r["contribution"].sum(), r["portfolio_vol"])
+        # O próprio índice tem beta 1 e correlação 1 com ele mesmo
+        self.assertAlmostEqual(r["beta"][0], 1.0)
+        self.assertAlmostEqual(r["corr"][0, 0], 1.0)
+        self.assertEqual((r["vol"][2], r["contribution"][2], r["asset_drawdown"][2]), (0.0, 0.0, 0.0))
+        expected = (bench / np.maximum.accumulate(bench) - 1).min()
+        self.assertAlmostEqual(r["asset_drawdown"][0], expected)
+        self.assertAlmostEqual(r["vol"][0], np.std(bench[1:] / bench[:-1] - 1, ddof=1) * np.sqrt(252))
+
+    def test_unpriced_value_dilutes_weights(self):
+        bench = _walk(1)
+        r = compute(bench[:, None], [500.0], bench, unpriced_value=500.0)
+        self.assertAlmostEqual(r["weights"][0], 0.5)
+        self.assertAlmostEqual(r["portfolio_beta"], 0.5)
+
+    def test_engine_groups_and_caches(self):
+        store = FakePrices({"PETR4.SA": _walk(3), "VALE3.SA": _walk(4), BENCHMARK_SYMBOL: _walk(1)})
+        rows = [
+            {"id": 1, "ticker": "PETR4", "quantity": 10, "average_price": 10.0, "category": "Ação"},
+            {"id": 2, "ticker": "PETR4", "quantity": 5, "average_price": 10.0, "category": "Ação"},
+            {"id": 3, "ticker": "VALE3", "quantity": 4, "average_price": 10.0, "category": "Ação"},
+            {"id": 4, "ticker": "CDB", "quantity": 1, "average_price": 100.0, "category": "Renda Fixa"},
+        ]
+        portfolio = Portfolio(rows, TickerResolver(lambda: []), {"PETR4": 20.0, "VALE3": 50.0}, {}, 5.0)
+        engine = RiskEngine(store, window_days=200)
+        result = engine.analyze(portfolio)
+
+        self.assertEqual(sorted(a["ticker"] for a in result["assets"]), ["PETR4", "VALE3"])
+        self.assertEqual(result["excluded"], ["CDB"])
+        self.assertAlmostEqual(result["coverage"], 500 / 600 * 100, places=3)
+        self.assertAlmostEqual(
+            sum(a["risk_contribution_pct"] for a in result["assets"]), 100.0, places=2
+        )
+        self.assertEqual(len(result["correlation"]["matrix"]), 2)
+
+        engine.analyze(portfolio)
+        self.assertEqual(store.calls, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
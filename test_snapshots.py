@@ -0,0 +1,62 @@
+import threading
+import time
+import unittest
+
+from snapshots import SnapshotCache
+
+
+class TestSnapshotCache(unittest.TestCase):
+    def test_reuses_until_invalidated(self):
+        cache = SnapshotCache(ttl_s=60)
+        builds = []
+        build = lambda: builds.append(1) or len(builds)
+
+        self.assertEqual(cache.get_or_build("u1", build), 1)
+        self.assertEqual(cache.get_or_build("u1", build), 1)
+        cache.invalidate("u1")
+        self.assertEqual(cache.get_or_build("u1", build), 2)
+        # Outro usuário não compartilha
+        self.assertEqual(cache.get_or_build("u2", build), 3)
+
+    def test_ttl_expiry(self):
+        cache = SnapshotCache(ttl_s=0.0)
+        builds = []
+        cache.get_or_build("u1", lambda: builds.append(1) or "a")
+        time.sleep(0.01)
+        cache.get_or_build("u1", lambda: builds.append(1) or "b")
+        self.assertEqual(len(builds), 2)
+
+    def test_concurrent_misses_build_once(self):
+        cache = SnapshotCache(ttl_s=60)
+        builds = []
+
+        def slow_build():
+            builds.append(1)
+            time.sleep(0.1)
+            return "snapshot"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(cache.get_or_build("u1", slow_build)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(builds), 1)
+        self.assertEqual(results, ["snapshot"] * 5)
+
+    def test_write_during_build_is_not_cached(self):
+        cache = SnapshotCache(ttl_s=60)
+
+        def build_and_write():
+            cache.invalidate("u1")
+            return "old"
+
+        self.assertEqual(cache.get_or_build("u1", build_and_write), "old")
+        self.assertEqual(cache.get_or_build("u1", lambda: "new"), "new")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+import asyncio
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import build_static
+import static_assets
+from static_assets import IMMUTABLE_CACHE, REVALIDATE_CACHE, PrecompressedStaticFiles, index_response
+
+JS = b"console.log('ok');" * 20
+CSS = b"body { color: red; }"
+
+
+def asgi_get(app, path, headers=None):
+    """GET through the ASGI app (no TestClient: httpx is not a dependency). Returns (status, headers, body)."""
+    scope = {
+        # spec 2.4: a resposta não fica escutando http.disconnect
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "method": "GET", "path": path, "root_path": "", "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    body = b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+def response_body(response):
+    """Status, headers and body of a (File)Response built outside of a request."""
+    return asgi_get(response, "/")
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.hashed = build_static.fingerprint("app.js", JS)
+        self._write(self.hashed, JS)
+        self._write(self.hashed + ".gz", gzip.compress(JS))
+        self._write(self.hashed + ".br", b"brotli-bytes")
+        self._write("plain.css", CSS)
+        self.app = PrecompressedStaticFiles(directory=self.dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name, content):
+        with open(os.path.join(self.dir, name), "wb") as f:
+            f.write(content)
+
+    def test_encoding_negotiation(self):
+        status, headers, body = asgi_get(self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip, deflate, br"})
+        self.assertEqual((status, headers["content-encoding"], body), (200, "br", b"brotli-bytes"))
+        self.assertEqual(headers["content-type"].split(";")[0], "text/javascript")
+        self.assertEqual(headers["vary"], "Accept-Encoding")
+
+        _, headers, body = asgi_get(self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip;q=1.0"})
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), JS)
+
+        _, headers, body = asgi_get(self.app, f"/{self.hashed}")
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(body, JS)
+
+        # Sem irmão .br/.gz: serve o original mesmo aceitando compressão
+        _, headers, body = asgi_get(self.app, "/plain.css", {"Accept-Encoding": "br, gzip"})
+        self.assertNotIn("content-encoding", headers)
+        self.assertEqual(body, CSS)
+
+    def test_cache_control(self):
+        self.assertRegex(self.hashed, static_assets.FINGERPRINT_RE)
+        _, headers, _ = asgi_get(self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip"})
+        self.assertEqual(headers["cache-control"], IMMUTABLE_CACHE)
+        _, headers, _ = asgi_get(self.app, "/plain.css")
+        self.assertEqual(headers["cache-control"], REVALIDATE_CACHE)
+
+    def test_if_none_match(self):
+        _, headers, _ = asgi_get(self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip"})
+        status, headers_304, body = asgi_get(
+            self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip", "If-None-Match": headers["etag"]},
+        )
+        self.assertEqual((status, body), (304, b""))
+        self.assertEqual(headers_304["cache-control"], IMMUTABLE_CACHE)
+
+        status, _, _ = asgi_get(self.app, f"/{self.hashed}", {"Accept-Encoding": "gzip", "If-None-Match": '"x"'})
+        self.assertEqual(status, 200)
+
+    def test_index_response(self):
+        # Sem build: página fonte, revalidada a cada visita
+        with mock.patch.object(static_assets, "DIST_DIR", os.path.join(self.dir, "missing")):
+            status, headers, body = response_body(index_response({"accept-encoding": "gzip"}))
+        with open(os.path.join("static", "index.html"), "rb") as f:
+            self.assertEqual(body, f.read())
+        self.assertEqual((status, headers["cache-control"]), (200, REVALIDATE_CACHE))
+        self.assertNotIn("content-encoding", headers)
+
+        # Com build: a versão buildada, comprimida
+        self._write("index.html", b"<html>built</html>")
+        self._write("index.html.gz", gzip.compress(b"<html>built</html>"))
+        with mock.patch.object(static_assets, "DIST_DIR", self.dir):
+            _, headers, body = response_body(index_response({"accept-encoding": "gzip"}))
+        self.assertEqual(headers["content-encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), b"<html>built</html>")
+
+    def test_build_emits_fingerprinted_precompressed_files(self):
+        manifest = {}
+        with mock.patch.object(build_static, "DIST_DIR", self.dir):
+            url = build_static.emit("style.css", CSS, manifest)
+            build_static.emit("index.html", b"<html></html>", manifest, hashed=False)
+        name = manifest["style.css"]
+        self.assertEqual(url, f"/static/dist/{name}")
+        self.assertRegex(name, static_assets.FINGERPRINT_RE)
+        self.assertEqual(name, build_static.fingerprint("style.css", CSS))  # mesmo conteúdo, mesmo nome
+        with open(os.path.join(self.dir, name + ".gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), CSS)
+        self.assertEqual(manifest["index.html"], "index.html")
+
+
+if __name__ == "__main__":
+    unittest.main()
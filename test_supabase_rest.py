@@ -0,0 +1,41 @@
+import unittest
+
+from benchmark import FakePostgREST
+from supabase_rest import SupabaseREST
+
+
+class TestSupabaseREST(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rows = [
+            {"id": i, "user_id": "u1" if i % 2 else "u2", "ticker": f"T{i:04d}", "category": "Ação", "notes": "x" * 50}
+            for i in range(1, 2501)
+        ]
+        master = [{"ticker": f"M{i:03d}", "type": "stock_br"} for i in range(250, 0, -1)]
+        cls.db = FakePostgREST({"portfolios": rows, "assets_master": master})
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.stop()
+
+    def test_keyset_pages_with_projection(self):
+        client = SupabaseREST(self.db.url, "k", page_size=1000)
+        calls = self.db.calls
+        rows = list(client.iter_rows("portfolios", "ticker,category"))
+        self.assertEqual(len(rows), 2500)
+        self.assertEqual(self.db.calls - calls, 3)
+        self.assertEqual([r["id"] for r in rows], list(range(1, 2501)))
+        # Só as colunas pedidas (+ a chave da paginação)
+        self.assertEqual(set(rows[0]), {"id", "ticker", "category"})
+
+    def test_filters_and_text_key(self):
+        client = SupabaseREST(self.db.url, "k", page_size=100)
+        mine = list(client.iter_rows("portfolios", "id", {"user_id": "eq.u1"}))
+        self.assertEqual(len(mine), 1250)
+        master = [r["ticker"] for r in client.iter_rows("assets_master", "ticker,type", key="ticker")]
+        self.assertEqual(master, sorted(master))
+        self.assertEqual(len(master), 250)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from ticker_resolver import TickerResolver, resolve_fallback
+
+MASTER = [
+    {"ticker": "PETR4", "type": "stock_br", "currency": "BRL", "exchange": "B3"},
+    {"ticker": "VOO", "type": "etf_us", "currency": "USD", "exchange": "NYSE"},
+    {"ticker": "BTC", "type": "crypto", "currency": "USD", "exchange": "CRYPTO"},
+]
+
+
+class TestTickerResolver(unittest.TestCase):
+    def test_master_lookup(self):
+        resolver = TickerResolver(lambda: MASTER)
+        petr = resolver.resolve("petr4 ", "Stocks")  # categoria errada: master vence
+        self.assertEqual((petr.yahoo, petr.currency, petr.dividends), ("PETR4.SA", "BRL", True))
+
+        btc = resolver.resolve("BTC", "Cripto")
+        self.assertEqual((btc.yahoo, btc.is_intl, btc.dividends), ("BTC-USD", True, False))
+        self.assertEqual(resolver.resolve("VOO", "ETF").category, "ETF")
+
+    def test_loader_called_once_and_memoized(self):
+        calls = []
+        resolver = TickerResolver(lambda: calls.append(1) or MASTER)
+        first = resolver.resolve("AAPL", "Stocks")
+        self.assertIs(resolver.resolve("AAPL", "Stocks"), first)
+        self.assertEqual(len(calls), 1)
+
+    def test_fallback_rules(self):
+        cases = {
+            ("VALE3", "Ação"): ("VALE3.SA", "BRL"),
+            ("KNIP11", "FII"): ("KNIP11.SA", "BRL"),
+            ("AAPL", "Stocks"): ("AAPL", "USD"),
+            ("O", "REITs"): ("O", "USD"),
+            ("IVVB11", "ETF"): ("IVVB11.SA", "BRL"),
+            ("QQQ", "ETF"): ("QQQ", "USD"),
+            ("ETH", "Cripto"): ("ETH-USD", "USD"),
+            ("PETR4.SA", None): ("PETR4.SA", "BRL"),
+        }
+        for (ticker, cat), expected in cases.items():
+            inst = resolve_fallback(ticker, cat)
+            self.assertEqual((inst.yahoo, inst.currency), expected, ticker)
+
+        self.assertFalse(resolve_fallback("TESOURO IPCA", "Renda Fixa").priced)
+        self.assertFalse(resolve_fallback("SELIC", "Ação").priced)
+
+    def test_failed_load_keeps_fallback(self):
+        def boom():
+            raise RuntimeError("offline")
+
+        resolver = TickerResolver(boom)
+        self.assertEqual(resolver.resolve("ITUB4", "Ação").yahoo, "ITUB4.SA")
+
+    def test_failed_load_is_retried_before_ttl(self):
+        row = {"ticker": "ITUB4", "type": "stock_br", "currency": "BRL", "exchange": "B3"}
+        responses = [RuntimeError("offline"), [], [row]]
+        calls = []
+
+        def loader():
+            calls.append(1)
+            response = responses[len(calls) - 1]
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        resolver = TickerResolver(loader, retry_s=30)
+        self.assertEqual(resolver.resolve("ITUB4").source, "heuristic")
+        self.assertEqual(resolver.loaded_at, 0.0)
+        resolver.resolve("ITUB4")
+        self.assertEqual(len(calls), 1)  # dentro do intervalo de retry: não martela o banco
+
+        resolver.retry_at = 0  # passou o intervalo; vazio também conta como falha
+        resolver.resolve("ITUB4")
+        self.assertEqual((len(calls), resolver.loaded_at), (2, 0.0))
+        resolver.retry_at = 0
+        self.assertEqual(resolver.resolve("ITUB4").source, "master")
+        self.assertGreater(resolver.loaded_at, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import threading
+import time
+import unittest
+
+from warmup import FAILED, OK, TIMEOUT, Warmup, most_held
+
+
+class TestWarmup(unittest.TestCase):
+    def test_ready_only_after_every_step(self):
+        release = threading.Event()
+        warmup = Warmup({
+            "fast": lambda: {"n": 1},
+            "slow": lambda: release.wait(5) and "done",
+            "broken": lambda: 1 / 0,
+        }, budget_s=5)
+        warmup.start()
+        time.sleep(0.05)
+        self.assertFalse(warmup.ready)
+        self.assertFalse(warmup.report()["ready"])
+
+        release.set()
+        self.assertTrue(warmup.wait(5))
+        steps = warmup.report()["steps"]
+        self.assertEqual(steps["fast"], {"status": OK, "ms": steps["fast"]["ms"], "detail": {"n": 1}})
+        self.assertEqual(steps["slow"]["status"], OK)
+        # Passo com erro não segura o ready
+        self.assertEqual(steps["broken"]["status"], FAILED)
+        self.assertIn("ZeroDivisionError", steps["broken"]["detail"])
+
+    def test_budget_bounds_readiness(self):
+        stuck = threading.Event()
+        self.addCleanup(stuck.set)
+        warmup = Warmup({"stuck": lambda: stuck.wait(10)}, budget_s=0.1)
+        t0 = time.perf_counter()
+        report = warmup.run()
+        self.assertLess(time.perf_counter() - t0, 1.0)
+        self.assertTrue(report["ready"])
+        self.assertEqual(report["steps"]["stuck"]["status"], TIMEOUT)
+
+    def test_disabled_is_ready_immediately(self):
+        warmup = Warmup({"never": lambda: 1 / 0}, enabled=False)
+        self.assertTrue(warmup.run()["ready"])
+
+    def test_most_held(self):
+        rows = [{"ticker": t} for t in ["PETR4", "VALE3", "PETR4", "AAPL", "VALE3", "PETR4", None]]
+        self.assertEqual(most_held(rows, limit=2), ["PETR4", "VALE3"])
+
+
+if __name__ == "__main__":
+    unittest.main()
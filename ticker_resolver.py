@@ -0,0 +1,173 @@
+"""
+Ticker resolution: internal ticker -> Yahoo symbol, currency, dividend eligibility.
+
+Backed by assets_master (type/currency/exchange). Tickers that are not in the
+master table fall back to one category heuristic (the rules that used to be
+copied across update_prices, get_dividends, get_history and the scripts).
+Every answer is memoized, so resolving a portfolio is a dict lookup per position.
+"""
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MASTER_TTL_S = 3600
+MASTER_RETRY_S = 30  # carga falhou/vazia: tenta de novo bem antes do TTL
+
+# Renda fixa cadastrada manualmente: não tem cotação no Yahoo
+FIXED_INCOME_KEYWORDS = ("SELIC", "CDI", "TESOURO", "POUPANCA", "POUPANÇA", "LCI", "LCA", "CDB")
+INTL_CATEGORY_HINTS = ("usa", "eua", "int", "stock", "reit")
+B3_TICKER_RE = re.compile(r"^[A-Z]{4}\d{1,2}F?$")
+# Bolsa -> sufixo do Yahoo (EURONEXT varia por praça: cadastrar já com .PA/.AS/...)
+YAHOO_SUFFIX = {"LSE": ".L", "XETRA": ".DE", "SIX": ".SW", "TSX": ".TO", "TSE": ".T", "HKEX": ".HK", "ASX": ".AX"}
+
+# assets_master.type -> categoria usada no frontend / portfolios.category
+TYPE_CATEGORY = {
+    "stock_br": "Ação",
+    "stock_us": "Stocks",
+    "reit": "REITs",
+    "fii": "FII",
+    "etf_br": "ETF",
+    "etf_us": "ETF",
+    "crypto": "Cripto",
+    "bond": "Renda Fixa",
+}
+
+
+class Instrument:
+    __slots__ = ("ticker", "yahoo", "currency", "type", "priced", "dividends", "source")
+
+    def __init__(self, ticker, yahoo, currency, type, priced=True, dividends=True, source="master"):
+        self.ticker = ticker
+        self.yahoo = yahoo
+        self.currency = currency
+        self.type = type
+        self.priced = priced  # tem cotação no Yahoo
+        self.dividends = dividends  # vale buscar proventos
+        self.source = source  # "master" ou "heuristic"
+
+    @property
+    def is_intl(self):
+        return self.currency != "BRL"
+
+    @property
+    def category(self):
+        return TYPE_CATEGORY.get(self.type)
+
+    def __repr__(self):
+        return f"Instrument({self.ticker} -> {self.yahoo}, {self.currency}, {self.type})"
+
+
+def normalize(ticker):
+    return str(ticker or "").upper().strip()
+
+
+def from_master(row):
+    ticker = normalize(row.get("ticker"))
+    exchange = row.get("exchange")
+    asset_type = row.get("type")
+    if exchange == "B3":
+        yahoo = ticker if ticker.endswith(".SA") else f"{ticker}.SA"
+    elif exchange == "CRYPTO":
+        yahoo = ticker if "-" in ticker else f"{ticker}-USD"
+    elif exchange in YAHOO_SUFFIX and "." not in ticker:
+        yahoo = f"{ticker}{YAHOO_SUFFIX[exchange]}"
+    else:
+        yahoo = ticker
+    return Instrument(
+        ticker,
+        yahoo,
+        row.get("currency") or ("BRL" if exchange == "B3" else "USD"),
+        asset_type,
+        priced=asset_type != "bond",
+        dividends=asset_type not in ("crypto", "bond"),
+    )
+
+
+def resolve_fallback(ticker, category=None):
+    """Category/shape heuristic for tickers missing from assets_master."""
+    ticker = normalize(ticker)
+    cat = str(category or "").lower()
+
+    if "renda fixa" in cat or any(k in ticker for k in FIXED_INCOME_KEYWORDS):
+        return Instrument(ticker, None, "BRL", "bond", priced=False, dividends=False, source="heuristic")
+
+    # Usuário já cadastrou no formato Yahoo (PETR4.SA, BTC-USD, USDBRL=X)
+    if "." in ticker or "-" in ticker or "=" in ticker or ticker.startswith("^"):
+        currency = "BRL" if ticker.endswith(".SA") else "USD"
+        is_crypto = ticker.endswith("-USD") or "cripto" in cat
+        return Instrument(ticker, ticker, currency, "crypto" if is_crypto else None,
+                          dividends=not is_crypto, source="heuristic")
+
+    if "cripto" in cat or "crypto" in cat:
+        return Instrument(ticker, f"{ticker}-USD", "USD", "crypto", dividends=False, source="heuristic")
+
+    if any(h in cat for h in INTL_CATEGORY_HINTS):
+        asset_type = "reit" if "reit" in cat else "stock_us"
+        return Instrument(ticker, ticker, "USD", asset_type, source="heuristic")
+
+    # ETF pode ser B3 (IVVB11) ou EUA (VOO): decide pelo formato do ticker
+    if "etf" in cat:
+        if B3_TICKER_RE.match(ticker):
+            return Instrument(ticker, f"{ticker}.SA", "BRL", "etf_br", source="heuristic")
+        return Instrument(ticker, ticker, "USD", "etf_us", source="heuristic")
+
+    asset_type = "fii" if "fii" in cat else "stock_br"
+    if len(ticker) <= 6 and "USD" not in ticker:
+        return Instrument(ticker, f"{ticker}.SA", "BRL", asset_type, source="heuristic")
+    return Instrument(ticker, ticker, "USD", "stock_us", source="heuristic")
+
+
+class TickerResolver:
+    """
+    Shared, in-memory symbol map. `loader` returns the assets_master rows
+    (ticker, type, currency, exchange); it is called lazily and every MASTER_TTL_S,
+    or MASTER_RETRY_S after a failed/empty load.
+    """
+
+    def __init__(self, loader, ttl_s=MASTER_TTL_S, retry_s=MASTER_RETRY_S):
+        self._loader = loader
+        self.ttl = ttl_s
+        self.retry = retry_s
+        self.master = {}
+        self._memo = {}
+        self.loaded_at = 0.0  # última carga bem-sucedida
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Reloads assets_master; returns False (previous map kept) when the load fails or is empty."""
+        try:
+            rows = self._loader()
+        except Exception as e:
+            logger.warning("assets_master load failed error=%s", e)
+            rows = None
+
+        with self._lock:
+            # Falha/vazio (supabase_fetch devolve [] em erro): mantém o mapa anterior
+            # e não conta como carregado (senão fica 1h só na heurística)
+            if not rows:
+                self.retry_at = time.time() + self.retry
+                logger.warning("assets_master not loaded, retry in %ss (fallback heuristic meanwhile)", self.retry)
+                return False
+            self.master = {i.ticker: i for i in (from_master(r) for r in rows) if i.ticker}
+            self._memo = {}
+            self.loaded_at = time.time()
+        logger.info("ticker resolver loaded symbols=%s", len(self.master))
+        return True
+
+    def _ensure_loaded(self):
+        now = time.time()
+        if now - self.loaded_at > self.ttl and now >= self.retry_at:
+            self.load()
+
+    def resolve(self, ticker, category=None):
+        self._ensure_loaded()
+        key = (ticker, category)
+        inst = self._memo.get(key)
+        if inst is None:
+            inst = self.master.get(normalize(ticker)) or resolve_fallback(ticker, category)
+            self._memo[key] = inst
+        return inst
@@ -0,0 +1,123 @@
+"""
+Warmup before taking traffic.
+
+The startup hook runs the warmup steps (assets_master index, market snapshot,
+FX rate, quotes of the most-held tickers...) concurrently in the background,
+each with its own deadline, within WARMUP_BUDGET_S overall. /ready answers
+503 until every step has finished (ok, failed or timed out) and 200 after, so
+a rolling deploy only routes traffic to an instance whose caches are hot.
+/health stays a pure liveness check.
+
+A failed step does not hold readiness back: the service works with cold
+caches, the step is just reported in /ready.
+
+Uso:
+    WARMUP = Warmup({"assets_master": resolver.load, ...})
+    WARMUP.start()          # startup
+    WARMUP.ready            # /ready
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import deadline
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "1") == "1"
+WARMUP_BUDGET_S = float(os.getenv("WARMUP_BUDGET_S", "30"))
+# Tickers mais presentes nas carteiras que têm a cotação pré-carregada
+WARMUP_TOP_TICKERS = int(os.getenv("WARMUP_TOP_TICKERS", "50"))
+
+PENDING, RUNNING, OK, FAILED, TIMEOUT = "pending", "running", "ok", "failed", "timeout"
+
+
+class Warmup:
+    def __init__(self, steps, budget_s=WARMUP_BUDGET_S, enabled=WARMUP_ENABLED):
+        self.steps = dict(steps)
+        self.budget = budget_s
+        self.enabled = enabled
+        self.state = {name: {"status": PENDING, "ms": None, "detail": None} for name in self.steps}
+        self.started_at = None
+        self.finished_at = None
+        self._done = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def _run_step(self, name, fn):
+        deadline.start(self.budget)  # fan-out de cada passo limitado ao orçamento do warmup
+        entry = self.state[name]
+        entry["status"] = RUNNING
+        t0 = time.perf_counter()
+        try:
+            detail = fn()
+            entry["status"] = OK
+            entry["detail"] = detail
+        except Exception as e:
+            entry["status"] = FAILED
+            entry["detail"] = f"{type(e).__name__}: {e}"
+            logger.warning("warmup step failed step=%s error=%s", name, entry["detail"])
+        finally:
+            entry["ms"] = round((time.perf_counter() - t0) * 1000, 1)
+
+    def run(self):
+        self.started_at = time.time()
+        if not self.enabled or not self.steps:
+            self.finished_at = self.started_at
+            self._done.set()
+            return self.report()
+
+        pool = ThreadPoolExecutor(max_workers=len(self.steps), thread_name_prefix="warmup")
+        futures = {
+            pool.submit(contextvars.Context().run, self._run_step, name, fn): name
+            for name, fn in self.steps.items()
+        }
+        _, not_done = wait(futures, timeout=self.budget)
+        # Passo travado continua no pool, mas não segura o ready
+        pool.shutdown(wait=False)
+        for fut in not_done:
+            self.state[futures[fut]]["status"] = TIMEOUT
+
+        self.finished_at = time.time()
+        self._done.set()
+        logger.info(
+            "warmup done elapsed_ms=%.1f steps=%s",
+            (self.finished_at - self.started_at) * 1000,
+            {name: s["status"] for name, s in self.state.items()},
+        )
+        return self.report()
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def report(self):
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round(((self.finished_at or time.time()) - self.started_at) * 1000, 1)
+        return {
+            "ready": self.ready,
+            "enabled": self.enabled,
+            "elapsed_ms": elapsed,
+            "steps": {name: dict(s) for name, s in self.state.items()},
+        }
+
+
+def most_held(rows, limit=WARMUP_TOP_TICKERS):
+    """Tickers ordered by how many portfolio rows hold them (streamed rows, one pass)."""
+    counts = {}
+    for r in rows:
+        ticker = r.get("ticker")
+        if ticker:
+            counts[ticker] = counts.get(ticker, 0) + 1
+    return sorted(counts, key=lambda t: (-counts[t], t))[:limit]